@@ -0,0 +1,36 @@
+"""Cached active status of users for authentication of read requests.
+
+Safe requests are authenticated from JWT claims without loading the user row (see
+accounts.authentication), so a user who was deactivated or deleted would keep read access until
+the token expires. Instead of querying the user on every request, whether he exists and is active
+is kept in the cache for ACTIVE_USERS_CACHE_TIMEOUT seconds. Entries are updated when the user is
+saved or deleted (see accounts.signals). Changes done without save signals (like queryset update)
+are noticed after the timeout.
+"""
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+
+def _active_key(user_pk):
+    return f"user-active:{user_pk}"
+
+
+def _timeout():
+    return getattr(settings, "ACTIVE_USERS_CACHE_TIMEOUT", 300)
+
+
+def is_user_active(user_pk):
+    """Whether user with given pk exists and is active."""
+    key = _active_key(user_pk)
+    is_active = cache.get(key)
+    if is_active is None:
+        is_active = User.objects.filter(pk=user_pk, is_active=True).exists()
+        cache.set(key, is_active, _timeout())
+    return is_active
+
+
+def set_user_active(user_pk, is_active):
+    """Record saved or deleted (is_active=False) user."""
+    cache.set(_active_key(user_pk), is_active, _timeout())
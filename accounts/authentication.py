@@ -0,0 +1,45 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .active_users import is_user_active
+from .models import LazyUser
+
+
+class LazyJWTAuthentication(JWTAuthentication):
+    """JWT authentication which doesn't load User row for safe (read) requests.
+
+    For safe requests user is built from token claims (see LazyUser), so read endpoints, which in
+    most cases need only request.user.pk, don't pay for the user query. Remaining fields are loaded
+    on the first access. Whether user still exists and is active is checked in the cache (see
+    accounts.active_users). Unsafe requests are authenticated as usual, with
+    the user row loaded from the database.
+    """
+
+    def authenticate(self, request):
+        if request.method not in SAFE_METHODS:
+            return super().authenticate(request)
+
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+
+        return self.get_lazy_user(validated_token), validated_token
+
+    def get_lazy_user(self, validated_token):
+        try:
+            user_pk = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        user = LazyUser.from_claims(user_pk, validated_token.get("username"))
+        if not is_user_active(user.pk):
+            raise AuthenticationFailed(_("User not found or inactive"), code="user_inactive")
+        return user
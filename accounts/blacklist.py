@@ -0,0 +1,126 @@
+"""In-memory front for refresh token blacklist checks.
+
+Every refresh token verification asks whether its jti is in the BlacklistedToken table. Almost all
+tokens are not blacklisted, so jtis of blacklisted tokens are kept in a Bloom filter: a negative
+answer is definite and skips the query. Positive answers (true or false positives) are confirmed in
+the database and remembered in a small LRU.
+
+The filter is filled lazily from the database and updated by signals (see accounts.signals) in the
+process where the token is blacklisted. Other processes see new entries after the filter is rebuilt,
+which happens every BLACKLIST_CACHE_TTL seconds.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+
+class BloomFilter:
+    """Set membership test with no false negatives and `error_rate` probability of false
+    positives for up to `capacity` elements."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        # Optimal number of bits and hash functions
+        # https://en.wikipedia.org/wiki/Bloom_filter#Optimal_number_of_hash_functions
+        self.n_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.n_bits + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: i-th position is h1 + i * h2
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.n_bits for i in range(self.n_hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key)
+        )
+
+
+class BlacklistCache:
+    def __init__(self, ttl=None, lru_size=None):
+        self.ttl = ttl
+        self.lru_size = lru_size
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._loaded_at = 0
+        self._lru = OrderedDict()
+
+    def _settings(self):
+        ttl = self.ttl if self.ttl is not None else getattr(settings, "BLACKLIST_CACHE_TTL", 60)
+        lru_size = self.lru_size or getattr(settings, "BLACKLIST_CACHE_LRU_SIZE", 4096)
+        return ttl, lru_size
+
+    def _load(self):
+        """Build Bloom filter from jtis of blacklisted tokens which are not expired yet."""
+        jtis = list(
+            BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now()).values_list(
+                "token__jti", flat=True
+            )
+        )
+        bloom = BloomFilter(capacity=max(1024, 2 * len(jtis)))
+        for jti in jtis:
+            bloom.add(jti)
+        self._bloom = bloom
+        self._loaded_at = time.monotonic()
+        self._lru.clear()
+
+    def _remember(self, jti, is_blacklisted):
+        _, lru_size = self._settings()
+        self._lru[jti] = is_blacklisted
+        self._lru.move_to_end(jti)
+        while len(self._lru) > lru_size:
+            self._lru.popitem(last=False)
+
+    def is_blacklisted(self, jti):
+        ttl, _ = self._settings()
+        with self._lock:
+            if self._bloom is None or time.monotonic() - self._loaded_at > ttl:
+                self._load()
+            if jti not in self._bloom:
+                return False
+            if jti in self._lru:
+                self._lru.move_to_end(jti)
+                return self._lru[jti]
+
+        is_blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        with self._lock:
+            self._remember(jti, is_blacklisted)
+        return is_blacklisted
+
+    def add(self, jti):
+        """Mark token as blacklisted."""
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+                self._remember(jti, True)
+
+    def discard(self, jti):
+        """Forget cached answer for token removed from the blacklist."""
+        self.discard_many([jti])
+
+    def discard_many(self, jtis):
+        """Forget cached answers for tokens removed from the blacklist."""
+        with self._lock:
+            for jti in jtis:
+                self._lru.pop(jti, None)
+
+    def clear(self):
+        with self._lock:
+            self._bloom = None
+            self._lru.clear()
+
+
+blacklist_cache = BlacklistCache()
@@ -0,0 +1,29 @@
+"""Cached public representation of user profiles.
+
+Public profile (BasicUserDetailSerializer data) is shown next to every routine, so it is kept in the
+cache for PUBLIC_PROFILE_CACHE_TIMEOUT seconds. Entries are removed when the user or his profile is
+saved or deleted (see accounts.signals). Fields updated without save signals, like buffered
+last_login, may be stale for up to the timeout.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _public_profile_key(user_pk):
+    return f"public-profile:{user_pk}"
+
+
+def get_public_profile(user_pk, load):
+    """Return cached public profile of user with user_pk. On cache miss profile data is returned by
+    `load` callable and stored in the cache."""
+    key = _public_profile_key(user_pk)
+    data = cache.get(key)
+    if data is None:
+        data = load()
+        cache.set(key, data, getattr(settings, "PUBLIC_PROFILE_CACHE_TIMEOUT", 300))
+    return data
+
+
+def invalidate_public_profile(user_pk):
+    cache.delete(_public_profile_key(user_pk))
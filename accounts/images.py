@@ -0,0 +1,96 @@
+"""Resized variants of profile pictures.
+
+Uploaded picture is stored as-is and variants for each of PROFILE_PICTURE_SIZES (longer edge in
+pixels) are generated by background job in WebP and JPEG formats. Variants are saved to the same
+content-addressed storage as the picture and removed by the same garbage collection.
+
+Large JPEG photos are decoded at reduced scale (draft mode), other formats are downscaled with
+Image.reduce before resampling, so the full resolution bitmap is never resampled.
+"""
+
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Format name -> (Pillow format, file extension, save options)
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def get_sizes():
+    return sorted(getattr(settings, "PROFILE_PICTURE_SIZES", (40, 160, 640)))
+
+
+def variant_name(name, size, variant_format):
+    extension = VARIANT_FORMATS[variant_format][1]
+    return f"{os.path.splitext(name)[0]}_{size}.{extension}"
+
+
+def open_image(file, max_size):
+    """Decode image file at the lowest resolution still larger than max_size."""
+    image = Image.open(file)
+    # JPEG decoder can scale by 1/2, 1/4 and 1/8 while decoding
+    image.draft("RGB", (max_size, max_size))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    return image
+
+
+def resize(image, size):
+    """Scale image down so its longer edge is at most size pixels."""
+    resized = image.copy()
+    # reducing_gap makes thumbnail reduce image by integer factor before resampling
+    resized.thumbnail((size, size), Image.LANCZOS, reducing_gap=3.0)
+    return resized
+
+
+def encode(image, variant_format):
+    pil_format, _, options = VARIANT_FORMATS[variant_format]
+    if pil_format == "JPEG" and image.mode == "RGBA":
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def create_variants(storage, name, upload_name):
+    """Generate all variants of picture `name` kept in `storage`, variant names are derived from
+    `upload_name` (name requested when the picture was saved). Returns mapping of format to mapping
+    of size (as string, to survive JSON serialization) to variant file name."""
+    sizes = get_sizes()
+    with storage.open(name) as file:
+        image = open_image(file, sizes[-1])
+        image.load()
+
+    variants = {variant_format: {} for variant_format in VARIANT_FORMATS}
+    # Each size is resized from the previous (bigger) one
+    for size in reversed(sizes):
+        image = resize(image, size)
+        for variant_format in VARIANT_FORMATS:
+            variants[variant_format][str(size)] = storage.save(
+                variant_name(upload_name, size, variant_format),
+                ContentFile(encode(image, variant_format)),
+            )
+    return variants
+
+
+def srcset(storage, variants, build_url=None):
+    """Build srcset attribute value for each format, e.g. {"webp": "/a_40.webp 40w, ..."}."""
+    result = {}
+    for variant_format, names in variants.items():
+        candidates = []
+        for size, name in sorted(names.items(), key=lambda item: int(item[0])):
+            url = storage.url(name)
+            if build_url is not None:
+                url = build_url(url)
+            candidates.append(f"{url} {size}w")
+        result[variant_format] = ", ".join(candidates)
+    return result
@@ -0,0 +1,83 @@
+"""Buffered updates of User.last_login.
+
+Obtaining token pair used to update last_login of the user right away, so every login was a write
+to auth_user table. Logins are now recorded in memory and written with single UPDATE for all users
+logged in since the previous flush. Flush is done at the start of the first request handled at
+least LAST_LOGIN_FLUSH_INTERVAL seconds after the first buffered login (see accounts.signals) and
+at interpreter exit. Logins buffered by a process which is killed (or recycled without clean exit)
+are lost, so the interval bounds both staleness and loss of last_login. Flush is triggered by
+requests only, so while the process receives no requests buffered logins stay unwritten for an
+unbounded time.
+"""
+
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+
+class LastLoginBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._logins = {}
+        self._first_login_at = None
+
+    @staticmethod
+    def _interval():
+        return getattr(settings, "LAST_LOGIN_FLUSH_INTERVAL", 10)
+
+    def touch(self, user):
+        """Record login of user. User instance is updated immediately."""
+        user.last_login = timezone.now()
+        with self._lock:
+            if not self._logins:
+                self._first_login_at = time.monotonic()
+            self._logins[user.pk] = user.last_login
+        if self._interval() <= 0:
+            self.flush()
+
+    def flush_if_due(self):
+        """Flush buffered logins if the first of them is at least LAST_LOGIN_FLUSH_INTERVAL
+        seconds old. Returns number of updated users."""
+        with self._lock:
+            if not self._logins or time.monotonic() - self._first_login_at < self._interval():
+                return 0
+        return self.flush()
+
+    def flush(self):
+        """Write all buffered logins with single query. Returns number of updated users.
+
+        If the query fails, logins are put back in the buffer and the exception is raised.
+        """
+        with self._lock:
+            logins, self._logins = self._logins, {}
+            first_login_at, self._first_login_at = self._first_login_at, None
+        if not logins:
+            return 0
+        try:
+            return User.objects.filter(pk__in=logins).update(
+                last_login=Case(
+                    *(When(pk=pk, then=Value(last_login)) for pk, last_login in logins.items()),
+                    output_field=DateTimeField(),
+                )
+            )
+        except Exception:
+            with self._lock:
+                # Logins recorded during the flush are newer
+                self._logins = {**logins, **self._logins}
+                self._first_login_at = first_login_at
+            raise
+
+    def clear(self):
+        """Drop buffered logins without writing them."""
+        with self._lock:
+            self._logins = {}
+            self._first_login_at = None
+
+
+last_login_buffer = LastLoginBuffer()
+atexit.register(last_login_buffer.flush)
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from accounts.signals import deferred_blacklist_invalidation
+
+
+class Command(BaseCommand):
+    help = "Delete expired outstanding and blacklisted refresh tokens"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of tokens deleted in single transaction.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to wait between batches, gives way to concurrent writes.",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        n_deleted = 0
+        while True:
+            # Primary keys are selected first, because DELETE with LIMIT is not portable
+            tokens = list(
+                OutstandingToken.objects.filter(expires_at__lte=now)
+                .order_by("pk")
+                .values_list("pk", "jti")[: options["batch_size"]]
+            )
+            if not tokens:
+                break
+            token_pks, jtis = zip(*tokens)
+            # Blacklist entries of the tokens are deleted by cascade, in the same transaction
+            with deferred_blacklist_invalidation(jtis):
+                OutstandingToken.objects.filter(pk__in=token_pks).delete()
+            n_deleted += len(token_pks)
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        self.stdout.write(f"Deleted {n_deleted} expired tokens")
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.models import UserProfile
+from utils.storage import collect_garbage
+
+
+class Command(BaseCommand):
+    help = "Delete profile picture files which are not referenced by any profile"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-period",
+            type=float,
+            default=getattr(settings, "MEDIA_GC_GRACE_PERIOD", 3600),
+            help="Keep files modified less than this many seconds ago.",
+        )
+
+    def handle(self, *args, **options):
+        referenced_names = set()
+        profiles = UserProfile.objects.values_list("profile_picture", "profile_picture_variants")
+        for picture_name, variants in profiles.iterator(chunk_size=2000):
+            referenced_names.add(picture_name)
+            for names in variants.values():
+                referenced_names.update(names.values())
+
+        storage = UserProfile._meta.get_field("profile_picture").storage
+        deleted = collect_garbage(
+            storage, "profile_pictures", referenced_names, options["grace_period"]
+        )
+        self.stdout.write(f"Deleted {len(deleted)} unreferenced files")
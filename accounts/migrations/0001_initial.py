@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:44
+
+import accounts.models
+import django.contrib.auth.models
+import django.db.models.deletion
+import utils.storage
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0013_alter_user_email'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LazyUser',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('auth.user',),
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('country', models.CharField(blank=True, max_length=100)),
+                ('gender', models.CharField(blank=True, choices=[('m', 'male'), ('f', 'female')], max_length=1)),
+                ('date_of_birth', models.DateField(blank=True, null=True)),
+                ('profile_picture', models.ImageField(default='profile_pictures/default.png', storage=utils.storage.ContentAddressedStorage(base_url='/media/'), upload_to=accounts.models.user_profile_picture_path)),
+                ('profile_picture_variants', models.JSONField(blank=True, default=dict)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -2,10 +2,9 @@ import os
 
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.files.storage import FileSystemStorage
 from django.db import models
-
-# from utils.functions import hash_upload_to
+from django.db.models import DEFERRED
+from utils.storage import ContentAddressedStorage
 
 # Set user email field to be unique
 User._meta.get_field("email")._unique = True
@@ -14,13 +13,27 @@ User._meta.get_field("email").null = False
 
 
 def user_profile_picture_path(instance, filename):
-    """Creates user profile picture path as zero padded user pk correct extension."""
+    """Creates user profile picture path as zero padded user pk correct extension. Storage keeps
+    only directory and extension, file is named after its content hash."""
     extension = os.path.splitext(filename)[1]
     return f"profile_pictures/{instance.user_id:07}{extension}"
 
 
+class UserProfileManager(models.Manager):
+    def create_for_users(self, users):
+        """Create default profiles for many users with single INSERT."""
+        profiles = self.bulk_create([self.model(user=user) for user in users])
+        for profile in profiles:
+            profile._saved_values = profile._field_values()
+        return profiles
+
+
 class UserProfile(models.Model):
-    """Additional user-related informations."""
+    """Additional user-related informations.
+
+    Instances remember values loaded from the database, so `changed_fields` tells which fields
+    have to be saved. User post_save signal uses it to skip saving unchanged profiles.
+    """
 
     GENDERS = [("m", "male"), ("f", "female")]
 
@@ -31,15 +44,76 @@ class UserProfile(models.Model):
     date_of_birth = models.DateField(blank=True, null=True)
     profile_picture = models.ImageField(
         upload_to=user_profile_picture_path,
-        storage=FileSystemStorage(base_url=settings.MEDIA_URL),
+        storage=ContentAddressedStorage(base_url=settings.MEDIA_URL),
         default="profile_pictures/default.png",
     )
+    # Resized copies of profile_picture, see accounts.images
+    profile_picture_variants = models.JSONField(default=dict, blank=True)
+
+    objects = UserProfileManager()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._saved_values = self._field_values()
 
     def __str__(self):
         return f"UserProfile(user={self.user})"
 
-    def delete(self, using=None, keep_parents=False):
-        """Delete profile picture file when user is deleted."""
-        if os.path.basename(self.profile_picture.name) != "default.png":
-            self.profile_picture.storage.delete(self.profile_picture.name)
-        super().delete()
+    def _field_values(self):
+        """Values of loaded (not deferred) fields, files are compared by name."""
+        values = {}
+        for field in self._meta.concrete_fields:
+            if field.attname in self.__dict__:
+                value = self.__dict__[field.attname]
+                values[field.attname] = getattr(value, "name", value)
+        return values
+
+    @property
+    def changed_fields(self):
+        """Names of fields modified since the profile was loaded or saved."""
+        values = self._field_values()
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if field.attname in values
+            and values[field.attname] != self._saved_values.get(field.attname, DEFERRED)
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._saved_values = self._field_values()
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        values = self._field_values()
+        for field in self._meta.concrete_fields:
+            refreshed = fields is None or field.name in fields or field.attname in fields
+            if refreshed and field.attname in values:
+                self._saved_values[field.attname] = values[field.attname]
+
+
+class LazyUser(User):
+    """User instance built from JWT claims without querying the database.
+
+    Only pk (and username, if present in the token) are known upfront. Remaining fields are
+    deferred, so the first access to any of them loads the whole row with single query.
+    """
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_claims(cls, user_pk, username=None):
+        # Claims may store pk as a string
+        field_names, values = ["id"], [cls._meta.pk.to_python(user_pk)]
+        if username is not None:
+            field_names.append("username")
+            values.append(username)
+        return cls.from_db(None, field_names, values)
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        # Deferred field access refreshes only that field, load all deferred fields at once instead
+        deferred_fields = self.get_deferred_fields()
+        if fields is not None and deferred_fields and set(fields) <= deferred_fields:
+            fields = deferred_fields
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
@@ -0,0 +1,30 @@
+from rest_framework_simplejwt import serializers
+
+from ..last_login import last_login_buffer
+from ..tokens import RefreshToken
+
+
+class TokenObtainPairSerializer(serializers.TokenObtainPairSerializer):
+    """Issued tokens additionally contain username claim used by LazyJWTAuthentication. Login is
+    recorded in the last_login buffer instead of updating the user right away."""
+
+    token_class = RefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token["username"] = user.username
+        return token
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        last_login_buffer.touch(self.user)
+        return data
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
+
+
+class TokenBlacklistSerializer(serializers.TokenBlacklistSerializer):
+    token_class = RefreshToken
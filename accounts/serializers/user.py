@@ -1,9 +1,26 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
 
+from ..images import srcset
 from ..models import UserProfile
 
 
+class ProfilePictureSrcsetField(serializers.ReadOnlyField):
+    """Srcset attribute values (one per image format) of profile picture variants."""
+
+    def __init__(self, **kwargs):
+        kwargs["source"] = "*"
+        super().__init__(**kwargs)
+
+    def to_representation(self, profile):
+        request = self.context.get("request", None)
+        return srcset(
+            profile.profile_picture.storage,
+            profile.profile_picture_variants,
+            request.build_absolute_uri if request is not None else None,
+        )
+
+
 class UserSerializer(serializers.ModelSerializer):
 
     password = serializers.CharField(write_only=True, min_length=4)
@@ -23,10 +40,19 @@ class UserSerializer(serializers.ModelSerializer):
 
 class UserProfileSerializer(serializers.ModelSerializer):
     gender_display = serializers.CharField(source="get_gender_display", read_only=True)
+    profile_picture_srcset = ProfilePictureSrcsetField()
 
     class Meta:
         model = UserProfile
-        fields = ("country", "city", "profile_picture", "gender", "gender_display", "date_of_birth")
+        fields = (
+            "country",
+            "city",
+            "profile_picture",
+            "profile_picture_srcset",
+            "gender",
+            "gender_display",
+            "date_of_birth",
+        )
         extra_kwargs = {
             "date_of_birth": {"format": r"%Y-%m-%d", "input_formats": [r"%Y-%m-%d", "iso-8601"]}
         }
@@ -68,9 +94,11 @@ class FullUserDetailSerializer(serializers.ModelSerializer):
 
 
 class UserProfilePictureSerializer(serializers.ModelSerializer):
+    profile_picture_srcset = ProfilePictureSrcsetField()
+
     class Meta:
         model = UserProfile
-        fields = ("profile_picture",)
+        fields = ("profile_picture", "profile_picture_srcset")
         extra_kwargs = {
             "profile_picture": {"allow_empty_file": False, "use_url": True, "required": True}
         }
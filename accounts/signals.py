@@ -1,15 +1,130 @@
-from django.db.models.signals import post_save
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.signals import request_started
+from django.db import DatabaseError
+from django.db.models.signals import post_delete, post_save
 from django.contrib.auth.models import User
 from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from .active_users import set_user_active
+from .blacklist import blacklist_cache
+from .cache import invalidate_public_profile
+from .last_login import last_login_buffer
 from .models import UserProfile
 
+logger = logging.getLogger(__name__)
+
+
+# Users created inside deferred_profile_creation block, None outside of it
+_users_without_profile = ContextVar("users_without_profile", default=None)
+# True inside deferred_blacklist_invalidation block
+_blacklist_invalidation_deferred = ContextVar("blacklist_invalidation_deferred", default=False)
+
+
+@contextmanager
+def deferred_profile_creation():
+    """Create profiles of all users created inside the block with single query at its end.
+
+    Example:
+        with deferred_profile_creation():
+            for username in usernames:
+                User.objects.create_user(username=username, email=f"{username}@mail.com")
+    """
+    users = []
+    token = _users_without_profile.set(users)
+    try:
+        yield
+        UserProfile.objects.create_for_users(users)
+    finally:
+        _users_without_profile.reset(token)
+
+
+@contextmanager
+def deferred_blacklist_invalidation(jtis):
+    """Invalidate cached blacklist answers of tokens with jtis once at the end of the block,
+    instead of looking up token of every blacklist entry deleted inside it.
+
+    Example:
+        with deferred_blacklist_invalidation(jtis):
+            OutstandingToken.objects.filter(jti__in=jtis).delete()
+    """
+    token = _blacklist_invalidation_deferred.set(True)
+    try:
+        yield
+    finally:
+        _blacklist_invalidation_deferred.reset(token)
+    blacklist_cache.discard_many(jtis)
+
 
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
     if created:
-        UserProfile.objects.create(user=instance)
+        users = _users_without_profile.get()
+        if users is None:
+            UserProfile.objects.create(user=instance)
+        else:
+            users.append(instance)
+
+
+@receiver(post_save, sender=User)
+def save_profile(sender, instance, created, **kwargs):
+    # Only profile which was loaded and modified together with the user has to be saved
+    if not created and User.profile.is_cached(instance):
+        changed_fields = instance.profile.changed_fields
+        if changed_fields:
+            instance.profile.save(update_fields=changed_fields)
 
 
 @receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
-    instance.profile.save()
+@receiver(post_delete, sender=User)
+def invalidate_user_public_profile(sender, instance, **kwargs):
+    invalidate_public_profile(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def update_user_active(sender, instance, **kwargs):
+    set_user_active(instance.pk, instance.is_active)
+
+
+@receiver(post_delete, sender=User)
+def remove_user_active(sender, instance, **kwargs):
+    set_user_active(instance.pk, False)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile_public_profile(sender, instance, **kwargs):
+    invalidate_public_profile(instance.user_id)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_to_blacklist_cache(sender, instance, **kwargs):
+    blacklist_cache.add(instance.token.jti)
+
+
+@receiver(post_delete, sender=BlacklistedToken)
+def remove_from_blacklist_cache(sender, instance, **kwargs):
+    if _blacklist_invalidation_deferred.get():
+        return
+    if BlacklistedToken.token.is_cached(instance):
+        jti = instance.token.jti
+    else:
+        # Token is not loaded by cascade deletes
+        jti = (
+            OutstandingToken.objects.filter(pk=instance.token_id)
+            .values_list("jti", flat=True)
+            .first()
+        )
+    if jti is not None:
+        blacklist_cache.discard(jti)
+
+
+@receiver(request_started)
+def flush_last_logins(sender, **kwargs):
+    # Failed flush (e.g. locked database) is retried by later request instead of failing this one
+    try:
+        last_login_buffer.flush_if_due()
+    except DatabaseError:
+        logger.exception("Flush of buffered last logins failed")
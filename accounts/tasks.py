@@ -0,0 +1,52 @@
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from jobs.registry import task
+
+from .cache import invalidate_public_profile
+from .images import create_variants
+from .models import UserProfile, user_profile_picture_path
+
+
+@task("accounts.delete_user")
+def delete_user(user_pk):
+    """Remove user account together with profile and all owned exercises and routines. Profile
+    picture files are removed later by media garbage collection."""
+    try:
+        user = User.objects.get(pk=user_pk)
+    except User.DoesNotExist:
+        return None
+    user.delete()
+    return None
+
+
+@task("accounts.prune_tokens")
+def prune_tokens(batch_size=1000):
+    """Delete expired outstanding and blacklisted refresh tokens."""
+    call_command("prunetokens", batch_size=batch_size)
+    return None
+
+
+@task("accounts.process_profile_picture")
+def process_profile_picture(user_pk, picture_name):
+    """Generate resized variants of uploaded profile picture."""
+    profile = UserProfile.objects.filter(user_id=user_pk).first()
+    if profile is None or profile.profile_picture.name != picture_name:
+        # Picture was replaced or removed in the meantime
+        return None
+    storage = profile.profile_picture.storage
+    upload_name = user_profile_picture_path(profile, picture_name)
+    variants = create_variants(storage, picture_name, upload_name)
+    updated = UserProfile.objects.filter(pk=profile.pk, profile_picture=picture_name).update(
+        profile_picture_variants=variants
+    )
+    if not updated:
+        return None
+    invalidate_public_profile(user_pk)
+    return {"variants": variants}
+
+
+@task("accounts.sweep_media")
+def sweep_media():
+    """Delete profile pictures which are no longer referenced."""
+    call_command("sweepmedia")
+    return None
@@ -1,2 +1,6 @@
+from .authentication import AuthenticationTest
+from .last_login import LastLoginTest
 from .user_list import UserListTest
-from .user_detail import UserDetailTest
\ No newline at end of file
+from .user_detail import UserDetailTest
+from .user_profile import UserProfileTest
+from .token_blacklist import TokenBlacklistTest
@@ -0,0 +1,106 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ..authentication import LazyJWTAuthentication
+from ..last_login import last_login_buffer
+from ..models import LazyUser
+from .utils import USER_DETAIL_URLPATTERN_NAME
+
+
+class AuthenticationTest(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username="owner", email="owner@mail.com", password="test", first_name="Test"
+        )
+
+    def tearDown(self):
+        last_login_buffer.clear()
+
+    def obtain_access_token(self):
+        json_data = {"username": "owner", "password": "test"}
+        response = self.client.post(reverse("token_obtain_pair"), json_data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["access"]
+
+    def authenticate(self, method, access_token):
+        request = getattr(APIRequestFactory(), method)(
+            "/", HTTP_AUTHORIZATION=f"Bearer {access_token}"
+        )
+        return LazyJWTAuthentication().authenticate(APIView().initialize_request(request))
+
+    def test_token_contains_username(self):
+        """Obtained token carries username claim."""
+        access_token = AccessToken(self.obtain_access_token())
+        self.assertEqual(access_token["username"], "owner")
+
+    def test_safe_request_without_user_query(self):
+        """For safe requests user is built from token claims, remaining fields are loaded lazily
+        with single query."""
+        access_token = self.obtain_access_token()
+
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate("get", access_token)
+            self.assertIsInstance(user, LazyUser)
+            self.assertEqual(user.pk, self.owner.pk)
+            self.assertEqual(user.username, "owner")
+            self.assertTrue(user.is_authenticated)
+            self.assertEqual(user, self.owner)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, "owner@mail.com")
+            self.assertEqual(user.first_name, "Test")
+
+    def test_unsafe_request_loads_user(self):
+        """Unsafe requests are authenticated with the full user row."""
+        access_token = self.obtain_access_token()
+
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate("put", access_token)
+        self.assertNotIsInstance(user, LazyUser)
+        self.assertEqual(user, self.owner)
+
+    def test_inactive_user_cannot_write(self):
+        """Deactivated user can't modify data with token obtained earlier."""
+        access_token = self.obtain_access_token()
+        self.owner.is_active = False
+        self.owner.save()
+
+        url = reverse(USER_DETAIL_URLPATTERN_NAME, kwargs={"user_pk": self.owner.pk})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token}")
+        response = self.client.put(url, {}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_inactive_user_cannot_read(self):
+        """Deactivated or deleted user can't read data with token obtained earlier."""
+        access_token = self.obtain_access_token()
+        url = reverse(USER_DETAIL_URLPATTERN_NAME, kwargs={"user_pk": self.owner.pk})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token}")
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        self.owner.is_active = False
+        self.owner.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.owner.is_active = True
+        self.owner.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        self.owner.delete()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_deactivated_without_signals(self):
+        """Users deactivated without save signals are rejected after their cache entry expires."""
+        access_token = self.obtain_access_token()
+        self.authenticate("get", access_token)
+        User.objects.filter(pk=self.owner.pk).update(is_active=False)
+
+        cache.clear()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate("get", access_token)
@@ -0,0 +1,101 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.db.models import QuerySet
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..last_login import last_login_buffer
+
+
+class LastLoginTest(APITestCase):
+    def setUp(self):
+        last_login_buffer.clear()
+        self.users = [
+            User.objects.create_user(
+                username=f"user{i}", email=f"user{i}@mail.com", password="test"
+            )
+            for i in range(3)
+        ]
+
+    def tearDown(self):
+        last_login_buffer.clear()
+
+    def login(self, user):
+        json_data = {"username": user.username, "password": "test"}
+        response = self.client.post(reverse("token_obtain_pair"), json_data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(LAST_LOGIN_FLUSH_INTERVAL=60)
+    def test_logins_are_buffered(self):
+        """Logins are not written until flush, which updates all users with single query."""
+        with CaptureQueriesContext(connection) as context:
+            for user in self.users[:2]:
+                self.login(user)
+        self.assertFalse(
+            any(query["sql"].startswith("UPDATE") for query in context.captured_queries)
+        )
+        self.assertFalse(User.objects.filter(last_login__isnull=False).exists())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(last_login_buffer.flush(), 2)
+        self.assertEqual(
+            list(User.objects.filter(last_login__isnull=False).order_by("pk")), self.users[:2]
+        )
+        self.assertEqual(last_login_buffer.flush(), 0)
+
+    @override_settings(LAST_LOGIN_FLUSH_INTERVAL=60)
+    def test_repeated_login_keeps_latest(self):
+        """User logging in several times between flushes gets time of the last login."""
+        user = self.users[0]
+        self.login(user)
+        self.login(user)
+        latest = last_login_buffer._logins[user.pk]
+        last_login_buffer.flush()
+        user.refresh_from_db()
+        self.assertEqual(user.last_login, latest)
+
+    @override_settings(LAST_LOGIN_FLUSH_INTERVAL=60)
+    def test_flush_at_request_start(self):
+        """Buffered logins are written by the first request after the flush interval passed."""
+        self.login(self.users[0])
+        url = reverse("user-detail", kwargs={"user_pk": self.users[0].pk})
+
+        self.client.get(url)
+        self.assertFalse(User.objects.filter(last_login__isnull=False).exists())
+
+        last_login_buffer._first_login_at -= 60
+        self.client.get(url)
+        self.assertEqual(list(User.objects.filter(last_login__isnull=False)), self.users[:1])
+        self.assertEqual(last_login_buffer.flush(), 0)
+
+    @override_settings(LAST_LOGIN_FLUSH_INTERVAL=60)
+    def test_failed_flush_keeps_logins(self):
+        """Logins are kept in the buffer when flush fails and the request is still served."""
+        self.login(self.users[0])
+        url = reverse("user-detail", kwargs={"user_pk": self.users[0].pk})
+        access_token = RefreshToken.for_user(self.users[0]).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token}")
+        last_login_buffer._first_login_at -= 60
+
+        with mock.patch.object(
+            QuerySet, "update", side_effect=OperationalError("database is locked")
+        ), self.assertLogs("accounts.signals", level="ERROR"):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(User.objects.filter(last_login__isnull=False).exists())
+
+        self.client.get(url)
+        self.assertEqual(list(User.objects.filter(last_login__isnull=False)), self.users[:1])
+
+    @override_settings(LAST_LOGIN_FLUSH_INTERVAL=0)
+    def test_flush_without_buffering(self):
+        """With zero interval every login is written immediately."""
+        self.login(self.users[0])
+        self.users[0].refresh_from_db()
+        self.assertIsNotNone(self.users[0].last_login)
@@ -0,0 +1,102 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from ..blacklist import BloomFilter, blacklist_cache
+from ..tokens import RefreshToken
+
+
+class TokenBlacklistTest(APITestCase):
+    def setUp(self):
+        blacklist_cache.clear()
+        self.owner = User.objects.create_user(
+            username="owner", email="owner@mail.com", password="test"
+        )
+
+    def tearDown(self):
+        blacklist_cache.clear()
+
+    def refresh(self, refresh_token):
+        return self.client.post(reverse("token_refresh"), {"refresh": str(refresh_token)})
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(capacity=100)
+        keys = [f"key-{i}" for i in range(100)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        self.assertLess(sum(f"other-{i}" in bloom for i in range(1000)), 10)
+
+    def test_refresh_without_blacklist_query(self):
+        """Not blacklisted token is refreshed without querying blacklist table."""
+        refresh_token = RefreshToken.for_user(self.owner)
+        self.assertEqual(self.refresh(refresh_token).status_code, status.HTTP_200_OK)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.refresh(refresh_token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            any(
+                BlacklistedToken._meta.db_table in query["sql"]
+                for query in context.captured_queries
+            )
+        )
+
+    def test_refresh_blacklisted_token(self):
+        """Token blacklisted after the cache was loaded is rejected."""
+        refresh_token = RefreshToken.for_user(self.owner)
+        self.assertEqual(self.refresh(refresh_token).status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse("token_blacklist"), {"refresh": str(refresh_token)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.refresh(refresh_token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_unblacklisted_token(self):
+        """Token removed from the blacklist can be refreshed again."""
+        refresh_token = RefreshToken.for_user(self.owner)
+        refresh_token.blacklist()
+        self.assertEqual(self.refresh(refresh_token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        BlacklistedToken.objects.all().delete()
+        self.assertEqual(self.refresh(refresh_token).status_code, status.HTTP_200_OK)
+
+    def test_prune_expired_tokens(self):
+        """Only expired tokens are deleted, together with their blacklist entries."""
+        RefreshToken.for_user(self.owner)
+        for token in [RefreshToken.for_user(self.owner) for _ in range(5)]:
+            token.blacklist()
+        OutstandingToken.objects.exclude(
+            pk=OutstandingToken.objects.order_by("pk").first().pk
+        ).update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        valid_token = RefreshToken.for_user(self.owner)
+        valid_token.blacklist()
+
+        call_command("prunetokens", batch_size=2, stdout=StringIO())
+        self.assertEqual(OutstandingToken.objects.count(), 2)
+        self.assertEqual(
+            list(BlacklistedToken.objects.values_list("token__jti", flat=True)),
+            [valid_token["jti"]],
+        )
+
+    def test_prune_tokens_number_of_queries(self):
+        """Blacklist entries are removed from the cache once per batch, without loading their
+        tokens one by one."""
+        for token in [RefreshToken.for_user(self.owner) for _ in range(5)]:
+            token.blacklist()
+            self.assertEqual(self.refresh(token).status_code, status.HTTP_401_UNAUTHORIZED)
+        OutstandingToken.objects.update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+
+        # Expired tokens, rows collected for delete, two deletes and the empty batch
+        with self.assertNumQueries(6):
+            call_command("prunetokens", batch_size=10, stdout=StringIO())
+        self.assertFalse(BlacklistedToken.objects.exists())
+        self.assertEqual(blacklist_cache._lru, {})
@@ -2,16 +2,26 @@ import os
 import tempfile
 import datetime
 import shutil
+from io import StringIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.hashers import check_password
+from django.core.management import call_command
+from PIL import Image
 
 from accounts.models import UserProfile
+from jobs.models import Job
+from jobs.runner import run_pending
+from utils.functions import hash_file
+from utils.routers import ReplicaRouter, _use_replica
 from .utils import (
     create_image_file,
     USER_DETAIL_URLPATTERN_NAME,
@@ -27,12 +37,17 @@ settings.MEDIA_ROOT = TEMP_MEDIA_ROOT.name
 os.mkdir(os.path.join(settings.MEDIA_ROOT, "profile_pictures"))
 
 
+def sweep_media():
+    call_command("sweepmedia", grace_period=0, stdout=StringIO())
+
+
 class UserDetailTest(APITestCase):
     def authorize(self, user_obj):
         refresh = RefreshToken.for_user(user_obj)
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
 
     def setUp(self):
+        cache.clear()
         # First user
         self.owner = User.objects.create_user(
             username="owner",
@@ -97,19 +112,72 @@ class UserDetailTest(APITestCase):
         self.assertEqual(profile["gender_display"], "")
         self.assertEqual(profile["date_of_birth"], None)
 
+    def test_get_user_profile_data_single_query(self):
+        """User is fetched together with the profile."""
+        self.authorize(self.owner)
+        url = reverse(USER_DETAIL_URLPATTERN_NAME, kwargs={"user_pk": self.owner.pk})
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_get_other_user_profile_data_cached(self):
+        """Public profile is cached until the user or profile is saved."""
+        self.authorize(self.owner)
+        url = reverse(USER_DETAIL_URLPATTERN_NAME, kwargs={"user_pk": self.other_user.pk})
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data["username"], "other_user")
+
+        self.other_user.first_name = "Other"
+        self.other_user.save()
+        self.assertEqual(self.client.get(url).data["first_name"], "Other")
+
+        self.other_user.profile.city = "Berlin"
+        self.other_user.profile.save()
+        self.assertEqual(self.client.get(url).data["profile"]["city"], "Berlin")
+
+    @override_settings(DATABASE_REPLICAS=["replica1"])
+    def test_public_profile_cached_from_primary(self):
+        """Cache is filled from the primary, so profile read from lagging replica right after the
+        update is not cached for the whole timeout."""
+        self.authorize(self.owner)
+        url = reverse(USER_DETAIL_URLPATTERN_NAME, kwargs={"user_pk": self.other_user.pk})
+        self.other_user.profile.city = "Berlin"
+        self.other_user.profile.save()
+
+        # Replica hasn't received the update yet, reads routed to it find stale data
+        replica_reads = []
+
+        def lagging_replica(model, **hints):
+            if _use_replica.get():
+                replica_reads.append(model)
+            return None
+
+        with mock.patch.object(ReplicaRouter, "db_for_read", side_effect=lagging_replica):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get(url).data["profile"]["city"], "Berlin")
+
+        self.assertNotIn(User, replica_reads)
+
+    def test_get_not_existing_user_profile_data(self):
+        self.authorize(self.owner)
+        url = reverse(USER_DETAIL_URLPATTERN_NAME, kwargs={"user_pk": self.other_user.pk + 1})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_delete_account(self):
         """User can delete their own account. Associated profile should be removed after user is
-        removed. Profile picture should be removed from the filesystem."""
+        removed. Profile picture should be removed from the filesystem by garbage collection."""
         self.authorize(self.owner)
 
-        # Set profile picture and manually move to MEDIA_ROOT directory
-        img_file = create_image_file()
-        img_path = os.path.join(
-            settings.MEDIA_ROOT, "profile_pictures", os.path.basename(img_file.name)
-        )
-        shutil.copy(img_file.name, img_path)
-        self.owner.profile.profile_picture = img_path
-        self.owner.profile.save()
+        # Set profile picture
+        url = reverse(PROFILE_PICTURE_URLPATTERN_NAME, kwargs={"user_pk": self.owner.pk})
+        self.client.put(url, {"profile_picture": create_image_file()}, format="multipart")
+        run_pending()
+        self.owner.profile.refresh_from_db()
 
         profile_picture_path = self.owner.profile.profile_picture.path
         self.assertTrue(os.path.exists(profile_picture_path))
@@ -118,7 +186,24 @@ class UserDetailTest(APITestCase):
         url = reverse(USER_DETAIL_URLPATTERN_NAME, kwargs={"user_pk": user_pk})
         response = self.client.delete(url)
 
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_url = response["Location"]
+
+        # Account is deactivated immediately and removed by background job, which can be polled
+        # with credentials which are no longer valid
+        self.owner.refresh_from_db()
+        self.assertFalse(self.owner.is_active)
+        response = self.client.get(job_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], Job.QUEUED)
+        run_pending()
+
+        response = self.client.get(job_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], Job.DONE)
+        self.assertEqual(response.data["url"], job_url)
+        self.client.credentials()
+        self.assertEqual(self.client.get(job_url).status_code, status.HTTP_200_OK)
 
         # Check that User object is gone
         with self.assertRaises(User.DoesNotExist):
@@ -129,6 +214,7 @@ class UserDetailTest(APITestCase):
             UserProfile.objects.get(user=user_pk)
 
         # Associated profile picture should be removed from the filesystem
+        sweep_media()
         self.assertFalse(os.path.exists(profile_picture_path))
 
     def test_delete_account_with_default_profile_picture(self):
@@ -148,8 +234,9 @@ class UserDetailTest(APITestCase):
         user_pk = self.owner.pk
         url = reverse(USER_DETAIL_URLPATTERN_NAME, kwargs={"user_pk": user_pk})
         response = self.client.delete(url)
+        run_pending()
 
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
 
         # Default profile picture should not be removed from filesystem
         self.assertTrue(os.path.exists(profile_picture_path))
@@ -361,6 +448,7 @@ class UserDetailTest(APITestCase):
         # Delete profile picture
         self.client.delete(url)
         profile.refresh_from_db()
+        sweep_media()
 
         # Profile pic was removed, default picture was set and not removed from storage
         self.assertFalse(os.path.exists(img_path))
@@ -387,8 +475,8 @@ class UserDetailTest(APITestCase):
         self.authorize(self.owner)
 
         # Create two images
-        old_img_file = create_image_file()
-        new_img_file = create_image_file()
+        old_img_file = create_image_file(color=(255, 0, 0))
+        new_img_file = create_image_file(color=(0, 255, 0))
 
         url = reverse(PROFILE_PICTURE_URLPATTERN_NAME, kwargs={"user_pk": self.owner.pk})
 
@@ -403,9 +491,77 @@ class UserDetailTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         self.owner.refresh_from_db()
+        sweep_media()
         self.assertTrue(os.path.exists(self.owner.profile.profile_picture.path))
         self.assertFalse(os.path.exists(old_img_path))
 
+    def test_update_profile_picture_variants(self):
+        """Resized WebP and JPEG variants are generated by background job and listed in srcset."""
+        self.authorize(self.owner)
+        img_file = tempfile.NamedTemporaryFile(suffix=".jpg")
+        Image.new("RGB", (1200, 800), (255, 0, 0)).save(img_file)
+        img_file.seek(0)
+        url = reverse(PROFILE_PICTURE_URLPATTERN_NAME, kwargs={"user_pk": self.owner.pk})
+
+        response = self.client.put(url, {"profile_picture": img_file}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["profile_picture_srcset"], {})
+        run_pending()
+
+        profile = UserProfile.objects.get(user=self.owner)
+        storage = profile.profile_picture.storage
+        for size in settings.PROFILE_PICTURE_SIZES:
+            for variant_format in ("webp", "jpeg"):
+                name = profile.profile_picture_variants[variant_format][str(size)]
+                with Image.open(storage.path(name)) as variant:
+                    self.assertEqual(variant.format, variant_format.upper())
+                    self.assertEqual(max(variant.size), size)
+
+        url = reverse(USER_DETAIL_URLPATTERN_NAME, kwargs={"user_pk": self.owner.pk})
+        srcset = self.client.get(url).data["profile"]["profile_picture_srcset"]
+        self.assertEqual(srcset["webp"].count("w,"), len(settings.PROFILE_PICTURE_SIZES) - 1)
+        self.assertIn(profile.profile_picture_variants["webp"]["40"] + " 40w", srcset["webp"])
+
+        # Variants are removed together with the picture
+        url = reverse(PROFILE_PICTURE_URLPATTERN_NAME, kwargs={"user_pk": self.owner.pk})
+        self.client.delete(url)
+        sweep_media()
+        self.assertFalse(storage.exists(profile.profile_picture_variants["webp"]["40"]))
+
+    def test_update_profile_picture_deduplicated(self):
+        """Picture is named after its content, identical uploads share single file."""
+        url = reverse(PROFILE_PICTURE_URLPATTERN_NAME, kwargs={"user_pk": self.owner.pk})
+        self.authorize(self.owner)
+        self.client.put(url, {"profile_picture": create_image_file()}, format="multipart")
+        url = reverse(PROFILE_PICTURE_URLPATTERN_NAME, kwargs={"user_pk": self.other_user.pk})
+        self.authorize(self.other_user)
+        self.client.put(url, {"profile_picture": create_image_file()}, format="multipart")
+
+        names = set(UserProfile.objects.values_list("profile_picture", flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        digest = hash_file(create_image_file(), algorithm="sha256")
+        self.assertEqual(name, f"profile_pictures/{digest[:2]}/{digest}.png")
+
+        # Shared file is kept as long as any profile references it
+        self.client.delete(url)
+        sweep_media()
+        storage = UserProfile._meta.get_field("profile_picture").storage
+        self.assertTrue(storage.exists(name))
+
+    def test_sweep_media_grace_period(self):
+        """Recently written files are not collected, references to them may be saved soon."""
+        self.authorize(self.owner)
+        url = reverse(PROFILE_PICTURE_URLPATTERN_NAME, kwargs={"user_pk": self.owner.pk})
+        self.client.put(url, {"profile_picture": create_image_file()}, format="multipart")
+        profile = UserProfile.objects.get(user=self.owner)
+        self.client.delete(url)
+
+        call_command("sweepmedia", stdout=StringIO())
+        self.assertTrue(profile.profile_picture.storage.exists(profile.profile_picture.name))
+        sweep_media()
+        self.assertFalse(profile.profile_picture.storage.exists(profile.profile_picture.name))
+
     def test_update_profile_picture_of_other_user(self):
         """User cannot update profile picture of other user."""
         self.authorize(self.owner)
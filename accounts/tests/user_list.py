@@ -1,6 +1,8 @@
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from utils.functions import build_url
 from .utils import USER_LIST_URLPATTERN_NAME
 from django.contrib.auth.models import User
 
@@ -10,12 +12,22 @@ url = reverse(USER_LIST_URLPATTERN_NAME)
 
 class UserListTest(APITestCase):
     def setUp(self):
-        User.objects.create_user(
+        self.owner = User.objects.create_user(
             username="owner",
             email="owner@mail.com",
             password="test",
         )
 
+    def authorize(self, user):
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+    def create_users(self, usernames):
+        return [
+            User.objects.create_user(username=username, email=f"{username}@mail.com")
+            for username in usernames
+        ]
+
     def test_create_new_user(self):
         """Anyone can create new user."""
         json_data = {"username": "new_user", "password": "password", "email": "user@mail.com"}
@@ -57,3 +69,67 @@ class UserListTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("email", response.data)
         self.assertEqual(len(response.data), 1)
+
+    def test_list_users_unauthorized(self):
+        """User directory is available only for authenticated users."""
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_list_users(self):
+        """Directory contains only public user data and profile fields."""
+        self.authorize(self.owner)
+        self.owner.profile.city = "Warsaw"
+        self.owner.profile.save()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["pk"], self.owner.pk)
+        self.assertEqual(response.data[0]["username"], "owner")
+        self.assertEqual(response.data[0]["profile"]["city"], "Warsaw")
+        self.assertTrue(response.data[0]["profile"]["profile_picture"].endswith("default.png"))
+        self.assertNotIn("email", response.data[0])
+
+    def test_list_users_keyset_pagination(self):
+        """Pages are requested with pk of the last user from the previous page."""
+        self.authorize(self.owner)
+        users = [self.owner] + self.create_users([f"user{i}" for i in range(4)])
+
+        response = self.client.get(build_url(USER_LIST_URLPATTERN_NAME, params={"limit": 2}))
+        self.assertEqual([user["pk"] for user in response.data], [user.pk for user in users[:2]])
+        self.assertIn(f"after={users[1].pk}", response["Link"])
+
+        response = self.client.get(
+            build_url(USER_LIST_URLPATTERN_NAME, params={"limit": 2, "after": users[3].pk})
+        )
+        self.assertEqual([user["pk"] for user in response.data], [users[4].pk])
+        self.assertFalse(response.has_header("Link"))
+
+    def test_list_users_username_prefix(self):
+        """Users can be searched by username prefix."""
+        self.authorize(self.owner)
+        self.create_users(
+            ["anna", "annabelle", "ann", "anton", "bob", "Annika", "ann_1", "ann\u00e9"]
+        )
+
+        response = self.client.get(
+            build_url(USER_LIST_URLPATTERN_NAME, params={"username.prefix": "ann"})
+        )
+        self.assertEqual(
+            [user["username"] for user in response.data],
+            ["anna", "annabelle", "ann", "ann_1", "ann\u00e9"],
+        )
+
+        # Characters special for LIKE patterns are matched literally
+        response = self.client.get(
+            build_url(USER_LIST_URLPATTERN_NAME, params={"username.prefix": "ann_"})
+        )
+        self.assertEqual([user["username"] for user in response.data], ["ann_1"])
+
+    def test_list_users_incorrect_params(self):
+        self.authorize(self.owner)
+        for params in ({"after": "abc"}, {"limit": "0"}, {"limit": "1000"}):
+            response = self.client.get(build_url(USER_LIST_URLPATTERN_NAME, params=params))
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
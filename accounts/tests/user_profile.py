@@ -0,0 +1,51 @@
+from django.contrib.auth.models import User
+from rest_framework.test import APITestCase
+
+from ..models import UserProfile
+from ..signals import deferred_profile_creation
+
+
+class UserProfileTest(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username="owner", email="owner@mail.com", password="test"
+        )
+        self.owner = User.objects.get(pk=self.owner.pk)
+
+    def test_save_user_without_loaded_profile(self):
+        """Saving user does not touch profile which was not loaded."""
+        with self.assertNumQueries(1):
+            self.owner.save()
+
+    def test_save_user_with_unchanged_profile(self):
+        """Loaded but unchanged profile is not saved together with the user."""
+        self.owner.profile
+        with self.assertNumQueries(1):
+            self.owner.save()
+
+    def test_save_user_with_changed_profile(self):
+        """Only changed profile fields are saved together with the user."""
+        self.owner.profile.city = "Warsaw"
+        self.assertEqual(self.owner.profile.changed_fields, ["city"])
+        with self.assertNumQueries(2):
+            self.owner.save()
+        self.assertEqual(self.owner.profile.changed_fields, [])
+        self.assertEqual(UserProfile.objects.get(user=self.owner).city, "Warsaw")
+
+    def test_deferred_profile_creation(self):
+        """Profiles of users created inside the block are inserted with single query."""
+        with self.assertNumQueries(6):
+            with deferred_profile_creation():
+                users = [
+                    User.objects.create(username=f"user{i}", email=f"user{i}@mail.com")
+                    for i in range(5)
+                ]
+        self.assertEqual(UserProfile.objects.filter(user__in=users).count(), 5)
+        self.assertEqual(users[0].profile.changed_fields, [])
+
+    def test_refresh_profile_from_db(self):
+        """Values loaded by refresh_from_db are not reported as changes."""
+        profile = self.owner.profile
+        UserProfile.objects.filter(pk=profile.pk).update(city="Warsaw")
+        profile.refresh_from_db()
+        self.assertEqual(profile.changed_fields, [])
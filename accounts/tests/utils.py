@@ -9,9 +9,9 @@ EMAIL_RESET_URLPATTERN_NAME = "email-reset"
 PROFILE_PICTURE_URLPATTERN_NAME = "profile-picture"
 
 
-def create_image_file(suffix=".png"):
+def create_image_file(suffix=".png", color=(255, 0, 0)):
     """Generate blank image file and return file object."""
-    img = Image.new("RGB", (100, 100), (255, 0, 0))
+    img = Image.new("RGB", (100, 100), color)
     img_file = tempfile.NamedTemporaryFile(suffix=suffix)
     img.save(img_file)
     img_file.seek(0)
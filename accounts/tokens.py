@@ -0,0 +1,15 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .blacklist import blacklist_cache
+
+
+class RefreshToken(tokens.RefreshToken):
+    """Refresh token which checks the blacklist through in-memory BlacklistCache."""
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if blacklist_cache.is_blacklisted(jti):
+            raise TokenError(_("Token is blacklisted"))
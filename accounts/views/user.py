@@ -1,3 +1,5 @@
+import sys
+
 from api.permissions import IsHisResource, IsUserOrReadOnly  # TODO: move to utils?
 from django.contrib.auth.models import User
 from django.http import Http404
@@ -6,7 +8,13 @@ from rest_framework.decorators import api_view
 from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from utils.routers import PRIMARY_DB
+from utils.views import ReplicaReadMixin
+from accounts.cache import get_public_profile
+from accounts.images import srcset
 from accounts.models import UserProfile
+from jobs.runner import enqueue
+from jobs.views.job import job_accepted_response
 
 # TODO: switch to that import later
 from accounts.serializers import UserProfilePictureSerializer
@@ -29,13 +37,23 @@ def current_user(request):
     return Response(serializer.data)
 
 
-class UserList(APIView):
-    """
-    Create a new user. It's called 'UserList' because normally we'd have a get
-    method here too, for retrieving a list of all User objects.
+class UserList(ReplicaReadMixin, APIView):
+    """Create a new user or browse the user directory.
+
+    POST:
+        Accessible for anyone.
+    GET:
+        Accessible for any authenticated user.
     """
 
-    permission_classes = (permissions.AllowAny,)
+    # Page size of the user directory
+    DEFAULT_LIMIT = 50
+    MAX_LIMIT = 100
+
+    def get_permissions(self):
+        if self.request.method == "POST":
+            return [permissions.AllowAny()]
+        return [permissions.IsAuthenticated()]
 
     def post(self, request, format=None):
         """
@@ -48,15 +66,91 @@ class UserList(APIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def list_queryset(query_params):
+        """Apply querystring params of the list endpoint (see `get`) to the queryset. Returns None
+        if params are invalid."""
+        username_prefix = query_params.get("username.prefix", None)
+        after = query_params.get("after", None)
+        limit = query_params.get("limit", None)
+
+        # Validation
+        if after is not None and not after.isdigit():
+            return None
+        if limit is not None and not (limit.isdigit() and 0 < int(limit) <= UserList.MAX_LIMIT):
+            return None
+
+        queryset = User.objects.filter(is_active=True)
+        if username_prefix:
+            # Range is served by the index on username (LIKE can't use it with SQLite BINARY
+            # collation), startswith keeps only exact prefix matches under other collations
+            queryset = queryset.filter(
+                username__gte=username_prefix, username__startswith=username_prefix
+            )
+            if username_prefix[-1] != chr(sys.maxunicode):
+                upper_bound = username_prefix[:-1] + chr(ord(username_prefix[-1]) + 1)
+                queryset = queryset.filter(username__lt=upper_bound)
+        if after:
+            queryset = queryset.filter(pk__gt=after)
+        queryset = queryset.order_by("pk")[: int(limit or UserList.DEFAULT_LIMIT)]
+
+        return queryset.values(
+            "pk",
+            "username",
+            "profile__city",
+            "profile__country",
+            "profile__profile_picture",
+            "profile__profile_picture_variants",
+        )
+
     def get(self, request, format=None):
-        users = [user for user in User.objects.all()]
-        serializer = UserSerializer(data=users, many=True)
-        if serializer.is_valid():
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        return Response(serializer.data)
+        """Return a page of active users ordered by pk.
 
+        Querystring params:
+            ?username.prefix=<str>:
+                Users whose username starts with given string (case sensitive).
+            ?after=<int>:
+                Users with pk greater than given value. Pass pk of the last user from the previous
+                page to get the next one (URL of the next page is also sent in Link header).
+            ?limit=<int>:
+                Number of users on the page, at most 100 (default 50).
+        """
+        queryset = self.list_queryset(request.query_params)
+        if queryset is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        storage = UserProfile._meta.get_field("profile_picture").storage
+        users = [
+            {
+                "pk": row["pk"],
+                "username": row["username"],
+                "profile": {
+                    "city": row["profile__city"],
+                    "country": row["profile__country"],
+                    "profile_picture": request.build_absolute_uri(
+                        storage.url(row["profile__profile_picture"])
+                    ),
+                    "profile_picture_srcset": srcset(
+                        storage,
+                        row["profile__profile_picture_variants"],
+                        request.build_absolute_uri,
+                    ),
+                },
+            }
+            for row in queryset
+        ]
+
+        headers = {}
+        limit = int(request.query_params.get("limit", self.DEFAULT_LIMIT))
+        if len(users) == limit:
+            query_params = request.query_params.copy()
+            query_params["after"] = users[-1]["pk"]
+            next_url = request.build_absolute_uri(f"{request.path}?{query_params.urlencode()}")
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        return Response(users, status=status.HTTP_200_OK, headers=headers)
 
-class UserDetail(APIView):
+
+class UserDetail(ReplicaReadMixin, APIView):
     """Read and update user profile data.
 
     GET:
@@ -65,26 +159,31 @@ class UserDetail(APIView):
     PUT:
         Accessible only for users trying to change their own profile data.
     DELETE:
-        Accessible only for users wanting to delete their own account.
+        Accessible only for users wanting to delete their own account. Account is deactivated
+        immediately and removed by background job, response contains job URL to poll.
     """
 
     permission_classes = (permissions.IsAuthenticated, IsUserOrReadOnly)
 
-    def get_object(self, pk):
+    def get_object(self, pk, using=None):
         try:
-            user = User.objects.get(pk=pk)
+            user = User.objects.using(using).select_related("profile").get(pk=pk)
             self.check_object_permissions(request=self.request, obj=user)
             return user
         except User.DoesNotExist:
             raise Http404
 
     def get(self, request, user_pk, format=None):
-        user = self.get_object(user_pk)
         if request.user.pk == user_pk:
-            serializer = FullUserDetailSerializer(user)
-        else:
-            serializer = BasicUserDetailSerializer(user)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            serializer = FullUserDetailSerializer(self.get_object(user_pk))
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        # Cached profile is served for the whole timeout, so it is read from the primary: replica
+        # could still return data from before the update which invalidated the cache entry
+        data = get_public_profile(
+            user_pk,
+            lambda: BasicUserDetailSerializer(self.get_object(user_pk, using=PRIMARY_DB)).data,
+        )
+        return Response(data, status=status.HTTP_200_OK)
 
     def put(self, request, user_pk, format=None):
         user = self.get_object(user_pk)
@@ -96,9 +195,13 @@ class UserDetail(APIView):
 
     def delete(self, request, user_pk, format=None):
         user = self.get_object(user_pk)
-        user.profile.delete()
-        user.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        # Removal cascades through all user exercises and routines, so it is done in background.
+        # Account is deactivated right away to block further logins.
+        user.is_active = False
+        user.save(update_fields=["is_active"])
+        job = enqueue("accounts.delete_user", owner=user, user_pk=user.pk)
+        # Deactivated user can't authenticate anymore, so the job URL contains job token
+        return job_accepted_response(job, with_token=True)
 
 
 class UserPasswordUpdate(generics.UpdateAPIView):
@@ -121,13 +224,6 @@ class UserProfilePicture(APIView):
     permission_classes = (permissions.IsAuthenticated, IsHisResource)
     parser_classes = (MultiPartParser,)
 
-    @staticmethod
-    def delete_profile_picture_from_storage(profile):
-        """Delete current profile picture for profile instance only when it is not default."""
-        if profile.profile_picture.name != profile._meta.get_field("profile_picture").default:
-            storage = profile.profile_picture.storage
-            storage.delete(profile.profile_picture.name)
-
     def get_object(self, pk):
         try:
             profile = UserProfile.objects.get(user_id=pk)
@@ -140,15 +236,22 @@ class UserProfilePicture(APIView):
         profile = self.get_object(user_pk)
         serializer = UserProfilePictureSerializer(profile, data=request.data)
         if serializer.is_valid():
-            self.delete_profile_picture_from_storage(profile=profile)
-            serializer.save()
+            # Previous picture is removed from storage by garbage collection (see sweepmedia)
+            profile = serializer.save(profile_picture_variants={})
+            # Resized variants are generated in background and added to the profile srcset
+            enqueue(
+                "accounts.process_profile_picture",
+                owner=request.user,
+                user_pk=user_pk,
+                picture_name=profile.profile_picture.name,
+            )
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, user_pk, format=None):
         profile = self.get_object(user_pk)
-        self.delete_profile_picture_from_storage(profile=profile)
         # Restore default profile picture
         profile.profile_picture = UserProfile().profile_picture
+        profile.profile_picture_variants = {}
         profile.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
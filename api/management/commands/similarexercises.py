@@ -0,0 +1,25 @@
+from api.recommendations import refresh, refresh_all
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Precompute similar exercises (see api.recommendations)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--exercise",
+            type=int,
+            action="append",
+            dest="exercise_pks",
+            help="Only refresh after changes of exercise with this pk (can be repeated).",
+        )
+        parser.add_argument(
+            "--count", type=int, help="Number of neighbours (SIMILAR_EXERCISES_COUNT by default)."
+        )
+
+    def handle(self, *args, **options):
+        if options["exercise_pks"]:
+            n_exercises = refresh(options["exercise_pks"], k=options["count"])
+        else:
+            n_exercises = refresh_all(k=options["count"])
+        self.stdout.write(f"Similar exercises computed for {n_exercises} exercises")
@@ -0,0 +1,164 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:44
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Muscle',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(choices=[('cal', 'Calves'), ('qua', 'Quadriceps'), ('ham', 'Hamstrings'), ('glu', 'Gluteus'), ('lob', 'Lower back'), ('lat', 'Lats'), ('sca', 'Scapular muscles'), ('abs', 'Abdominals'), ('pec', 'Pectorals'), ('tra', 'Trapezius'), ('del', 'Deltoids'), ('tri', 'Triceps'), ('bic', 'Biceps'), ('for', 'Forearms')], max_length=3, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WorkoutLogEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='YoutubeLink',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Exercise',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('kind', models.CharField(choices=[('rep', 'reps'), ('rew', 'reps x weight'), ('tim', 'time'), ('dis', 'distance')], max_length=3)),
+                ('instructions', models.TextField(blank=True)),
+                ('forks_count', models.IntegerField(default=0)),
+                ('trending_score', models.FloatField(default=0)),
+                ('muscles_mask', models.PositiveIntegerField(default=0)),
+                ('content_source', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='content_references', to='api.exercise')),
+                ('forked_from', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='forks', to='api.exercise')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('muscles', models.ManyToManyField(to='api.muscle')),
+                ('tags', models.ManyToManyField(to='api.tag')),
+                ('tutorials', models.ManyToManyField(to='api.youtubelink')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Routine',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('kind', models.CharField(choices=[('sta', 'standard'), ('cir', 'circuit')], max_length=3)),
+                ('instructions', models.TextField(blank=True)),
+                ('forks_count', models.IntegerField(default=0)),
+                ('trending_score', models.FloatField(default=0)),
+                ('forked_from', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='forks', to='api.routine')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RoutineUnit',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sets', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(100)])),
+                ('instructions', models.TextField(blank=True)),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='routine_units', to='api.exercise')),
+                ('routine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='routine_units', to='api.routine')),
+            ],
+            options={
+                'ordering': ['position', 'pk'],
+            },
+        ),
+        migrations.AddField(
+            model_name='routine',
+            name='exercises',
+            field=models.ManyToManyField(related_name='routines', through='api.RoutineUnit', to='api.exercise'),
+        ),
+        migrations.CreateModel(
+            name='Workout',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(auto_now_add=True)),
+                ('completed', models.BooleanField(default=False)),
+                ('routine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='workouts', to='api.routine')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExerciseLineage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='api.exercise')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='api.exercise')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='api_exercis_descend_996962_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ExerciseNeighbour',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similarity', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbour_links', to='api.exercise')),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.exercise')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['exercise', 'rank'], name='api_exercis_exercis_6634a2_idx')],
+                'unique_together': {('exercise', 'neighbour')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RoutineLineage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='api.routine')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='api.routine')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='api_routine_descend_375410_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='routineunit',
+            index=models.Index(fields=['routine', 'position'], name='api_routine_routine_3e54de_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='routine',
+            index=models.Index(fields=['trending_score', 'id'], name='api_routine_trendin_fcd4bf_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='routine',
+            unique_together={('name', 'owner')},
+        ),
+        migrations.AddIndex(
+            model_name='exercise',
+            index=models.Index(fields=['trending_score', 'id'], name='api_exercis_trendin_57a6ad_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='exercise',
+            unique_together={('name', 'owner')},
+        ),
+    ]
@@ -1,9 +1,10 @@
-from collections import Counter
+from collections import Counter, defaultdict
 
 from django.contrib.auth.models import User
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
-from django.db.models.fields.related import ManyToManyField
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.functions import Coalesce
 
 
 class Tag(models.Model):
@@ -48,12 +49,31 @@ class Muscle(models.Model):
 
     name = models.CharField(max_length=3, choices=MUSCLES, unique=True)
 
+    @classmethod
+    def mask(cls, names):
+        """Bitmask with bit of every muscle in names set (i-th bit for i-th muscle in MUSCLES)."""
+        bits = {name: 1 << index for index, (name, _) in enumerate(cls.MUSCLES)}
+        mask = 0
+        for name in names:
+            mask |= bits[name]
+        return mask
+
+    @classmethod
+    def names(cls, mask):
+        """Muscle names with bits set in mask (inverse of `mask`)."""
+        return [name for index, (name, _) in enumerate(cls.MUSCLES) if mask & (1 << index)]
+
     def __str__(self):
         return self.name
 
 
 class Exercise(models.Model):
-    """Basic app entity used to represent single exercise."""
+    """Basic app entity used to represent single exercise.
+
+    Forks are copy-on-write: forked exercise gets its own row, but tags, tutorials and muscles are
+    read from content_source (see `content`) until the fork is modified (see `materialize`).
+    Content source always owns its relations, so there are no chains of shared content.
+    """
 
     EXERCISE_KINDS = (
         ("rep", "reps"),
@@ -67,12 +87,24 @@ class Exercise(models.Model):
     instructions = models.TextField(blank=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
     forks_count = models.IntegerField(default=0)
+    # Time-decayed forks count (see api.trending)
+    trending_score = models.FloatField(default=0)
+    forked_from = models.ForeignKey(
+        "self", null=True, blank=True, on_delete=models.SET_NULL, related_name="forks"
+    )
+    # References to deleted content source are materialized first (see api.signals)
+    content_source = models.ForeignKey(
+        "self", null=True, blank=True, on_delete=models.SET_NULL, related_name="content_references"
+    )
+    # Muscles of the content as Muscle.mask, kept up to date by api.signals
+    muscles_mask = models.PositiveIntegerField(default=0)
     tags = models.ManyToManyField(Tag)
     tutorials = models.ManyToManyField(YoutubeLink)
     muscles = models.ManyToManyField(Muscle)
 
     class Meta:
         unique_together = [["name", "owner"]]
+        indexes = [models.Index(fields=["trending_score", "id"])]
 
     def __str__(self):
         return f"Exercise(name={self.name}, kind={self.kind}, owner={self.owner})"
@@ -84,30 +116,79 @@ class Exercise(models.Model):
             return False
         return True
 
+    @property
+    def content(self):
+        """Exercise owning tags, tutorials and muscles of this exercise."""
+        return self.content_source if self.content_source_id is not None else self
+
     def fork(self, new_owner_pk):
         """Copy exercise to another user.
 
+        Only the exercise row is copied, many-to-many relations are shared with the content source
+        until the fork is modified (see `materialize`).
+
         Method assumes that this operation can be done, i.e. there is no name collision meaning that
         new_owner don't have exercise of this name yet. This method also don't automatically
         increase fork count of forked exercise.
         """
-        many_to_many_fieldnames = [
-            field.name for field in self._meta.get_fields() if isinstance(field, ManyToManyField)
-        ]
-        many_to_many_objects = {
-            field: getattr(self, field).all() for field in many_to_many_fieldnames
-        }
-
+        self.forked_from_id = self.pk
+        self.content_source_id = self.content.pk
         self.pk = None
         self.owner = new_owner_pk
         self.forks_count = 0
+        self.trending_score = 0
         self.save()  # pk was set to None, so new db instance will be created
 
-        for field, queryset in many_to_many_objects.items():
-            getattr(self, field).set(queryset)
+        ExerciseLineage.record_fork(self.forked_from_id, self.pk)
 
         return self
 
+    @classmethod
+    def materialize_references(cls, content_source_pk, exercise_pks=None):
+        """Copy many-to-many relations of the content source to exercises sharing them (all of them
+        or only these with exercise_pks) and stop sharing."""
+        references = cls.objects.filter(content_source=content_source_pk)
+        if exercise_pks is not None:
+            references = references.filter(pk__in=exercise_pks)
+        reference_pks = list(references.values_list("pk", flat=True))
+        if not reference_pks:
+            return
+
+        for field in cls._meta.many_to_many:
+            through = field.remote_field.through
+            source_name, target_name = field.m2m_field_name(), field.m2m_reverse_field_name()
+            target_pks = through.objects.filter(**{source_name: content_source_pk}).values_list(
+                f"{target_name}_id", flat=True
+            )
+            through.objects.bulk_create(
+                [
+                    through(**{f"{source_name}_id": pk, f"{target_name}_id": target_pk})
+                    for target_pk in target_pks
+                    for pk in reference_pks
+                ]
+            )
+        cls.objects.filter(pk__in=reference_pks).update(content_source=None)
+
+    @classmethod
+    def update_muscles_masks(cls, pks):
+        """Recompute muscles_mask of exercises with pks (owning their muscles) and forks sharing
+        their content. Returns {pk: mask}."""
+        names = defaultdict(list)
+        for pk, name in cls.muscles.through.objects.filter(exercise__in=pks).values_list(
+            "exercise", "muscle__name"
+        ):
+            names[pk].append(name)
+        masks = {pk: Muscle.mask(names[pk]) for pk in pks}
+        for pk, mask in masks.items():
+            cls.objects.filter(Q(pk=pk) | Q(content_source=pk)).update(muscles_mask=mask)
+        return masks
+
+    def materialize(self):
+        """Give the fork its own copy of shared many-to-many relations (before modifying them)."""
+        if self.content_source_id is not None:
+            Exercise.materialize_references(self.content_source_id, [self.pk])
+            self.content_source = None
+
 
 class Routine(models.Model):
     """Collection of exercises representing single workout template."""
@@ -119,10 +200,16 @@ class Routine(models.Model):
     instructions = models.TextField(blank=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
     forks_count = models.IntegerField(default=0)
+    # Time-decayed forks count (see api.trending)
+    trending_score = models.FloatField(default=0)
+    forked_from = models.ForeignKey(
+        "self", null=True, blank=True, on_delete=models.SET_NULL, related_name="forks"
+    )
     exercises = models.ManyToManyField(Exercise, through="RoutineUnit", related_name="routines")
 
     class Meta:
         unique_together = [["name", "owner"]]
+        indexes = [models.Index(fields=["trending_score", "id"])]
 
     def __str__(self):
         return f"Routine(name={self.name}, kind={self.kind}, owner={self.owner})"
@@ -143,15 +230,121 @@ class Routine(models.Model):
         """Create dictionary with all muscles targeted with specific routine. Each key will
         correspond to specific muscle and value will be integer equal to number of exercise
         targeting this muscle."""
-        muscles_list = [
-            muscle.name
-            for muscle in Muscle.objects.filter(exercise__routine_units__routine__pk=self.pk)
-        ]
+        muscles_list = [name for _, name in Routine.muscles_count_queryset([self.pk])]
         return dict(Counter(muscles_list))
 
+    @staticmethod
+    def muscles_count_queryset(routine_pks):
+        """Queryset of (routine pk, muscle name) pairs used to compute muscles_count for many
+        routines with single query."""
+        # Exercise either owns its muscles or shares them with its content source, never both
+        return (
+            RoutineUnit.objects.filter(routine__in=routine_pks)
+            .annotate(
+                muscle_name=Coalesce(
+                    "exercise__muscles__name", "exercise__content_source__muscles__name"
+                )
+            )
+            .filter(muscle_name__isnull=False)
+            .order_by()
+            .values_list("routine", "muscle_name")
+        )
+
+    def fork(self, new_owner):
+        """Copy routine to another user.
+
+        Routine many-to-many relation with exercises works as follows: if new owner already owns an
+        exercise contained in routine (exercise name must match) his version will be used,
+        otherwise according exercise will be forked along.
+
+        Method assumes that this operation can be done, i.e. there is no name collision meaning that
+        new_owner don't have routine of this name yet. This method also don't automatically
+        increase fork count of forked routine.
+        """
+        # Evaluate before pk is changed, otherwise units of the new routine would be fetched
+        routine_units = list(self.routine_units.select_related("exercise"))
+
+        self.forked_from_id = self.pk
+        self.pk = None
+        self.owner = new_owner
+        self.forks_count = 0
+        self.trending_score = 0
+        self.save()  # pk was set to None, so new db instance will be created
+
+        RoutineLineage.record_fork(self.forked_from_id, self.pk)
+
+        # Scenario 1: new owner already owns an exercise
+        exercises = {
+            exercise.name: exercise
+            for exercise in Exercise.objects.filter(
+                owner=new_owner, name__in={unit.exercise.name for unit in routine_units}
+            )
+        }
+        for routine_unit in routine_units:
+            if routine_unit.exercise.name not in exercises:
+                # Scenario 2: exercise is forked along routine
+                exercises[routine_unit.exercise.name] = routine_unit.exercise.fork(new_owner)
+
+        RoutineUnit.objects.bulk_create(
+            [
+                RoutineUnit(
+                    routine=self,
+                    exercise=exercises[routine_unit.exercise.name],
+                    sets=routine_unit.sets,
+                    instructions=routine_unit.instructions,
+                    position=routine_unit.position,
+                )
+                for routine_unit in routine_units
+            ]
+        )
+
+        return self
+
+    def move_unit(self, from_index, to_index):
+        """Move routine unit at from_index (in routine order) to to_index. Returns False if any of
+        indices is out of range.
+
+        Only the moved unit gets new position (between positions of its new neighbours). If there
+        is no free position between them, all units of the routine are renumbered.
+        """
+        with transaction.atomic():
+            units = list(
+                RoutineUnit.objects.select_for_update()
+                .filter(routine=self)
+                .values_list("pk", "position")
+            )
+            if not (0 <= from_index < len(units) and 0 <= to_index < len(units)):
+                return False
+            if from_index == to_index:
+                return True
+
+            unit_pk, _ = units.pop(from_index)
+            previous_position = units[to_index - 1][1] if to_index > 0 else None
+            next_position = units[to_index][1] if to_index < len(units) else None
+            position = RoutineUnit.position_between(previous_position, next_position)
+            if position is not None:
+                RoutineUnit.objects.filter(pk=unit_pk).update(position=position)
+                return True
+
+            units.insert(to_index, (unit_pk, None))
+            RoutineUnit.objects.bulk_update(
+                [
+                    RoutineUnit(pk=pk, position=RoutineUnit.nth_position(index))
+                    for index, (pk, _) in enumerate(units)
+                ],
+                ["position"],
+            )
+            return True
+
 
 class RoutineUnit(models.Model):
-    """Exercise with additional information used to compose routines."""
+    """Exercise with additional information used to compose routines.
+
+    Units of a routine are ordered by position. Consecutive positions are initially POSITION_GAP
+    apart, so a unit can be moved between two others by changing its own position only.
+    """
+
+    POSITION_GAP = 1024
 
     routine = models.ForeignKey(Routine, on_delete=models.CASCADE, related_name="routine_units")
     exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE, related_name="routine_units")
@@ -159,18 +352,125 @@ class RoutineUnit(models.Model):
         validators=[MinValueValidator(1), MaxValueValidator(100)]
     )
     instructions = models.TextField(blank=True)
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Units created before positions were introduced share position 0 and keep pk order
+        ordering = ["position", "pk"]
+        indexes = [models.Index(fields=["routine", "position"])]
 
     def __str__(self):
         return f"RoutineUnit(routine={self.routine.name}, exercise={self.exercise.name}"
 
+    @classmethod
+    def nth_position(cls, index, start=0):
+        """Position of index-th unit appended after position start."""
+        return start + (index + 1) * cls.POSITION_GAP
+
+    @classmethod
+    def position_between(cls, previous_position, next_position):
+        """Free position between two positions (None stands for the routine boundary). Returns None
+        if there is no such position."""
+        if previous_position is None and next_position is None:
+            return cls.nth_position(0)
+        if next_position is None:
+            return previous_position + cls.POSITION_GAP
+        if previous_position is None:
+            previous_position = -1
+        if next_position - previous_position < 2:
+            return None
+        return (previous_position + next_position) // 2
+
+
+class Lineage(models.Model):
+    """Closure table of the fork relation.
+
+    Forked instance gets one row for each of its ancestors: (ancestor, descendant, depth), where
+    depth is 1 for the instance it was forked from, 2 for the instance that one was forked from
+    and so on. Questions about whole fork trees (original of a fork, all derivatives, number of
+    downstream forks) are then answered with single indexed query instead of walking forked_from
+    references recursively. Rows are removed together with any of their ends, links skipping
+    removed instances remain, so the original is still known after intermediate fork is deleted.
+    """
+
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def record_fork(cls, original_pk, fork_pk):
+        """Add rows for new fork of instance with original_pk."""
+        ancestors = cls.objects.filter(descendant=original_pk).values_list("ancestor", "depth")
+        cls.objects.bulk_create(
+            [cls(ancestor_id=original_pk, descendant_id=fork_pk, depth=1)]
+            + [
+                cls(ancestor_id=ancestor_pk, descendant_id=fork_pk, depth=depth + 1)
+                for ancestor_pk, depth in ancestors
+            ]
+        )
+
+    @classmethod
+    def original(cls, pk):
+        """Row linking instance with pk to its most distant ancestor (None if it is not a fork)."""
+        return (
+            cls.objects.filter(descendant=pk)
+            .select_related("ancestor__owner")
+            .order_by("-depth")
+            .first()
+        )
+
+    @classmethod
+    def descendants(cls, pk):
+        """Rows linking instance with pk to all its forks, forks of forks etc."""
+        return cls.objects.filter(ancestor=pk).select_related("descendant__owner")
+
+
+class ExerciseLineage(Lineage):
+    ancestor = models.ForeignKey(
+        Exercise, on_delete=models.CASCADE, related_name="descendant_links"
+    )
+    descendant = models.ForeignKey(
+        Exercise, on_delete=models.CASCADE, related_name="ancestor_links"
+    )
+
+    class Meta:
+        unique_together = [["ancestor", "descendant"]]
+        indexes = [models.Index(fields=["descendant", "depth"])]
+
+
+class RoutineLineage(Lineage):
+    ancestor = models.ForeignKey(Routine, on_delete=models.CASCADE, related_name="descendant_links")
+    descendant = models.ForeignKey(Routine, on_delete=models.CASCADE, related_name="ancestor_links")
+
+    class Meta:
+        unique_together = [["ancestor", "descendant"]]
+        indexes = [models.Index(fields=["descendant", "depth"])]
+
+
+class ExerciseNeighbour(models.Model):
+    """Precomputed most similar exercises of an exercise (see api.recommendations). Forks sharing
+    content with another exercise have no rows, neighbours of their content source are used."""
+
+    exercise = models.ForeignKey(
+        Exercise, on_delete=models.CASCADE, related_name="neighbour_links"
+    )
+    neighbour = models.ForeignKey(Exercise, on_delete=models.CASCADE, related_name="+")
+    similarity = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = [["exercise", "neighbour"]]
+        indexes = [models.Index(fields=["exercise", "rank"])]
+
 
 class Workout(models.Model):
     """Completed or planned routine. """
 
-    routine = models.ForeignKey(Routine, related_name="workouts", on_delete=...)
+    routine = models.ForeignKey(Routine, related_name="workouts", on_delete=models.CASCADE)
     date = models.DateTimeField(auto_now_add=True)
     completed = models.BooleanField(default=False)
 
 
-class WorkoutLogEntry(model.Model):
+class WorkoutLogEntry(models.Model):
     ...
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""Similar exercise recommendations.
+
+Every exercise owning its content (forks sharing content of another exercise are left out, see
+Exercise.content) is encoded as a binary vector with one component for each tag, muscle and
+exercise kind. Similarity of two exercises is the Jaccard index of their vectors (number of shared
+features divided by number of features of either of them). Similarities are computed with NumPy
+matrix products for batches of exercises and top SIMILAR_EXERCISES_COUNT neighbours of every
+exercise are stored in ExerciseNeighbour table, so reading them is a single indexed query.
+
+The table is filled by `manage.py similarexercises` and refreshed incrementally by the
+`api.refresh_similar_exercises` task after exercises are created, edited or deleted: only the
+changed exercises and exercises whose neighbour lists they enter or leave are recomputed.
+
+Only the neighbour computation and storage are incremental. Every refresh still builds the feature
+matrix of the whole library (reading all tag and muscle relation rows), because new neighbours of
+a recomputed exercise can be any exercise. Refresh jobs queued in the meantime are merged (see
+jobs.registry), so a burst of edits pays for the matrix once.
+"""
+
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+
+from .models import Exercise, ExerciseNeighbour
+
+BATCH_SIZE = 1024
+
+
+def neighbours_count():
+    return getattr(settings, "SIMILAR_EXERCISES_COUNT", 10)
+
+
+def feature_matrix():
+    """Binary feature vectors of exercises owning their content. Returns array of exercise pks and
+    matrix with one row per exercise."""
+    kinds = {kind: index for index, (kind, _) in enumerate(Exercise.EXERCISE_KINDS)}
+    exercises = Exercise.objects.filter(content_source__isnull=True).order_by("pk")
+    rows = list(exercises.values_list("pk", "kind"))
+    pks = np.array([pk for pk, _ in rows], dtype=np.int64)
+    row_index = {pk: index for index, (pk, _) in enumerate(rows)}
+
+    features = defaultdict(list)
+    for index, (_, kind) in enumerate(rows):
+        features[index].append(kinds.get(kind, 0))
+    offset = len(kinds)
+    for field_name in ("tags", "muscles"):
+        field = Exercise._meta.get_field(field_name)
+        through_rows = field.remote_field.through.objects.values_list(
+            f"{field.m2m_field_name()}_id", f"{field.m2m_reverse_field_name()}_id"
+        )
+        columns = {}
+        for exercise_pk, target_pk in through_rows:
+            if exercise_pk in row_index:
+                column = columns.setdefault(target_pk, offset + len(columns))
+                features[row_index[exercise_pk]].append(column)
+        offset += len(columns)
+
+    matrix = np.zeros((len(rows), offset), dtype=np.float32)
+    for index, columns in features.items():
+        matrix[index, columns] = 1
+    return pks, matrix
+
+
+def _similarities(matrix, rows):
+    """Similarities of given rows of matrix (indices into matrix) with all rows, computed in
+    batches of BATCH_SIZE rows. Yields similarity matrix of each batch, with one row for each of
+    its rows. Similarity of a row with itself is 0."""
+    sizes = matrix.sum(axis=1)
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = np.asarray(rows[start : start + BATCH_SIZE])
+        intersection = matrix[batch] @ matrix.T
+        similarity = intersection / (sizes[batch, None] + sizes[None, :] - intersection)
+        similarity[np.arange(len(batch)), batch] = 0  # exercise is not its own neighbour
+        yield similarity
+
+
+def top_neighbours(matrix, rows, k):
+    """Indices and similarities of k most similar rows of matrix for each of given rows (indices
+    into matrix). Rows without any shared feature are not neighbours."""
+    results = []
+    for similarity in _similarities(matrix, rows):
+        n = min(k, similarity.shape[1])
+        candidates = np.argpartition(-similarity, n - 1, axis=1)[:, :n] if n else []
+        for row, row_candidates in zip(similarity, candidates):
+            # Most similar first, ties broken by position (i.e. pk)
+            order = np.lexsort((row_candidates, -row[row_candidates]))
+            results.append(
+                [(index, float(row[index])) for index in row_candidates[order] if row[index] > 0]
+            )
+    return results
+
+
+def _store(pks, rows, neighbours):
+    ExerciseNeighbour.objects.filter(exercise__in=[int(pks[row]) for row in rows]).delete()
+    ExerciseNeighbour.objects.bulk_create(
+        [
+            ExerciseNeighbour(
+                exercise_id=int(pks[row]),
+                neighbour_id=int(pks[index]),
+                similarity=similarity,
+                rank=rank,
+            )
+            for row, row_neighbours in zip(rows, neighbours)
+            for rank, (index, similarity) in enumerate(row_neighbours)
+        ],
+        batch_size=1000,
+    )
+
+
+def refresh_all(k=None):
+    """Recompute neighbours of all exercises."""
+    k = k or neighbours_count()
+    pks, matrix = feature_matrix()
+    rows = list(range(len(pks)))
+    neighbours = top_neighbours(matrix, rows, k)
+    with transaction.atomic():
+        ExerciseNeighbour.objects.all().delete()
+        _store(pks, rows, neighbours)
+    return len(pks)
+
+
+def refresh(exercise_pks, k=None):
+    """Recompute neighbours after exercises with exercise_pks were created, modified or removed.
+    Returns number of exercises with recomputed neighbours."""
+    k = k or neighbours_count()
+    pks, matrix = feature_matrix()
+    row_index = {int(pk): index for index, pk in enumerate(pks)}
+    changed = {row_index[pk] for pk in exercise_pks if pk in row_index}
+
+    # Exercises which just started to own their content (e.g. materialized forks) have no list yet
+    without_neighbours = Exercise.objects.filter(
+        content_source__isnull=True, neighbour_links__isnull=True
+    ).values_list("pk", flat=True)
+    changed.update(row_index[pk] for pk in without_neighbours if pk in row_index)
+
+    # Exercises listing changed or removed exercises
+    affected = {
+        row_index[pk]
+        for pk in ExerciseNeighbour.objects.filter(neighbour__in=exercise_pks).values_list(
+            "exercise", flat=True
+        )
+        if pk in row_index
+    }
+
+    # Exercises whose neighbour list changed exercises enter
+    best = np.zeros(len(pks), dtype=np.float32)
+    for similarity in _similarities(matrix, sorted(changed)):
+        np.maximum(best, similarity.max(axis=0), out=best)
+    candidates = np.flatnonzero(best > 0)
+    for start in range(0, len(candidates), BATCH_SIZE):
+        batch = candidates[start : start + BATCH_SIZE]
+        lists = (
+            ExerciseNeighbour.objects.filter(exercise__in=[int(pks[index]) for index in batch])
+            .values("exercise")
+            .annotate(weakest=Min("similarity"), length=Count("pk"))
+        )
+        weakest = {row["exercise"]: (row["weakest"], row["length"]) for row in lists}
+        for index in batch:
+            weakest_similarity, length = weakest.get(int(pks[index]), (0, 0))
+            if length < k or best[index] > weakest_similarity:
+                affected.add(int(index))
+
+    rows = sorted(changed | affected)
+    neighbours = top_neighbours(matrix, rows, k)
+    with transaction.atomic():
+        # Removed exercises and forks sharing content don't have neighbours
+        ExerciseNeighbour.objects.filter(exercise__in=exercise_pks).delete()
+        _store(pks, rows, neighbours)
+    return len(rows)
@@ -0,0 +1,62 @@
+"""Automatic composition of routines from exercises of a user.
+
+Muscles of every exercise are stored as a bitmask (Exercise.muscles_mask), so the exercise library
+is loaded with a single query over two integer columns and coverage is computed with bitwise
+operations. Routine is built with greedy set cover: exercise covering the most of still uncovered
+target muscles is added until all target muscles are covered or the routine is full. Among
+exercises covering the same number of new muscles the one hitting the fewest muscles already
+covered or outside the target is chosen (minimal redundancy), ties are broken by pk.
+
+Greedy set cover is within a factor of ln(n) of the optimum and with 14 muscles every step only
+has to look at distinct masks (at most 2**14 of them, in practice a few dozen), so the cost does not
+grow with the size of the library past loading it.
+"""
+
+from .models import Exercise, Muscle
+
+
+def exercise_masks(owner_pk, kind=None):
+    """{muscles mask: pk} of exercises of the owner (with given kind). Exercises with the same
+    mask are interchangeable for covering, only the one with the lowest pk is kept."""
+    exercises = Exercise.objects.filter(owner=owner_pk).exclude(muscles_mask=0)
+    if kind is not None:
+        exercises = exercises.filter(kind=kind)
+    masks = {}
+    for pk, mask in exercises.order_by("-pk").values_list("pk", "muscles_mask"):
+        masks[mask] = pk
+    return masks
+
+
+def greedy_cover(masks, target, max_count):
+    """Pks of at most max_count exercises (in order of selection) covering target mask. masks is
+    {mask: pk} (see `exercise_masks`)."""
+    candidates = [(mask, pk) for mask, pk in masks.items() if mask & target]
+    uncovered = target
+    selected = []
+    while uncovered and candidates and len(selected) < max_count:
+        mask, pk = max(
+            candidates,
+            key=lambda item: (
+                (item[0] & uncovered).bit_count(),
+                -(item[0] & ~uncovered).bit_count(),
+                -item[1],
+            ),
+        )
+        selected.append(pk)
+        uncovered &= ~mask
+        candidates = [item for item in candidates if item[0] & uncovered]
+    return selected
+
+
+def build_routine(owner_pk, muscles, max_count, kind=None):
+    """Exercises (pks in order) covering muscles (names) and lists of covered and uncovered
+    muscles."""
+    target = Muscle.mask(muscles)
+    masks = exercise_masks(owner_pk, kind)
+    selected = greedy_cover(masks, target, max_count)
+    selected_pks = set(selected)
+    covered = 0
+    for mask, pk in masks.items():
+        if pk in selected_pks:
+            covered |= mask
+    return selected, Muscle.names(covered & target), Muscle.names(target & ~covered)
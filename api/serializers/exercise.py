@@ -8,23 +8,29 @@ from api.serializers.youtube_link import YoutubeLinkSerializer
 
 
 class ExerciseSerializer(serializers.ModelSerializer):
-    tags = TagSerializer(many=True)
-    tutorials = YoutubeLinkSerializer(many=True)
-    muscles = MuscleSerializer(many=True)
+    # Forks share relations with their content source until modified (see Exercise.content)
+    tags = TagSerializer(many=True, source="content.tags")
+    tutorials = YoutubeLinkSerializer(many=True, source="content.tutorials")
+    muscles = MuscleSerializer(many=True, source="content.muscles")
     owner_username = serializers.CharField(source="owner.username", read_only=True)
     kind_display = serializers.CharField(source="get_kind_display", read_only=True)
     can_be_forked = serializers.SerializerMethodField("_can_be_forked", read_only=True)
 
     def _can_be_forked(self, obj):
+        # Names of exercises owned by requesting user can be precomputed for the whole queryset
+        owned_names = self.context.get("owned_exercise_names")
+        if owned_names is not None:
+            return obj.name not in owned_names
         requesting_user_pk = self.context.get("requesting_user_pk")
         if requesting_user_pk is not None:
             return obj.can_be_forked(requesting_user_pk)
         return None
 
     def create(self, validated_data):
-        tags = validated_data.pop("tags")
-        tutorials = validated_data.pop("tutorials")
-        muscles = validated_data.pop("muscles")
+        content = validated_data.pop("content")
+        tags = content["tags"]
+        tutorials = content["tutorials"]
+        muscles = content["muscles"]
 
         instance = Exercise(**validated_data)
         instance.save()
@@ -44,16 +50,18 @@ class ExerciseSerializer(serializers.ModelSerializer):
         instance.instructions = validated_data.get("instructions")
 
         # Update many-to-many relations
-        new_tags = [
-            Tag.objects.get_or_create(**tag_data)[0] for tag_data in validated_data.get("tags")
-        ]
+        content = validated_data.get("content")
+        new_tags = [Tag.objects.get_or_create(**tag_data)[0] for tag_data in content["tags"]]
         new_tutorials = [
             YoutubeLink.objects.get_or_create(**tutorial_data)[0]
-            for tutorial_data in validated_data.get("tutorials")
-        ]
-        new_muscles = [
-            Muscle.objects.get(**muscle_data) for muscle_data in validated_data.get("muscles")
+            for tutorial_data in content["tutorials"]
         ]
+        new_muscles = [Muscle.objects.get(**muscle_data) for muscle_data in content["muscles"]]
+
+        # Forks of this exercise keep the old content. Shared content of this exercise doesn't need
+        # to be copied, because all relations are replaced.
+        Exercise.materialize_references(instance.pk)
+        instance.content_source = None
         instance.tags.set(new_tags)
         instance.tutorials.set(new_tutorials)
         instance.muscles.set(new_muscles)
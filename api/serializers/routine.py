@@ -1,7 +1,11 @@
+from bisect import bisect_left
+from collections import defaultdict, deque
+
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
-from ..models import Routine
+from ..models import Exercise, Muscle, Routine, RoutineUnit
 from api.serializers.routine_unit import RoutineUnitSerializer
 
 
@@ -11,7 +15,7 @@ class RoutineSerializer(serializers.ModelSerializer):
     kind_display = serializers.CharField(source="get_kind_display", read_only=True)
     can_be_forked = serializers.SerializerMethodField("_can_be_forked", read_only=True)
     can_be_modified = serializers.SerializerMethodField("_can_be_modified", read_only=True)
-    muscles_count = serializers.DictField(read_only=True)
+    muscles_count = serializers.SerializerMethodField("_muscles_count", read_only=True)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -20,11 +24,22 @@ class RoutineSerializer(serializers.ModelSerializer):
         self.fields["exercises"].context.update(self.context)
 
     def _can_be_forked(self, obj):
+        # Names of routines owned by requesting user can be precomputed for the whole queryset
+        owned_names = self.context.get("owned_routine_names")
+        if owned_names is not None:
+            return obj.name not in owned_names
         requesting_user_pk = self.context.get("requesting_user_pk")
         if requesting_user_pk is not None:
             return obj.can_be_forked(requesting_user_pk)
         return None
 
+    def _muscles_count(self, obj):
+        # Muscle histograms can be precomputed for the whole queryset ({routine pk: histogram})
+        muscles_counts = self.context.get("muscles_counts")
+        if muscles_counts is not None:
+            return muscles_counts.get(obj.pk, {})
+        return obj.muscles_count()
+
     def _can_be_modified(self, obj):
         requesting_user_pk = self.context.get("requesting_user_pk")
         if requesting_user_pk is not None:
@@ -58,13 +73,23 @@ class RoutineSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         routine_units = validated_data.pop("routine_units", [])
 
-        instance = Routine(**validated_data)
-        instance.save()
+        with transaction.atomic():
+            instance = Routine(**validated_data)
+            instance.save()
 
-        # Setup many to many relations
-        for routine_unit in routine_units:
-            exercise = routine_unit.pop("exercise")
-            instance.exercises.add(exercise, through_defaults=routine_unit)
+            # Setup many to many relations
+            RoutineUnit.objects.bulk_create(
+                [
+                    RoutineUnit(
+                        routine=instance,
+                        position=RoutineUnit.nth_position(index),
+                        exercise=unit["exercise"],
+                        sets=unit["sets"],
+                        instructions=unit.get("instructions", ""),
+                    )
+                    for index, unit in enumerate(routine_units)
+                ]
+            )
 
         return instance
 
@@ -73,12 +98,131 @@ class RoutineSerializer(serializers.ModelSerializer):
         instance.kind = validated_data.get("kind")
         instance.instructions = validated_data.get("instructions")
 
-        # Clear and setup again many to many relations
-        instance.exercises.clear()
-        for routine_unit in validated_data["routine_units"]:
-            exercise = routine_unit.pop("exercise")
-            instance.exercises.add(exercise, through_defaults=routine_unit)
-
-        instance.save()
+        with transaction.atomic():
+            if "routine_units" in validated_data:
+                self.update_routine_units(instance, validated_data["routine_units"])
+            instance.save()
 
         return instance
+
+    @staticmethod
+    def update_routine_units(instance, routine_units):
+        """Make units of the routine match routine_units (list of validated unit dicts).
+
+        Unit dicts are matched with existing units by pk. Dicts without pk (or with pk of a unit
+        which is not in the routine) are matched with the remaining units of the same exercise, in
+        routine order. Matched units are kept and written only if they changed, unmatched ones are
+        created or deleted, which requires at most four queries regardless of routine length.
+
+        Matched units which are already in the requested order keep their positions, the others
+        get positions between their new neighbours (see Routine.move_unit).
+        """
+        existing_units = list(instance.routine_units.order_by("position", "pk"))
+        units_by_pk = {unit.pk: unit for unit in existing_units}
+
+        matched_units = [units_by_pk.pop(data.get("pk"), None) for data in routine_units]
+        units_by_exercise = defaultdict(deque)
+        for unit in units_by_pk.values():
+            units_by_exercise[unit.exercise_id].append(unit)
+        for index, data in enumerate(routine_units):
+            candidates = units_by_exercise[data["exercise"].pk]
+            if matched_units[index] is None and candidates:
+                matched_units[index] = candidates.popleft()
+
+        positions = _unit_positions([unit and (unit.position, unit.pk) for unit in matched_units])
+
+        changed_units = []
+        new_units = []
+        for unit, data, position in zip(matched_units, routine_units, positions):
+            values = {
+                "exercise_id": data["exercise"].pk,
+                "sets": data["sets"],
+                "instructions": data.get("instructions", ""),
+                "position": position,
+            }
+            if unit is None:
+                new_units.append(RoutineUnit(routine=instance, **values))
+            elif any(getattr(unit, attname) != value for attname, value in values.items()):
+                for attname, value in values.items():
+                    setattr(unit, attname, value)
+                changed_units.append(unit)
+        if changed_units:
+            RoutineUnit.objects.bulk_update(
+                changed_units, ("exercise", "sets", "instructions", "position")
+            )
+        if new_units:
+            RoutineUnit.objects.bulk_create(new_units)
+
+        removed_pks = [unit.pk for units in units_by_exercise.values() for unit in units]
+        if removed_pks:
+            RoutineUnit.objects.filter(pk__in=removed_pks).delete()
+
+        # Units prefetched before the update are stale
+        getattr(instance, "_prefetched_objects_cache", {}).pop("routine_units", None)
+
+
+def _unit_positions(keys):
+    """Positions of units given by their current (position, pk) keys (None for new units), in
+    requested order.
+
+    Units forming the longest run of increasing keys keep their positions, remaining units are
+    placed between their neighbours. If there is no free position, all units are renumbered.
+    """
+    kept = _increasing_subsequence(keys)
+
+    next_positions = [None] * len(keys)
+    next_position = None
+    for index in reversed(range(len(keys))):
+        next_positions[index] = next_position
+        if index in kept:
+            next_position = keys[index][0]
+
+    positions = []
+    previous_position = None
+    for index, key in enumerate(keys):
+        if index in kept:
+            position = key[0]
+        else:
+            position = RoutineUnit.position_between(previous_position, next_positions[index])
+            if position is None:
+                return [RoutineUnit.nth_position(index) for index in range(len(keys))]
+        positions.append(position)
+        previous_position = position
+    return positions
+
+
+def _increasing_subsequence(keys):
+    """Indices of the longest strictly increasing subsequence of keys (None keys are skipped)."""
+    tails = []
+    tail_indices = []
+    previous = {}
+    for index, key in enumerate(keys):
+        if key is None:
+            continue
+        length = bisect_left(tails, key)
+        if length == len(tails):
+            tails.append(key)
+            tail_indices.append(index)
+        else:
+            tails[length] = key
+            tail_indices[length] = index
+        previous[index] = tail_indices[length - 1] if length else None
+
+    indices = set()
+    index = tail_indices[-1] if tail_indices else None
+    while index is not None:
+        indices.add(index)
+        index = previous[index]
+    return indices
+
+
+class RoutineGenerateSerializer(serializers.Serializer):
+    """Parameters of routine generation (see RoutineGenerate view)."""
+
+    muscles = serializers.ListField(
+        child=serializers.ChoiceField(choices=Muscle.MUSCLES), required=False, allow_empty=False
+    )
+    kind = serializers.ChoiceField(choices=Exercise.EXERCISE_KINDS, required=False)
+    max_exercises = serializers.IntegerField(min_value=1, max_value=100)
+    sets = serializers.IntegerField(min_value=1, max_value=100, default=3)
+    routine = serializers.DictField(required=False)
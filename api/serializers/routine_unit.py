@@ -1,21 +1,80 @@
 from rest_framework import serializers
 from rest_framework.validators import ValidationError
 
-from ..models import RoutineUnit
+from ..models import Exercise, RoutineUnit
+
+
+class ExercisePrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """Exercise pk field resolved from exercises loaded in advance by RoutineUnitListSerializer
+    (if available), instead of querying the database for every routine unit."""
+
+    def to_internal_value(self, data):
+        exercises = getattr(self.parent, "loaded_exercises", None)
+        if exercises is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        if pk not in exercises:
+            self.fail("does_not_exist", pk_value=data)
+        return exercises[pk]
+
+
+class RoutineUnitListSerializer(serializers.ListSerializer):
+    """Validates all units of a routine together. Exercises referenced by units are loaded with a
+    single query, errors are reported as a list with one dict per unit."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.child.loaded_exercises = self.load_exercises(data)
+        try:
+            return super().to_internal_value(data)
+        finally:
+            self.child.loaded_exercises = None
+
+    @staticmethod
+    def load_exercises(data):
+        """Map {pk: exercise} of exercises referenced by units in data. Owner of each exercise is
+        checked by RoutineUnitSerializer.validate_exercise, so exercises of other users are
+        reported as not yours rather than missing."""
+        pks = set()
+        for item in data:
+            if isinstance(item, dict):
+                try:
+                    pks.add(int(item.get("exercise")))
+                except (TypeError, ValueError):
+                    pass
+        if not pks:
+            return {}
+        return Exercise.objects.in_bulk(pks)
 
 
 class RoutineUnitSerializer(serializers.ModelSerializer):
     exercise_name = serializers.CharField(source="exercise.name", read_only=True)
     routine_name = serializers.CharField(source="routine.name", read_only=True)
-    # exercise = serializers.PrimaryKeyRelatedField(queryset=Exercise.objects.all())
+    exercise = ExercisePrimaryKeyField(queryset=Exercise.objects.all())
+    # Identifies existing unit when routine is edited (see RoutineSerializer.update_routine_units)
+    pk = serializers.IntegerField(required=False)
 
     class Meta:
         model = RoutineUnit
-        fields = ["routine", "routine_name", "exercise", "exercise_name", "sets", "instructions"]
+        fields = [
+            "pk",
+            "routine",
+            "routine_name",
+            "exercise",
+            "exercise_name",
+            "sets",
+            "instructions",
+        ]
         read_only_fields = ["routine"]
+        list_serializer_class = RoutineUnitListSerializer
 
     def validate_exercise(self, exercise):
         routine_owner_pk = self.context["requesting_user_pk"]
-        if exercise.owner.pk != routine_owner_pk:
+        if exercise.owner_id != routine_owner_pk:
             raise ValidationError("This is not your exercise.")
         return exercise
@@ -0,0 +1,285 @@
+"""Read-only serialization of exercise and routine lists from values() rows.
+
+List endpoints only read data, so the ModelSerializer machinery (field binding, nested serializer
+instances, validators) set up for every row is not needed. Functions below fetch rows with
+values() and a fixed number of queries for the whole list and build the same dicts as
+ExerciseSerializer and RoutineSerializer, in the same key order, so rendered JSON is identical.
+
+Output can be limited to a subset of fields (sparse fieldsets, see `requested_fields`). Only
+columns, relations and precomputed values needed by requested fields are queried.
+
+Serialization is written as a generator which yields querysets and receives their rows, so the same
+code is executed with the sync ORM by `serialize_*` functions and with the async ORM by their
+`aserialize_*` counterparts used by async views.
+"""
+
+from collections import Counter, defaultdict
+
+from ..models import Exercise, Routine, RoutineUnit
+
+EXERCISE_KINDS = dict(Exercise.EXERCISE_KINDS)
+ROUTINE_KINDS = dict(Routine.ROUTINE_KINDS)
+
+EXERCISE_LIST_FIELDS = (
+    "pk",
+    "name",
+    "kind",
+    "kind_display",
+    "owner",
+    "owner_username",
+    "can_be_forked",
+    "forks_count",
+    "tags",
+    "muscles",
+    "tutorials",
+    "instructions",
+)
+ROUTINE_LIST_FIELDS = (
+    "pk",
+    "name",
+    "kind",
+    "kind_display",
+    "owner",
+    "owner_username",
+    "instructions",
+    "can_be_forked",
+    "can_be_modified",
+    "forks_count",
+    "exercises",
+    "muscles_count",
+)
+
+# Columns of values() rows read by each output field
+EXERCISE_FIELD_COLUMNS = {
+    "kind_display": ("kind",),
+    "owner": ("owner_id",),
+    "owner_username": ("owner__username",),
+    "can_be_forked": ("name",),
+    "tags": ("content_source_id",),
+    "muscles": ("content_source_id",),
+    "tutorials": ("content_source_id",),
+}
+ROUTINE_FIELD_COLUMNS = {
+    "kind_display": ("kind",),
+    "owner": ("owner_id",),
+    "owner_username": ("owner__username",),
+    "can_be_forked": ("name",),
+    "can_be_modified": ("owner_id",),
+    "exercises": (),
+    "muscles_count": (),
+}
+
+
+def requested_fields(query_params, available_fields):
+    """Fields selected with ?fields=<comma separated names> or ?omit=<comma separated names>
+    querystring params, in the order of available_fields. Returns None if params are invalid."""
+    fields = query_params.get("fields", None)
+    omit = query_params.get("omit", None)
+    if fields is not None and omit is not None:
+        return None
+    if fields is None and omit is None:
+        return available_fields
+    names = set((fields if fields is not None else omit).split(","))
+    if not names.issubset(available_fields):
+        return None
+    if fields is not None:
+        return tuple(field for field in available_fields if field in names)
+    return tuple(field for field in available_fields if field not in names)
+
+
+def _run(serialization):
+    """Execute serialization generator, evaluating yielded querysets with the sync ORM."""
+    try:
+        queryset = next(serialization)
+        while True:
+            queryset = serialization.send(list(queryset))
+    except StopIteration as stop:
+        return stop.value
+
+
+async def _arun(serialization):
+    """Execute serialization generator, evaluating yielded querysets with the async ORM."""
+    try:
+        queryset = next(serialization)
+        while True:
+            queryset = serialization.send([row async for row in queryset])
+    except StopIteration as stop:
+        return stop.value
+
+
+def _columns(fields, field_columns, with_cursor=False):
+    """Columns for values() needed by fields, pk is always included."""
+    columns = {"pk", "trending_score"} if with_cursor else {"pk"}
+    for field in fields:
+        columns.update(field_columns.get(field, (field,)))
+    return columns
+
+
+def _owned_names(model, user_pk, names):
+    """Names (from names) of model instances owned by user with user_pk."""
+    if user_pk is None:
+        return None
+    owned_names = yield model.objects.filter(owner=user_pk, name__in=names).values_list(
+        "name", flat=True
+    )
+    return set(owned_names)
+
+
+def _related_values(through_model, source_field, target_field, source_pks):
+    """Map {source pk: [target values]} for many-to-many relation, ordered like relation rows."""
+    values = defaultdict(list)
+    rows = yield (
+        through_model.objects.filter(**{f"{source_field}__in": source_pks})
+        .order_by("pk")
+        .values_list(source_field, target_field)
+    )
+    for source_pk, value in rows:
+        values[source_pk].append(value)
+    return values
+
+
+def _content_pk(row):
+    return row["content_source_id"] if row["content_source_id"] is not None else row["pk"]
+
+
+def _can_be_forked(owned_names):
+    if owned_names is None:
+        return lambda row: None
+    return lambda row: row["name"] not in owned_names
+
+
+def serialize_exercise_list(
+    queryset, requesting_user_pk=None, fields=EXERCISE_LIST_FIELDS, with_cursor=False
+):
+    """Equivalent of ExerciseSerializer(queryset, many=True, context=...).data limited to fields.
+
+    With with_cursor=True (trending score, pk) of the last row (None for empty list) is returned
+    along with data, so the next page cursor is built from the same rows (see api.trending).
+    """
+    return _run(_exercise_list(queryset, requesting_user_pk, fields, with_cursor))
+
+
+async def aserialize_exercise_list(
+    queryset, requesting_user_pk=None, fields=EXERCISE_LIST_FIELDS, with_cursor=False
+):
+    """Async version of `serialize_exercise_list`."""
+    return await _arun(_exercise_list(queryset, requesting_user_pk, fields, with_cursor))
+
+
+def _exercise_list(queryset, requesting_user_pk, fields, with_cursor):
+    rows = yield queryset.values(*_columns(fields, EXERCISE_FIELD_COLUMNS, with_cursor))
+
+    getters = {
+        "kind_display": lambda row: EXERCISE_KINDS.get(row["kind"], row["kind"]),
+        "owner": lambda row: row["owner_id"],
+        "owner_username": lambda row: row["owner__username"],
+    }
+    if "can_be_forked" in fields:
+        names = {row["name"] for row in rows}
+        owned_names = yield from _owned_names(Exercise, requesting_user_pk, names)
+        getters["can_be_forked"] = _can_be_forked(owned_names)
+    # Relations of forks are read from their content source (see Exercise.content)
+    if {"tags", "muscles", "tutorials"}.intersection(fields):
+        content_pks = {_content_pk(row) for row in rows}
+    if "tags" in fields:
+        tags = yield from _related_values(
+            Exercise.tags.through, "exercise_id", "tag__name", content_pks
+        )
+        getters["tags"] = lambda row: [{"name": name} for name in tags[_content_pk(row)]]
+    if "muscles" in fields:
+        muscles = yield from _related_values(
+            Exercise.muscles.through, "exercise_id", "muscle__name", content_pks
+        )
+        getters["muscles"] = lambda row: [{"name": name} for name in muscles[_content_pk(row)]]
+    if "tutorials" in fields:
+        tutorials = yield from _related_values(
+            Exercise.tutorials.through, "exercise_id", "youtubelink__url", content_pks
+        )
+        getters["tutorials"] = lambda row: [{"url": url} for url in tutorials[_content_pk(row)]]
+
+    return _build(rows, fields, getters, with_cursor)
+
+
+def serialize_routine_list(
+    queryset, requesting_user_pk=None, fields=ROUTINE_LIST_FIELDS, with_cursor=False
+):
+    """Equivalent of RoutineSerializer(queryset, many=True, context=...).data limited to fields.
+
+    With with_cursor=True (trending score, pk) of the last row (None for empty list) is returned
+    along with data, so the next page cursor is built from the same rows (see api.trending).
+    """
+    return _run(_routine_list(queryset, requesting_user_pk, fields, with_cursor))
+
+
+async def aserialize_routine_list(
+    queryset, requesting_user_pk=None, fields=ROUTINE_LIST_FIELDS, with_cursor=False
+):
+    """Async version of `serialize_routine_list`."""
+    return await _arun(_routine_list(queryset, requesting_user_pk, fields, with_cursor))
+
+
+def _routine_list(queryset, requesting_user_pk, fields, with_cursor):
+    rows = yield queryset.values(*_columns(fields, ROUTINE_FIELD_COLUMNS, with_cursor))
+    pks = {row["pk"] for row in rows}
+
+    getters = {
+        "kind_display": lambda row: ROUTINE_KINDS.get(row["kind"], row["kind"]),
+        "owner": lambda row: row["owner_id"],
+        "owner_username": lambda row: row["owner__username"],
+    }
+    if "can_be_forked" in fields:
+        names = {row["name"] for row in rows}
+        owned_names = yield from _owned_names(Routine, requesting_user_pk, names)
+        getters["can_be_forked"] = _can_be_forked(owned_names)
+    if "can_be_modified" in fields:
+        if requesting_user_pk is None:
+            getters["can_be_modified"] = lambda row: None
+        else:
+            getters["can_be_modified"] = lambda row: requesting_user_pk == row["owner_id"]
+    if "exercises" in fields:
+        units = defaultdict(list)
+        unit_rows = yield (
+            RoutineUnit.objects.filter(routine__in=pks)
+            .order_by("position", "pk")
+            .values(
+                "pk",
+                "routine_id",
+                "routine__name",
+                "exercise_id",
+                "exercise__name",
+                "sets",
+                "instructions",
+            )
+        )
+        for unit in unit_rows:
+            units[unit["routine_id"]].append(
+                {
+                    "pk": unit["pk"],
+                    "routine": unit["routine_id"],
+                    "routine_name": unit["routine__name"],
+                    "exercise": unit["exercise_id"],
+                    "exercise_name": unit["exercise__name"],
+                    "sets": unit["sets"],
+                    "instructions": unit["instructions"],
+                }
+            )
+        getters["exercises"] = lambda row: units[row["pk"]]
+    if "muscles_count" in fields:
+        muscles = defaultdict(list)
+        for routine_pk, muscle_name in (yield Routine.muscles_count_queryset(pks)):
+            muscles[routine_pk].append(muscle_name)
+        getters["muscles_count"] = lambda row: dict(Counter(muscles[row["pk"]]))
+
+    return _build(rows, fields, getters, with_cursor)
+
+
+def _build(rows, fields, getters, with_cursor=False):
+    """Output dicts with fields in order. Fields without getter are copied from the row."""
+    getters = [(field, getters.get(field)) for field in fields]
+    data = [
+        {field: getter(row) if getter is not None else row[field] for field, getter in getters}
+        for row in rows
+    ]
+    if with_cursor:
+        return data, (rows[-1]["trending_score"], rows[-1]["pk"]) if rows else None
+    return data
@@ -0,0 +1,81 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Exercise, Tag
+from .tag_index import tag_index
+
+
+@receiver(pre_delete, sender=Exercise)
+def materialize_exercise_references(sender, instance, **kwargs):
+    """Forks sharing content of deleted exercise get their own copy of it."""
+    Exercise.materialize_references(instance.pk)
+
+
+@receiver(m2m_changed, sender=Exercise.muscles.through)
+def update_exercise_muscles_mask(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep Exercise.muscles_mask in sync with muscles of the exercise."""
+    if reverse:
+        # Muscle side: exercises removed by clear are not known afterwards
+        if action == "pre_clear":
+            instance._cleared_exercise_pks = list(
+                instance.exercise_set.values_list("pk", flat=True)
+            )
+        elif action == "post_clear":
+            Exercise.update_muscles_masks(instance.__dict__.pop("_cleared_exercise_pks", []))
+        elif action in ("post_add", "post_remove"):
+            Exercise.update_muscles_masks(pk_set)
+    elif action in ("post_add", "post_remove", "post_clear"):
+        # Instance can be saved later, so its in-memory value has to be updated as well
+        instance.muscles_mask = Exercise.update_muscles_masks([instance.pk])[instance.pk]
+
+
+@receiver(post_save, sender=Tag)
+def add_to_tag_index(sender, instance, **kwargs):
+    transaction.on_commit(partial(tag_index.add, instance.pk, instance.name))
+
+
+@receiver(post_delete, sender=Tag)
+def remove_from_tag_index(sender, instance, **kwargs):
+    transaction.on_commit(partial(tag_index.remove, instance.pk))
+
+
+def _content_tag_pks(exercise_pk):
+    tags = Exercise.tags.through.objects.filter(exercise=exercise_pk)
+    return list(tags.values_list("tag", flat=True))
+
+
+@receiver(post_save, sender=Exercise)
+def add_fork_tag_usage(sender, instance, created, **kwargs):
+    """Fork sharing content of another exercise gets its tags. Relation rows copied when it stops
+    sharing (see Exercise.materialize_references) don't change usage of the tags."""
+    if created and instance.content_source_id is not None:
+        tag_pks = _content_tag_pks(instance.content_source_id)
+        transaction.on_commit(partial(tag_index.add_usage, tag_pks, 1))
+
+
+@receiver(pre_delete, sender=Exercise)
+def remove_tag_usage(sender, instance, **kwargs):
+    """Tags of deleted exercise (own or shared) lose one use. Forks sharing them get their own copy
+    (see materialize_exercise_references), which doesn't change usage of the tags."""
+    tag_pks = _content_tag_pks(instance.content_source_id or instance.pk)
+    transaction.on_commit(partial(tag_index.add_usage, tag_pks, -1))
+
+
+@receiver(m2m_changed, sender=Exercise.tags.through)
+def update_tag_index_usage(sender, instance, action, reverse, pk_set, **kwargs):
+    """Tags added to or removed from exercise are gained or lost also by forks sharing its content.
+
+    Usage counts of tags changed by clear are corrected when the index is reloaded.
+    """
+    if action not in ("post_add", "post_remove"):
+        return
+    delta = 1 if action == "post_add" else -1
+    if reverse:
+        n_exercises = len(pk_set) + Exercise.objects.filter(content_source__in=pk_set).count()
+        transaction.on_commit(partial(tag_index.add_usage, [instance.pk], delta * n_exercises))
+    else:
+        n_exercises = 1 + instance.content_references.count()
+        transaction.on_commit(partial(tag_index.add_usage, list(pk_set), delta * n_exercises))
@@ -0,0 +1,104 @@
+"""In-memory index of tag names used for autocomplete.
+
+Names are kept in a list sorted by their casefolded form, so tags starting with a prefix form a
+contiguous slice found with two binary searches, without querying the database. Suggestions from
+the slice are ranked by usage count (number of exercises with the tag, including forks sharing tags
+of their content source).
+
+The index is loaded lazily with two queries and updated by signals (see api.signals) in the
+process where tags are created, removed or added to exercises, once the transaction is committed.
+Other processes see these changes after the index is reloaded, which happens every TAG_INDEX_TTL
+seconds.
+"""
+
+import bisect
+import heapq
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import Exercise, Tag
+
+
+class TagIndex:
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = None  # sorted (casefolded name, name) tuples
+        self._names = {}  # {pk: name}
+        self._counts = {}  # {name: usage count}
+        self._loaded_at = 0
+
+    def _load(self):
+        rows = Tag.objects.annotate(usage=Count("exercise")).values_list("pk", "name", "usage")
+        # Forks sharing content have the tags of their content source without own relation rows
+        shared = dict(
+            Exercise.tags.through.objects.values_list("tag")
+            .annotate(usage=Count("exercise__content_references"))
+            .filter(usage__gt=0)
+        )
+        self._names = {pk: name for pk, name, _ in rows}
+        self._counts = {name: usage + shared.get(pk, 0) for pk, name, usage in rows}
+        self._entries = sorted((name.casefold(), name) for name in self._counts)
+        self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        ttl = self.ttl if self.ttl is not None else getattr(settings, "TAG_INDEX_TTL", 300)
+        if self._entries is None or time.monotonic() - self._loaded_at > ttl:
+            self._load()
+
+    def suggest(self, prefix, limit):
+        """Up to limit (name, usage count) pairs of tags starting with prefix (case insensitive),
+        the most used first (ties in alphabetical order)."""
+        key = prefix.casefold()
+        with self._lock:
+            self._ensure_loaded()
+            start = bisect.bisect_left(self._entries, (key,))
+            end = bisect.bisect_left(self._entries, (key + chr(0x10FFFF),), lo=start)
+            names = heapq.nsmallest(
+                limit,
+                (name for _, name in self._entries[start:end]),
+                key=lambda name: (-self._counts[name], name.casefold(), name),
+            )
+            return [(name, self._counts[name]) for name in names]
+
+    def _remove(self, pk):
+        name = self._names.pop(pk, None)
+        if name is not None:
+            index = bisect.bisect_left(self._entries, (name.casefold(), name))
+            del self._entries[index]
+            return self._counts.pop(name)
+        return 0
+
+    def add(self, pk, name):
+        """Add new or renamed tag."""
+        with self._lock:
+            if self._entries is not None and self._names.get(pk) != name:
+                usage = self._remove(pk)
+                self._names[pk] = name
+                self._counts[name] = usage
+                bisect.insort(self._entries, (name.casefold(), name))
+
+    def remove(self, pk):
+        with self._lock:
+            if self._entries is not None:
+                self._remove(pk)
+
+    def add_usage(self, pks, delta):
+        """Change usage count of tags with pks by delta."""
+        with self._lock:
+            if self._entries is not None:
+                for pk in pks:
+                    if pk in self._names:
+                        self._counts[self._names[pk]] += delta
+
+    def clear(self):
+        with self._lock:
+            self._entries = None
+            self._names = {}
+            self._counts = {}
+
+
+tag_index = TagIndex()
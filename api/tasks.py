@@ -0,0 +1,28 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from jobs.registry import task
+
+from .models import Routine
+from .trending import record_fork
+
+
+@task("api.fork_routine")
+def fork_routine(routine_pk, user_pk):
+    """Background version of routine fork done in RoutineDetail.post."""
+    new_owner = User.objects.get(pk=user_pk)
+    with transaction.atomic():
+        routine = Routine.objects.get(pk=routine_pk)
+        if not routine.can_be_forked(new_owner.pk):
+            raise ValueError("You already own routine with this name.")
+        routine.fork(new_owner)
+        record_fork(Routine, routine_pk)
+    return {"routine": routine.pk}
+
+
+@task("api.refresh_similar_exercises", coalesce="exercise_pks")
+def refresh_similar_exercises(exercise_pks):
+    """Update precomputed similar exercises after exercises with exercise_pks were created,
+    modified or removed. Pending refreshes are merged into one."""
+    from .recommendations import refresh
+
+    return {"refreshed": refresh(exercise_pks)}
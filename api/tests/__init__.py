@@ -1,2 +1,4 @@
 from .exercise import ExerciseTest
-from .routine import RoutineTest
\ No newline at end of file
+from .lineage import LineageTest
+from .routine import RoutineTest
+from .tag import TagTest
\ No newline at end of file
@@ -1,10 +1,27 @@
+import math
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
 from django.forms.models import model_to_dict
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
+from jobs.models import Job
+from jobs.runner import enqueue, run_pending
 from rest_framework_simplejwt.tokens import RefreshToken
-from ..models import Exercise, Muscle, Tag, YoutubeLink
+from .. import recommendations
+from ..models import Exercise, ExerciseNeighbour, Muscle, Tag, YoutubeLink
+from ..serializers.exercise import ExerciseSerializer
+from ..trending import event_score, record_fork
+from ..views.exercise import AsyncExerciseDetail, AsyncExerciseList, ExerciseList
 
 
 class ExerciseTest(APITestCase):
@@ -56,9 +73,9 @@ class ExerciseTest(APITestCase):
         self.assertEqual(exercise_dict["owner_username"], exercise_obj.owner.username)
         self.assertEqual(exercise_dict["can_be_forked"], exercise_obj.can_be_forked(user_request))
 
-        tags = [{"name": tag.name} for tag in exercise_obj.tags.all()]
-        muscles = [{"name": muscle.name} for muscle in exercise_obj.muscles.all()]
-        tutorials = [{"url": tutorial.url} for tutorial in exercise_obj.tutorials.all()]
+        tags = [{"name": tag.name} for tag in exercise_obj.content.tags.all()]
+        muscles = [{"name": muscle.name} for muscle in exercise_obj.content.muscles.all()]
+        tutorials = [{"url": tutorial.url} for tutorial in exercise_obj.content.tutorials.all()]
 
         self.assertEqual(exercise_dict["tags"], tags)
         self.assertEqual(exercise_dict["muscles"], muscles)
@@ -186,6 +203,134 @@ class ExerciseTest(APITestCase):
         self.assertTrue(response.data[3]["can_be_forked"])
         self.assertTrue(response.data[4]["can_be_forked"])
 
+    def test_get_exercises_same_as_serializer(self):
+        """List rendered from values() rows is identical to ExerciseSerializer output."""
+        for query in ("", f"?user.neq={self.owner.pk}", "?orderby=-name", "?limit=3"):
+            response = self.client.get(f"{reverse(self.LIST_URLPATTERN_NAME)}{query}")
+            queryset = ExerciseList.list_queryset(response.wsgi_request.GET)
+            expected = ExerciseSerializer(
+                queryset, many=True, context={"requesting_user_pk": self.owner.pk}
+            ).data
+            self.assertEqual(response.content, JSONRenderer().render(expected))
+
+    def test_get_exercises_number_of_queries(self):
+        """Number of queries does not depend on number of exercises."""
+        url = reverse(self.LIST_URLPATTERN_NAME)
+        with self.assertNumQueries(5):
+            self.client.get(url)
+
+    def test_get_exercises_sparse_fieldsets(self):
+        """Only requested fields are returned and only relations they need are queried."""
+        url = reverse(self.LIST_URLPATTERN_NAME)
+        with self.assertNumQueries(1):
+            response = self.client.get(f"{url}?fields=forks_count,pk,kind_display")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data[0]), ["pk", "kind_display", "forks_count"])
+
+        full = self.client.get(url).data
+        response = self.client.get(f"{url}?omit=tags,muscles,tutorials,can_be_forked")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for exercise_dict, full_dict in zip(response.data, full):
+            for field in ("tags", "muscles", "tutorials", "can_be_forked"):
+                full_dict.pop(field)
+            self.assertEqual(exercise_dict, full_dict)
+
+        for querystring in ("fields=pk,password", "omit=owner__email", "fields=pk&omit=name"):
+            response = self.client.get(f"{url}?{querystring}")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        request = APIRequestFactory().get(f"{url}?fields=pk,name,tags")
+        force_authenticate(request, self.owner)
+        response = async_to_sync(AsyncExerciseList.as_view())(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, self.client.get(f"{url}?fields=pk,name,tags").data)
+
+    def test_get_exercises_trending(self):
+        """Recent forks count more than old ones, pages follow each other without gaps."""
+        now = timezone.now()
+        old_favorite, recent, *rest = self.other_user_exercises
+        for _ in range(3):
+            record_fork(Exercise, old_favorite.pk, when=now - timedelta(days=60))
+        record_fork(Exercise, recent.pk, when=now)
+
+        old_favorite.refresh_from_db()
+        self.assertEqual(old_favorite.forks_count, 3)
+        self.assertAlmostEqual(
+            old_favorite.trending_score,
+            event_score(now - timedelta(days=60)) + math.log(3),
+            places=6,
+        )
+
+        url = f"{reverse(self.LIST_URLPATTERN_NAME)}?orderby=trending&limit=2"
+        pks = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pks += [exercise["pk"] for exercise in response.data]
+            url = response.get("Link", "<>").split(">")[0][1:]
+        expected = sorted(Exercise.objects.all(), key=lambda e: (e.trending_score, e.pk))
+        self.assertEqual(pks, [exercise.pk for exercise in reversed(expected)])
+        self.assertEqual(pks[:2], [recent.pk, old_favorite.pk])
+
+        # Next page cursor is taken from the rows of the page, not queried again
+        url = reverse(self.LIST_URLPATTERN_NAME)
+        with CaptureQueriesContext(connection) as trending_queries:
+            response = self.client.get(f"{url}?orderby=trending&limit=2")
+        self.assertIn("after=", response["Link"])
+        with CaptureQueriesContext(connection) as ordered_queries:
+            self.client.get(f"{url}?orderby=-forks_count&limit=2")
+        self.assertEqual(len(trending_queries), len(ordered_queries))
+
+        request = APIRequestFactory().get(
+            f"{reverse(self.LIST_URLPATTERN_NAME)}?orderby=trending&limit=3"
+        )
+        force_authenticate(request, self.owner)
+        response = async_to_sync(AsyncExerciseList.as_view())(request)
+        self.assertEqual([exercise["pk"] for exercise in response.data], pks[:3])
+        self.assertIn("after=", response["Link"])
+
+        for querystring in ("orderby=pk&after=1.0_1", "orderby=trending&after=1", "after=x_1"):
+            response = self.client.get(f"{reverse(self.LIST_URLPATTERN_NAME)}?{querystring}")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_exercises_async(self):
+        """Async list view used under ASGI should return the same data as the sync one."""
+        url = f"{reverse(self.LIST_URLPATTERN_NAME)}?user.neq={self.owner.pk}&orderby=-forks_count"
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, self.owner)
+        response = async_to_sync(AsyncExerciseList.as_view())(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, self.client.get(url).data)
+
+        request = APIRequestFactory().get(f"{reverse(self.LIST_URLPATTERN_NAME)}?limit=three")
+        force_authenticate(request, self.owner)
+        response = async_to_sync(AsyncExerciseList.as_view())(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_exercise_detail_async(self):
+        """Async detail view used under ASGI should return the same data as the sync one."""
+        exercise = self.other_user_exercises[-1]
+        view = AsyncExerciseDetail.as_view()
+
+        url = reverse(self.DETAIL_URLPATTERN_NAME, kwargs={"exercise_id": exercise.pk})
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, self.owner)
+        response = async_to_sync(view)(request, exercise_id=exercise.pk)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertCorrectExercise(response.data, exercise, self.owner)
+
+        request = APIRequestFactory().get(url)
+        response = async_to_sync(view)(request, exercise_id=exercise.pk)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, self.owner)
+        response = async_to_sync(view)(request, exercise_id=0)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_get_exercise_detail(self):
         """Get detail of single exercise."""
         exercise = self.owner_exercises[0]
@@ -436,10 +581,52 @@ class ExerciseTest(APITestCase):
         self.assertEqual(exercise_forked.instructions, exercise_to_fork.instructions)
         for field_name in ("tags", "muscles", "tutorials"):
             self.assertListEqual(
-                list(getattr(exercise_forked, field_name).all()),
+                list(getattr(exercise_forked.content, field_name).all()),
                 list(getattr(exercise_to_fork, field_name).all()),
             )
 
+    def test_fork_exercise_copy_on_write(self):
+        """Forks share relations with the original until either of them is modified."""
+        exercise_to_fork = Exercise.objects.get(owner=self.other_user.pk, name="fork me")
+        url = reverse(self.DETAIL_URLPATTERN_NAME, kwargs={"exercise_id": exercise_to_fork.pk})
+        self.client.post(url)
+        exercise_forked = Exercise.objects.get(owner=self.owner, name="fork me")
+        fork_url = reverse(self.DETAIL_URLPATTERN_NAME, kwargs={"exercise_id": exercise_forked.pk})
+
+        # Fork doesn't copy relations, but reads are the same
+        self.assertEqual(exercise_forked.content_source, exercise_to_fork)
+        self.assertFalse(exercise_forked.tags.exists())
+        response = self.client.get(fork_url)
+        self.assertCorrectExercise(response.data, exercise_forked, self.owner)
+        self.assertEqual(response.data["tags"], [{"name": tag.name} for tag in self.tags])
+        list_response = self.client.get(f"{reverse(self.LIST_URLPATTERN_NAME)}?user.eq=1")
+        self.assertIn(response.data, list_response.data)
+
+        # Modifying original keeps old content of the fork
+        self.authorize(self.other_user)
+        json_data = {
+            "name": "fork me",
+            "kind": "tim",
+            "instructions": "",
+            "tags": [{"name": "t1"}],
+            "muscles": [],
+            "tutorials": [],
+        }
+        response = self.client.put(url, json_data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        exercise_forked.refresh_from_db()
+        self.assertIsNone(exercise_forked.content_source)
+        self.assertEqual(list(exercise_forked.tags.all()), self.tags)
+
+        # Deleting original materializes its forks
+        third_user = User.objects.create_user("third_user", email="third_user@mail.com")
+        fork_of_fork = Exercise.objects.get(pk=exercise_forked.pk).fork(third_user)
+        self.assertEqual(fork_of_fork.content_source, exercise_forked)
+        exercise_forked.delete()
+        fork_of_fork.refresh_from_db()
+        self.assertIsNone(fork_of_fork.content_source)
+        self.assertEqual(list(fork_of_fork.tags.all()), self.tags)
+
     def test_fork_exercise_name_collision(self):
         """Try to fork exercise of other user when you already own an exercise with same name."""
         n_exercises_before = len(Exercise.objects.all())
@@ -461,3 +648,92 @@ class ExerciseTest(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         self.assertEqual(len(Exercise.objects.all()), n_exercises_before)
+
+    def test_get_similar_exercises(self):
+        """Get exercises sharing the most tags, muscles and kind with given exercise."""
+        call_command("similarexercises", stdout=StringIO())
+        exercise1, exercise2 = self.owner_exercises
+        exercise_to_fork = self.other_user_exercises[-1]
+
+        url = reverse("exercise-similar", kwargs={"exercise_id": exercise1.pk})
+        response = self.client.get(url)
+
+        # Exercises without shared features are not similar
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["pk"] for item in response.data], [exercise_to_fork.pk, exercise2.pk]
+        )
+        self.assertAlmostEqual(response.data[0]["similarity"], 3 / 11)
+        self.assertAlmostEqual(response.data[1]["similarity"], 1 / 7)
+        self.assertEqual(response.data[0]["owner_username"], self.other_user.username)
+
+        response = self.client.get(f"{url}?limit=1")
+        self.assertEqual([item["pk"] for item in response.data], [exercise_to_fork.pk])
+
+        # Forks sharing content have the same similar exercises as their content source
+        exercise_forked = exercise_to_fork.fork(self.owner)
+        exercise_to_fork_similar = self.client.get(
+            reverse("exercise-similar", kwargs={"exercise_id": exercise_to_fork.pk})
+        ).data
+        response = self.client.get(
+            reverse("exercise-similar", kwargs={"exercise_id": exercise_forked.pk})
+        )
+        self.assertEqual(response.data, exercise_to_fork_similar)
+
+        response = self.client.get(reverse("exercise-similar", kwargs={"exercise_id": 9999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_similar_exercises_refresh(self):
+        """Similar exercises are updated after exercises are created and deleted."""
+        call_command("similarexercises", stdout=StringIO())
+        exercise1 = self.owner_exercises[0]
+        url = reverse("exercise-similar", kwargs={"exercise_id": exercise1.pk})
+        similar_before = self.client.get(url).data
+
+        json_data = {
+            "name": "exercise 1 copy",
+            "kind": "rep",
+            "tags": [{"name": tag.name} for tag in self.tags],
+            "muscles": [{"name": muscle.name} for muscle in self.muscles[:3]],
+            "tutorials": [],
+        }
+        response = self.client.post(reverse(self.LIST_URLPATTERN_NAME), json_data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        run_pending()
+
+        response = self.client.get(url)
+        self.assertEqual(response.data[0]["pk"], Exercise.objects.get(name="exercise 1 copy").pk)
+        self.assertAlmostEqual(response.data[0]["similarity"], 1)
+        self.assertEqual(response.data[1:], similar_before)
+
+        url_copy = reverse(
+            self.DETAIL_URLPATTERN_NAME, kwargs={"exercise_id": response.data[0]["pk"]}
+        )
+        self.client.delete(url_copy)
+        run_pending()
+
+        self.assertEqual(self.client.get(url).data, similar_before)
+
+    def test_similar_exercises_refresh_batches(self):
+        """Incremental refresh computed in batches gives the same neighbours as full refresh."""
+        call_command("similarexercises", stdout=StringIO())
+        neighbours = ExerciseNeighbour.objects.order_by("exercise", "rank").values_list(
+            "exercise", "neighbour", "rank"
+        )
+        expected = list(neighbours)
+
+        with mock.patch.object(recommendations, "BATCH_SIZE", 1):
+            recommendations.refresh([self.owner_exercises[0].pk])
+            self.assertEqual(list(neighbours), expected)
+
+            ExerciseNeighbour.objects.all().delete()
+            recommendations.refresh([exercise.pk for exercise in self.owner_exercises])
+            self.assertEqual(list(neighbours), expected)
+
+    def test_similar_exercises_refresh_jobs_coalesced(self):
+        """Pending similar exercises refreshes are merged into a single job."""
+        for exercise in self.owner_exercises:
+            enqueue("api.refresh_similar_exercises", exercise_pks=[exercise.pk])
+
+        self.assertEqual(run_pending(), 1)
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
@@ -0,0 +1,112 @@
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..models import Exercise, ExerciseLineage, Routine, RoutineLineage
+
+
+class LineageTest(APITestCase):
+    def authorize(self, user_obj):
+        refresh = RefreshToken.for_user(user_obj)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+    def fork_exercise(self, exercise, user):
+        self.authorize(user)
+        url = reverse("exercise-detail", kwargs={"exercise_id": exercise.pk})
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Exercise.objects.get(owner=user, name=exercise.name)
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(f"user{i}", email=f"user{i}@mail.com") for i in range(4)
+        ]
+        self.exercise = Exercise.objects.create(name="squat", kind="rep", owner=self.users[0])
+
+    def test_exercise_lineage(self):
+        """Forks of forks are linked to all their ancestors."""
+        fork1 = self.fork_exercise(self.exercise, self.users[1])
+        fork2 = self.fork_exercise(fork1, self.users[2])
+        fork3 = self.fork_exercise(self.exercise, self.users[3])
+
+        self.assertEqual(fork2.forked_from, fork1)
+        self.assertEqual(
+            set(ExerciseLineage.objects.values_list("ancestor", "descendant", "depth")),
+            {
+                (self.exercise.pk, fork1.pk, 1),
+                (fork1.pk, fork2.pk, 1),
+                (self.exercise.pk, fork2.pk, 2),
+                (self.exercise.pk, fork3.pk, 1),
+            },
+        )
+
+        url = reverse("exercise-lineage", kwargs={"exercise_id": self.exercise.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data["forked_from"])
+        self.assertIsNone(response.data["original"])
+        self.assertEqual(response.data["descendants_count"], 3)
+        self.assertEqual(
+            [(fork["pk"], fork["depth"]) for fork in response.data["descendants"]],
+            [(fork1.pk, 1), (fork3.pk, 1), (fork2.pk, 2)],
+        )
+
+        response = self.client.get(f"{url}?limit=1")
+        self.assertEqual(response.data["descendants_count"], 3)
+        self.assertEqual(len(response.data["descendants"]), 1)
+
+        url = reverse("exercise-lineage", kwargs={"exercise_id": fork2.pk})
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.data["forked_from"], fork1.pk)
+        self.assertEqual(
+            response.data["original"],
+            {
+                "pk": self.exercise.pk,
+                "name": "squat",
+                "owner": self.users[0].pk,
+                "owner_username": "user0",
+            },
+        )
+        self.assertEqual(response.data["descendants"], [])
+
+        # Original is still known after intermediate fork is removed
+        fork1.delete()
+        response = self.client.get(url)
+        self.assertIsNone(response.data["forked_from"])
+        self.assertEqual(response.data["original"]["pk"], self.exercise.pk)
+
+    def test_exercise_lineage_errors(self):
+        self.authorize(self.users[0])
+        url = reverse("exercise-lineage", kwargs={"exercise_id": self.exercise.pk})
+        response = self.client.get(f"{url}?limit=all")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        url = reverse("exercise-lineage", kwargs={"exercise_id": 1000})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_routine_lineage(self):
+        """Routine forks and exercises forked along are recorded."""
+        routine = Routine.objects.create(name="legs", kind="sta", owner=self.users[0])
+        routine.exercises.add(self.exercise, through_defaults={"sets": 3})
+
+        fork1 = Routine.objects.get(pk=routine.pk).fork(self.users[1])
+        fork2 = Routine.objects.get(pk=fork1.pk).fork(self.users[2])
+
+        self.assertEqual(
+            list(RoutineLineage.descendants(routine.pk).values_list("descendant", "depth")),
+            [(fork1.pk, 1), (fork2.pk, 2)],
+        )
+        self.assertEqual(RoutineLineage.original(fork2.pk).ancestor, routine)
+        self.assertEqual(ExerciseLineage.original(fork2.exercises.get().pk).ancestor, self.exercise)
+
+        self.authorize(self.users[0])
+        url = reverse("routine-lineage", kwargs={"routine_id": fork1.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["forked_from"], routine.pk)
+        self.assertEqual(response.data["original"]["pk"], routine.pk)
+        self.assertEqual(response.data["descendants_count"], 1)
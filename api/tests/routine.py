@@ -1,15 +1,19 @@
 from api.serializers.exercise import ExerciseSerializer
 from api.serializers.routine import RoutineSerializer
 from api.serializers.routine_unit import RoutineUnitSerializer
+from asgiref.sync import async_to_sync
 from django.contrib.auth.models import User
 from django.forms.models import model_to_dict
 from django.urls import reverse
+from jobs.runner import run_pending
 from rest_framework import status
 from rest_framework.exceptions import ErrorDetail
-from rest_framework.test import APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from ..models import Exercise, Routine
+from ..models import Exercise, Muscle, Routine, RoutineUnit
+from ..views.routine import AsyncRoutineDetail, AsyncRoutineList, RoutineList
 
 
 class RoutineTest(APITestCase):
@@ -67,6 +71,7 @@ class RoutineTest(APITestCase):
         # Correct form of deserialized list of routine units
         exercises = [
             {
+                "pk": ru.pk,
                 "routine": ru.routine.pk,
                 "routine_name": ru.routine.name,
                 "exercise": ru.exercise.pk,
@@ -223,6 +228,87 @@ class RoutineTest(APITestCase):
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertEqual(response.data, [])
 
+    def test_get_routines_same_as_serializer(self):
+        """List rendered from values() rows is identical to RoutineSerializer output."""
+        for query in ("", f"?user.neq={self.owner.pk}", "?orderby=-name", "?limit=3"):
+            response = self.client.get(f"{reverse(self.LIST_URLPATTERN_NAME)}{query}")
+            queryset = RoutineList.list_queryset(response.wsgi_request.GET)
+            expected = RoutineSerializer(
+                queryset, many=True, context={"requesting_user_pk": self.owner.pk}
+            ).data
+            self.assertEqual(response.content, JSONRenderer().render(expected))
+
+    def test_get_routines_number_of_queries(self):
+        """Number of queries does not depend on number of routines."""
+        url = reverse(self.LIST_URLPATTERN_NAME)
+        with self.assertNumQueries(4):
+            self.client.get(url)
+
+    def test_get_routines_sparse_fieldsets(self):
+        """Only requested fields are returned and only relations they need are queried."""
+        url = reverse(self.LIST_URLPATTERN_NAME)
+        with self.assertNumQueries(1):
+            response = self.client.get(f"{url}?fields=pk,name,owner_username,can_be_modified")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(response.data[0]), ["pk", "name", "owner_username", "can_be_modified"]
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f"{url}?omit=exercises,muscles_count,can_be_forked")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("exercises", response.data[0])
+
+        for querystring in ("fields=pk,units", "omit=", "fields=pk&omit=name"):
+            response = self.client.get(f"{url}?{querystring}")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        request = APIRequestFactory().get(f"{url}?omit=exercises")
+        force_authenticate(request, self.owner)
+        response = async_to_sync(AsyncRoutineList.as_view())(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, self.client.get(f"{url}?omit=exercises").data)
+
+    def test_get_routines_async(self):
+        """Async list view used under ASGI should return the same data as the sync one."""
+        url = f"{reverse(self.LIST_URLPATTERN_NAME)}?user.neq={self.owner.pk}"
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, self.owner)
+        response = async_to_sync(AsyncRoutineList.as_view())(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), len(self.other_user_routines))
+        for routine_dict, routine_obj in zip(response.data, self.other_user_routines):
+            self.assertCorrectRoutine(routine_dict, routine_obj, self.owner.pk)
+        self.assertEqual(response.data, self.client.get(url).data)
+
+        url = f"{reverse(self.LIST_URLPATTERN_NAME)}?orderby=trending&limit=2&omit=exercises"
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, self.owner)
+        response = async_to_sync(AsyncRoutineList.as_view())(request)
+        sync_response = self.client.get(url)
+
+        self.assertEqual(response.data, sync_response.data)
+        self.assertEqual(response["Link"], sync_response["Link"])
+
+    def test_get_routine_detail_async(self):
+        """Async detail view used under ASGI should return the same data as the sync one."""
+        routine = self.other_user_routines[-1]
+        view = AsyncRoutineDetail.as_view()
+
+        url = reverse(self.DETAIL_URLPATTERN_NAME, kwargs={"routine_id": routine.pk})
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, self.owner)
+        response = async_to_sync(view)(request, routine_id=routine.pk)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertCorrectRoutine(response.data, routine, self.owner.pk)
+
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, self.owner)
+        response = async_to_sync(view)(request, routine_id=0)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_get_routine_detail(self):
         """Get detail of single routine."""
         routine = self.owner_routines[0]
@@ -370,6 +456,31 @@ class RoutineTest(APITestCase):
             },
         )
 
+    def test_create_routine_number_of_queries(self):
+        """Exercises of all routine units are loaded and validated with a single query."""
+        data = {
+            "name": "New routine",
+            "kind": "sta",
+            "owner": self.owner.pk,
+            "exercises": [
+                {"exercise": exercise.pk, "sets": sets}
+                for sets, exercise in enumerate(self.owner_exercises * 4, start=1)
+            ],
+        }
+        serializer = RoutineSerializer(data=data, context={"requesting_user_pk": self.owner.pk})
+
+        # Owner, exercises of units and unique together validation
+        with self.assertNumQueries(3):
+            self.assertTrue(serializer.is_valid())
+        # Savepoint, routine, routine units and savepoint release
+        with self.assertNumQueries(4):
+            routine = serializer.save()
+
+        self.assertEqual(
+            list(routine.routine_units.order_by("pk").values_list("exercise", "sets")),
+            [(unit["exercise"], unit["sets"]) for unit in data["exercises"]],
+        )
+
     def test_create_routine_errors(self):
         """Try to create new routine with only invalid data and expect validation errors."""
         json_data = {
@@ -483,6 +594,157 @@ class RoutineTest(APITestCase):
             ],
         )
 
+    def test_edit_routine_preserves_routine_units(self):
+        """Editing routine keeps identity of routine units matched by exercise."""
+        routine = Routine.objects.get(owner=self.owner.pk, name="Owner routine 1")
+        units = list(routine.routine_units.order_by("pk"))
+        unit_dicts = [
+            {"exercise": unit.exercise, "sets": unit.sets, "instructions": unit.instructions}
+            for unit in units
+        ]
+        unit_dicts[0]["sets"] += 1
+
+        # Single changed unit is updated in place with one query
+        with self.assertNumQueries(2):
+            RoutineSerializer.update_routine_units(routine, unit_dicts)
+        for unit_dict in unit_dicts:
+            unit_dict["exercise"] = unit_dict["exercise"].pk
+        self.assertEqual(
+            list(routine.routine_units.order_by("pk").values_list("pk", "sets")),
+            [(unit.pk, unit_dict["sets"]) for unit, unit_dict in zip(units, unit_dicts)],
+        )
+
+        url = reverse(self.DETAIL_URLPATTERN_NAME, kwargs={"routine_id": routine.pk})
+        json_data = {
+            "name": routine.name,
+            "kind": routine.kind,
+            "instructions": routine.instructions,
+            "exercises": unit_dicts + [{"exercise": self.owner_exercises[0].pk, "sets": 1}],
+        }
+        response = self.client.put(url, json_data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["exercises"]), len(units) + 1)
+        new_units = list(routine.routine_units.order_by("pk"))
+        self.assertEqual([unit.pk for unit in new_units[:-1]], [unit.pk for unit in units])
+        self.assertEqual(new_units[-1].instructions, "")
+
+        json_data["exercises"] = unit_dicts[:1]
+        response = self.client.put(url, json_data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(routine.routine_units.values_list("pk", flat=True)), [units[0].pk])
+
+    def create_routine_with_units(self, exercises):
+        json_data = {
+            "name": "New routine",
+            "kind": "cir",
+            "exercises": [{"exercise": exercise.pk, "sets": 1} for exercise in exercises],
+        }
+        response = self.client.post(reverse(self.LIST_URLPATTERN_NAME), json_data, format="json")
+        return Routine.objects.get(pk=response.data["pk"])
+
+    def test_edit_routine_insert_unit_at_front(self):
+        """Unit inserted before existing ones is the only written row."""
+        routine = self.create_routine_with_units(self.owner_exercises[:4])
+        units = list(routine.routine_units.all())
+        unit_dicts = [{"exercise": self.owner_exercises[4], "sets": 2}] + [
+            {"pk": unit.pk, "exercise": unit.exercise, "sets": unit.sets} for unit in units
+        ]
+
+        with self.assertNumQueries(2):
+            RoutineSerializer.update_routine_units(routine, unit_dicts)
+
+        new_units = list(routine.routine_units.values_list("pk", "exercise", "position"))
+        self.assertEqual(new_units[0][1], self.owner_exercises[4].pk)
+        self.assertEqual(
+            new_units[1:], [(unit.pk, unit.exercise_id, unit.position) for unit in units]
+        )
+
+    def test_edit_routine_delete_middle_unit(self):
+        """Deleting unit from the middle removes that row only, remaining units keep exercises."""
+        routine = self.create_routine_with_units(self.owner_exercises[:4])
+        units = list(routine.routine_units.all())
+        unit_dicts = [
+            {"pk": unit.pk, "exercise": unit.exercise, "sets": unit.sets}
+            for unit in units[:1] + units[2:]
+        ]
+
+        with self.assertNumQueries(2):
+            RoutineSerializer.update_routine_units(routine, unit_dicts)
+
+        self.assertEqual(
+            list(routine.routine_units.values_list("pk", "exercise", "position")),
+            [(unit.pk, unit.exercise_id, unit.position) for unit in units[:1] + units[2:]],
+        )
+
+    def test_edit_routine_matches_units_by_pk(self):
+        """Units sent with pk keep their identity even if exercises are swapped between them."""
+        routine = self.create_routine_with_units(self.owner_exercises[:2])
+        units = list(routine.routine_units.all())
+        url = reverse(self.DETAIL_URLPATTERN_NAME, kwargs={"routine_id": routine.pk})
+        json_data = {
+            "name": routine.name,
+            "kind": routine.kind,
+            "instructions": routine.instructions,
+            "exercises": [
+                {"pk": units[0].pk, "exercise": units[1].exercise_id, "sets": 1},
+                {"pk": units[1].pk, "exercise": units[0].exercise_id, "sets": 1},
+            ],
+        }
+        response = self.client.put(url, json_data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(unit["pk"], unit["exercise"]) for unit in response.data["exercises"]],
+            [(units[0].pk, units[1].exercise_id), (units[1].pk, units[0].exercise_id)],
+        )
+
+    def test_move_routine_unit(self):
+        """Moving unit changes position of that unit only."""
+        json_data = {
+            "name": "New routine",
+            "kind": "cir",
+            "exercises": [
+                {"exercise": exercise.pk, "sets": 1} for exercise in self.owner_exercises[:4]
+            ],
+        }
+        response = self.client.post(reverse(self.LIST_URLPATTERN_NAME), json_data, format="json")
+        routine = Routine.objects.get(pk=response.data["pk"])
+        url = reverse("routine-move-unit", kwargs={"routine_id": routine.pk})
+        units = list(routine.routine_units.values_list("pk", "position"))
+
+        response = self.client.post(url, {"from": len(units) - 1, "to": 0}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        moved_units = list(routine.routine_units.values_list("pk", "position"))
+        self.assertEqual(moved_units[1:], units[:-1])
+        self.assertEqual(moved_units[0][0], units[-1][0])
+
+        response = self.client.get(reverse(self.DETAIL_URLPATTERN_NAME, args=[routine.pk]))
+        self.assertEqual(
+            [unit["exercise"] for unit in response.data["exercises"]],
+            list(routine.routine_units.values_list("exercise", flat=True)),
+        )
+
+        # Units are renumbered when there is no free position left between neighbours
+        routine.routine_units.update(position=0)
+        self.client.post(url, {"from": 0, "to": 1}, format="json")
+        pks = [pk for pk, _ in units]
+        self.assertEqual(
+            list(routine.routine_units.values_list("pk", "position")),
+            [
+                (pk, RoutineUnit.nth_position(index))
+                for index, pk in enumerate([pks[1], pks[0]] + pks[2:])
+            ],
+        )
+
+        for data in ({"from": 0, "to": len(units)}, {"from": "0", "to": 1}, {"from": 0}):
+            response = self.client.post(url, data, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        other_routine = self.other_user_routines[0]
+        url = reverse("routine-move-unit", kwargs={"routine_id": other_routine.pk})
+        response = self.client.post(url, {"from": 0, "to": 1}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     def test_edit_routine_not_owned_by_you(self):
         """Try to edid routine of other user. That should not be possible."""
         json_data = {
@@ -598,6 +860,47 @@ class RoutineTest(APITestCase):
         owner_exercise_data_after = ExerciseSerializer(owner_exercise).data
         self.assertEqual(owner_exercise_data_before, owner_exercise_data_after)
 
+    def test_fork_routine_shares_exercise_content(self):
+        """Exercises forked along the routine share their relations with the original ones."""
+        routine_to_fork = Routine.objects.get(owner=self.other_user.pk, name="Routine to fork")
+        other_exercise = Exercise.objects.get(owner=self.other_user, name="Other exercise 1")
+        other_exercise.muscles.set([Muscle.objects.create(name=name) for name in ("abs", "pec")])
+
+        url = reverse(self.DETAIL_URLPATTERN_NAME, kwargs={"routine_id": routine_to_fork.pk})
+        self.client.post(url)
+        routine_forked = Routine.objects.get(owner=self.owner, name=routine_to_fork.name)
+        exercise_forked = Exercise.objects.get(owner=self.owner, name="Other exercise 1")
+
+        self.assertEqual(exercise_forked.content_source, other_exercise)
+        self.assertFalse(exercise_forked.muscles.exists())
+        self.assertEqual(routine_forked.muscles_count(), {"abs": 1, "pec": 1})
+
+        response = self.client.get(f"{reverse(self.LIST_URLPATTERN_NAME)}?user.eq={self.owner.pk}")
+        routine_dict = next(r for r in response.data if r["pk"] == routine_forked.pk)
+        self.assertEqual(routine_dict["muscles_count"], {"abs": 1, "pec": 1})
+
+    def test_fork_routine_in_background(self):
+        """Fork can be deferred to background job with Prefer header."""
+        routine_to_fork = Routine.objects.get(owner=self.other_user.pk, name="Routine to fork")
+
+        url = reverse(self.DETAIL_URLPATTERN_NAME, kwargs={"routine_id": routine_to_fork.pk})
+        response = self.client.post(url, HTTP_PREFER="respond-async")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(Routine.objects.filter(owner=self.owner, name=routine_to_fork.name))
+
+        run_pending()
+
+        routine_to_fork.refresh_from_db()
+        routine_forked = Routine.objects.get(owner=self.owner, name=routine_to_fork.name)
+        self.assertEqual(routine_to_fork.forks_count, 11)
+        self.assertEqual(
+            routine_forked.routine_units.count(), routine_to_fork.routine_units.count()
+        )
+
+        job_response = self.client.get(response["Location"])
+        self.assertEqual(job_response.data["result"], {"routine": routine_forked.pk})
+
     def test_fork_routine_name_collision(self):
         """Try to fork other user's routine when you already owns a routine with this name."""
         routine_to_fork = Routine.objects.get(owner=self.other_user.pk, name="Same name routine")
@@ -623,3 +926,65 @@ class RoutineTest(APITestCase):
         response = self.client.post(url)
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_generate_routine(self):
+        """Compose routine covering target muscles from your exercises."""
+        builder = User.objects.create_user("builder", email="builder@email.com")
+        self.authorize(builder)
+        muscles = {name: Muscle.objects.get_or_create(name=name)[0] for name, _ in Muscle.MUSCLES}
+
+        def create_exercise(name, kind, muscle_names, owner=builder):
+            exercise = Exercise.objects.create(name=name, kind=kind, owner=owner)
+            exercise.muscles.set([muscles[muscle_name] for muscle_name in muscle_names])
+            return exercise
+
+        legs = create_exercise("legs", "rep", ["cal", "qua", "ham", "glu"])
+        push = create_exercise("push", "rep", ["pec", "del", "tri"])
+        create_exercise("push copy", "rep", ["pec", "del", "tri"])
+        create_exercise("chest", "rep", ["pec"])
+        # Fork shares muscles of the original
+        pull = create_exercise("pull", "rew", ["lat", "bic"], owner=self.other_user).fork(builder)
+        self.assertEqual(pull.muscles_mask, Muscle.mask(["lat", "bic"]))
+
+        url = reverse("routine-generate")
+        target = ["qua", "ham", "pec", "tri", "lat"]
+
+        # Exercise with the least redundancy goes first, duplicates are not used
+        response = self.client.post(url, {"muscles": target, "max_exercises": 3}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["pk"] for item in response.data["exercises"]], [push.pk, legs.pk, pull.pk]
+        )
+        self.assertEqual(response.data["exercises"][0]["muscles"], ["pec", "del", "tri"])
+        self.assertEqual(response.data["uncovered"], [])
+
+        response = self.client.post(
+            url, {"muscles": target, "max_exercises": 5, "kind": "rep"}, format="json"
+        )
+        self.assertEqual([item["pk"] for item in response.data["exercises"]], [push.pk, legs.pk])
+        self.assertEqual(response.data["covered"], ["qua", "ham", "pec", "tri"])
+        self.assertEqual(response.data["uncovered"], ["lat"])
+
+        # Invalid params
+        response = self.client.post(url, {"muscles": ["xxx"], "max_exercises": 3}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, {"muscles": target}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Save as routine
+        response = self.client.post(
+            url,
+            {
+                "muscles": target,
+                "max_exercises": 3,
+                "sets": 4,
+                "routine": {"name": "generated", "kind": "sta"},
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        routine = Routine.objects.get(owner=builder, name="generated")
+        self.assertEqual(
+            [(unit.exercise_id, unit.sets) for unit in routine.routine_units.all()],
+            [(push.pk, 4), (legs.pk, 4), (pull.pk, 4)],
+        )
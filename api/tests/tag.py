@@ -0,0 +1,106 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..models import Exercise, Tag
+from ..tag_index import tag_index
+
+
+class TagTest(APITestCase):
+
+    LIST_URLPATTERN_NAME = "tag-list"
+
+    def authorize(self, user_obj):
+        refresh = RefreshToken.for_user(user_obj)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+    def setUp(self):
+        tag_index.clear()
+        self.owner = User.objects.create_user("owner", email="owner@mail.com")
+        self.authorize(self.owner)
+
+        tags = {name: Tag.objects.create(name=name) for name in ("legs", "Leg", "lats", "abs")}
+        for i, tag_names in enumerate([["legs", "abs"], ["legs", "Leg"], ["legs"], ["Leg"]]):
+            exercise = Exercise.objects.create(name=f"exercise {i}", kind="rep", owner=self.owner)
+            exercise.tags.set([tags[name] for name in tag_names])
+        self.tags = tags
+
+    def tearDown(self):
+        tag_index.clear()
+
+    def get_tags(self, query=""):
+        response = self.client.get(f"{reverse(self.LIST_URLPATTERN_NAME)}{query}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(item["name"], item["usage_count"]) for item in response.data]
+
+    def test_get_tags_by_prefix(self):
+        """Tags starting with prefix (case insensitive) are suggested, the most used first."""
+        self.assertEqual(self.get_tags("?prefix=le"), [("legs", 3), ("Leg", 2)])
+        self.assertEqual(self.get_tags("?prefix=LA"), [("lats", 0)])
+        self.assertEqual(self.get_tags("?prefix=x"), [])
+        self.assertEqual(self.get_tags("?limit=2"), [("legs", 3), ("Leg", 2)])
+        self.assertEqual(len(self.get_tags()), 4)
+
+        response = self.client.get(f"{reverse(self.LIST_URLPATTERN_NAME)}?limit=x")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_tags_without_queries(self):
+        """Loaded index is updated in place and doesn't query the database."""
+        self.get_tags()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name="legpress")
+            exercise = Exercise.objects.get(name="exercise 3")
+            exercise.tags.add(self.tags["lats"])
+            exercise.tags.remove(self.tags["Leg"])
+            self.tags["abs"].delete()
+
+        url = f"{reverse(self.LIST_URLPATTERN_NAME)}?prefix=l"
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(
+            [(item["name"], item["usage_count"]) for item in response.data],
+            [("legs", 3), ("lats", 1), ("Leg", 1), ("legpress", 0)],
+        )
+
+    def test_tags_usage_of_forks(self):
+        """Forks sharing tags of their content source are counted, usage counts kept in place match
+        reloaded index."""
+        self.get_tags()
+        other_user = User.objects.create_user("other_user", email="other_user@mail.com")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            fork = Exercise.objects.get(name="exercise 1").fork(other_user)
+            Exercise.objects.get(name="exercise 1", owner=self.owner).tags.add(self.tags["lats"])
+            # Fork gets its own copy of the tags before it is modified
+            fork.materialize()
+            fork.save()
+            fork.tags.remove(self.tags["Leg"])
+            Exercise.objects.get(name="exercise 0").fork(other_user)
+            Exercise.objects.get(name="exercise 0", owner=self.owner).delete()
+        self.assertEqual(self.get_tags(), [("legs", 4), ("lats", 2), ("Leg", 2), ("abs", 1)])
+
+        tag_index.clear()
+        self.assertEqual(self.get_tags(), [("legs", 4), ("lats", 2), ("Leg", 2), ("abs", 1)])
+
+    def test_tags_rolled_back(self):
+        """Index is not changed by rolled back transaction."""
+        self.get_tags()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                Tag.objects.create(name="legpress")
+                Exercise.objects.get(name="exercise 3").tags.add(self.tags["lats"])
+                Tag.objects.create(name="legpress")
+
+        self.assertEqual(self.get_tags("?prefix=l"), [("legs", 3), ("Leg", 2), ("lats", 0)])
+
+    def test_get_tags_limit(self):
+        """Number of suggested tags is capped regardless of requested limit."""
+        with mock.patch("api.views.tag.MAX_LIMIT", 2):
+            self.assertEqual(self.get_tags("?limit=1000"), [("legs", 3), ("Leg", 2)])
@@ -0,0 +1,85 @@
+"""Time-decayed popularity (trending score) of exercises and routines.
+
+Every fork event is worth exp(-λ (now - t)), where t is time of the event and λ = ln 2 / half-life,
+so the weight of a fork halves every TRENDING_HALF_LIFE seconds. The sum of weights decays as a
+whole, so items can be compared by the sum scaled by exp(λ now) instead. Its logarithm
+
+    trending_score = ln Σ exp(λ t_i)
+
+does not depend on the current time and a fork event only adds exp(λ t) to the sum, so the score
+is updated incrementally in a single row and stored in an indexed column. Ordering by the score
+ranks recent forks above old ones without rescoring the table. Scores are expressed in units of λ,
+so they have to be reset after TRENDING_HALF_LIFE is changed.
+"""
+
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone as django_timezone
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def event_score(when=None):
+    """Score of a single event happening at time when (now by default)."""
+    when = when or django_timezone.now()
+    half_life = getattr(settings, "TRENDING_HALF_LIFE", 7 * 24 * 3600)
+    return math.log(2) / half_life * (when - EPOCH).total_seconds()
+
+
+def add_event(score, when=None):
+    """Score after new event, i.e. ln(exp(score) + exp(event_score))."""
+    new_score = event_score(when)
+    return max(score, new_score) + math.log1p(math.exp(-abs(score - new_score)))
+
+
+def record_fork(model, pk, when=None):
+    """Increase forks count and trending score of model instance with pk."""
+    with transaction.atomic():
+        score = (
+            model.objects.select_for_update().values_list("trending_score", flat=True).get(pk=pk)
+        )
+        model.objects.filter(pk=pk).update(
+            forks_count=F("forks_count") + 1, trending_score=add_event(score, when)
+        )
+
+
+def parse_cursor(value):
+    """Cursor of trending ordering ("<score>_<pk>") as (score, pk) tuple, None if invalid."""
+    score, _, pk = value.rpartition("_")
+    try:
+        score = float(score)
+    except ValueError:
+        return None
+    if not pk.isdigit() or not math.isfinite(score):
+        return None
+    return score, int(pk)
+
+
+def format_cursor(score, pk):
+    return f"{score!r}_{pk}"
+
+
+def order_by_trending(queryset, cursor=None):
+    """Order queryset from the highest trending score (ties broken by pk, so the order is total).
+    With cursor of the last item from the previous page, items following it are returned."""
+    queryset = queryset.order_by("-trending_score", "-pk")
+    if cursor is not None:
+        score, pk = cursor
+        queryset = queryset.filter(Q(trending_score__lt=score) | Q(trending_score=score, pk__lt=pk))
+    return queryset
+
+
+def next_page_headers(request, items, cursor):
+    """Link header with URL of the page following items if the page is full (has ?limit= items).
+    cursor is a function returning cursor of the last item on the page."""
+    limit = request.query_params.get("limit", None)
+    if not items or limit is None or len(items) != int(limit):
+        return {}
+    query_params = request.query_params.copy()
+    query_params["after"] = cursor()
+    next_url = request.build_absolute_uri(f"{request.path}?{query_params.urlencode()}")
+    return {"Link": f'<{next_url}>; rel="next"'}
@@ -1,12 +1,53 @@
+from django.conf import settings
 from django.urls import path
 
-from .views.exercise import ExerciseList, ExerciseDetail
-from .views.routine import RoutineList, RoutineDetail
+from .views.exercise import (
+    AsyncExerciseDetail,
+    AsyncExerciseList,
+    ExerciseDetail,
+    ExerciseList,
+    ExerciseSimilar,
+)
+from .views.lineage import ExerciseLineageDetail, RoutineLineageDetail
+from .views.routine import (
+    AsyncRoutineDetail,
+    AsyncRoutineList,
+    RoutineDetail,
+    RoutineGenerate,
+    RoutineList,
+    RoutineUnitMove,
+)
+from .views.tag import TagList
 
+# Under ASGI read endpoints are served by async views, other methods are handled the same way
+if settings.ASYNC_VIEWS:
+    exercise_list = AsyncExerciseList.as_view()
+    exercise_detail = AsyncExerciseDetail.as_view()
+    routine_list = AsyncRoutineList.as_view()
+    routine_detail = AsyncRoutineDetail.as_view()
+else:
+    exercise_list = ExerciseList.as_view()
+    exercise_detail = ExerciseDetail.as_view()
+    routine_list = RoutineList.as_view()
+    routine_detail = RoutineDetail.as_view()
 
 urlpatterns = [
-    path("exercises/", ExerciseList.as_view(), name="exercise-list"),
-    path("exercises/<int:exercise_id>", ExerciseDetail.as_view(), name="exercise-detail"),
-    path("routines/", RoutineList.as_view(), name="routine-list"),
-    path("routines/<int:routine_id>", RoutineDetail.as_view(), name="routine-detail"),
+    path("exercises/", exercise_list, name="exercise-list"),
+    path("exercises/<int:exercise_id>", exercise_detail, name="exercise-detail"),
+    path(
+        "exercises/<int:exercise_id>/lineage",
+        ExerciseLineageDetail.as_view(),
+        name="exercise-lineage",
+    ),
+    path("exercises/<int:exercise_id>/similar", ExerciseSimilar.as_view(), name="exercise-similar"),
+    path("routines/", routine_list, name="routine-list"),
+    path("routines/generate", RoutineGenerate.as_view(), name="routine-generate"),
+    path("routines/<int:routine_id>", routine_detail, name="routine-detail"),
+    path(
+        "routines/<int:routine_id>/lineage", RoutineLineageDetail.as_view(), name="routine-lineage"
+    ),
+    path(
+        "routines/<int:routine_id>/move-unit", RoutineUnitMove.as_view(), name="routine-move-unit"
+    ),
+    path("tags/", TagList.as_view(), name="tag-list"),
 ]
@@ -1,23 +1,81 @@
-from api.models import Exercise
+from api.models import Exercise, ExerciseNeighbour
 from api.serializers.exercise import ExerciseSerializer
+from api.serializers.rows import (
+    EXERCISE_LIST_FIELDS,
+    aserialize_exercise_list,
+    requested_fields,
+    serialize_exercise_list,
+)
+from api.trending import (
+    format_cursor,
+    next_page_headers,
+    order_by_trending,
+    parse_cursor,
+    record_fork,
+)
 from django.http import Http404
+from jobs.runner import enqueue
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from utils.views import AsyncReadAPIView, ReplicaReadMixin
 
 EXERCISE_FIELDS = [field.name for field in Exercise._meta.get_fields()]
-ORDER_BY_OPTIONS = EXERCISE_FIELDS + [f"-{field}" for field in EXERCISE_FIELDS]
+ORDER_BY_OPTIONS = EXERCISE_FIELDS + [f"-{field}" for field in EXERCISE_FIELDS] + ["trending"]
 
 
-class ExerciseList(APIView):
+class ExerciseList(ReplicaReadMixin, APIView):
 
     permission_classes = (permissions.IsAuthenticated,)
 
+    @staticmethod
+    def list_queryset(query_params, queryset=None):
+        """Apply querystring params of the list endpoint (see `get`) to the queryset. Returns None
+        if params are invalid."""
+        user_pk_filter = query_params.get("user.eq", None)
+        user_pk_exclude = query_params.get("user.neq", None)
+        order_by_field = query_params.get("orderby", None)
+        limit = query_params.get("limit", None)
+        after = query_params.get("after", None)
+
+        # Validation
+        if user_pk_filter is not None and not user_pk_filter.isdigit():
+            return None
+        if user_pk_exclude is not None and not user_pk_exclude.isdigit():
+            return None
+        if limit is not None and not limit.isdigit():
+            return None
+        if order_by_field is not None and order_by_field not in ORDER_BY_OPTIONS:
+            return None
+        if after is not None:
+            cursor = parse_cursor(after)
+            if cursor is None or order_by_field != "trending":
+                return None
+
+        if queryset is None:
+            queryset = Exercise.objects.all()
+
+        if user_pk_filter:
+            queryset = queryset.filter(owner=user_pk_filter)
+        if user_pk_exclude:
+            queryset = queryset.exclude(owner=user_pk_exclude)
+        if order_by_field == "trending":
+            queryset = order_by_trending(queryset, cursor if after is not None else None)
+        elif order_by_field:
+            queryset = queryset.order_by(order_by_field)
+        else:
+            queryset = queryset.order_by("pk")
+        if limit:
+            queryset = queryset[: int(limit)]
+
+        return queryset
+
     def post(self, request, format=None):
         """Adds new exercise for specic user."""
         serializer = ExerciseSerializer(data={**request.data, "owner": request.user.pk})
         if serializer.is_valid():
-            serializer.save()
+            exercise = serializer.save()
+            enqueue("api.refresh_similar_exercises", exercise_pks=[exercise.pk])
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -33,50 +91,44 @@ class ExerciseList(APIView):
             ?orderby=<str>:
                 Name of db column to order queryset. Default order is given by pk values. Django
                 convention is used – the negative sign in front of column name indicates descending
-                order.
+                order. Use `trending` to order by time-decayed number of forks (recent forks
+                count more, see api.trending).
             ?limit=<int>:
                 Limit querysearch to specific number of records.
+            ?after=<str>:
+                Only with ?orderby=trending: records following the last record of the previous
+                page. When page has ?limit= records, URL of the next page is sent in Link header.
+            ?fields=<str>,<str>...:
+                Include only listed fields in each object. Relations and values needed only
+                by omitted fields are not queried.
+            ?omit=<str>,<str>...:
+                Include all fields except listed ones (cannot be combined with fields).
         """
-        user_pk_filter = request.query_params.get("user.eq", None)
-        user_pk_exclude = request.query_params.get("user.neq", None)
-        order_by_field = request.query_params.get("orderby", None)
-        limit = request.query_params.get("limit", None)
-
-        # Validation
-        if user_pk_filter is not None and not user_pk_filter.isdigit():
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        if user_pk_exclude is not None and not user_pk_exclude.isdigit():
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        if limit is not None and not limit.isdigit():
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        if order_by_field is not None and order_by_field not in ORDER_BY_OPTIONS:
+        queryset = self.list_queryset(request.query_params)
+        fields = requested_fields(request.query_params, EXERCISE_LIST_FIELDS)
+        if queryset is None or fields is None:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        queryset = Exercise.objects.all()
-
-        if user_pk_filter:
-            queryset = queryset.filter(owner=user_pk_filter)
-        if user_pk_exclude:
-            queryset = queryset.exclude(owner=user_pk_exclude)
-        if order_by_field:
-            queryset = queryset.order_by(order_by_field)
-        if limit:
-            queryset = queryset[: int(limit)]
-
-        serializer = ExerciseSerializer(
-            queryset, context={"requesting_user_pk": request.user.pk}, many=True
-        )
-
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        headers = {}
+        if request.query_params.get("orderby", None) == "trending":
+            data, last = serialize_exercise_list(
+                queryset, requesting_user_pk=request.user.pk, fields=fields, with_cursor=True
+            )
+            headers = next_page_headers(request, data, lambda: format_cursor(*last))
+        else:
+            data = serialize_exercise_list(
+                queryset, requesting_user_pk=request.user.pk, fields=fields
+            )
+        return Response(data, status=status.HTTP_200_OK, headers=headers)
 
 
-class ExerciseDetail(APIView):
+class ExerciseDetail(ReplicaReadMixin, APIView):
 
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self, pk):
         try:
-            return Exercise.objects.get(pk=pk)
+            return Exercise.objects.select_related("content_source").get(pk=pk)
         except Exercise.DoesNotExist:
             raise Http404
 
@@ -96,6 +148,7 @@ class ExerciseDetail(APIView):
             )
             if serializer.is_valid():
                 serializer.save()
+                enqueue("api.refresh_similar_exercises", exercise_pks=[exercise.pk])
                 return Response(serializer.data, status=status.HTTP_200_OK)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_403_FORBIDDEN)
@@ -120,10 +173,9 @@ class ExerciseDetail(APIView):
         # Create a copy
         exercise.fork(request.user)
 
-        # Increase forks count
+        # Increase forks count and trending score
+        record_fork(Exercise, exercise_id)
         exercise = self.get_object(exercise_id)
-        exercise.forks_count += 1
-        exercise.save()
 
         serializer = ExerciseSerializer(exercise, context={"user_id": request.user.pk})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -134,6 +186,115 @@ class ExerciseDetail(APIView):
         """
         exercise = self.get_object(exercise_id)
         if request.user == exercise.owner:
+            # Rows pointing at the exercise are removed with it, so exercises listing it as similar
+            # are collected upfront
+            exercise_pks = [exercise.pk] + list(
+                ExerciseNeighbour.objects.filter(neighbour=exercise).values_list(
+                    "exercise", flat=True
+                )
+            )
             exercise.delete()
+            enqueue("api.refresh_similar_exercises", exercise_pks=exercise_pks)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_403_FORBIDDEN)
+
+
+class ExerciseSimilar(ReplicaReadMixin, APIView):
+
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, exercise_id, format=None):
+        """Return exercises most similar to specific exercise (sharing the most tags, muscles and
+        kind), precomputed by api.recommendations. Most similar exercises are first.
+
+        Querystring params:
+            ?limit=<int>:
+                Limit list to specific number of exercises.
+        """
+        limit = request.query_params.get("limit", None)
+        if limit is not None and not limit.isdigit():
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        try:
+            exercise = Exercise.objects.only("content_source").get(pk=exercise_id)
+        except Exercise.DoesNotExist:
+            raise Http404
+
+        neighbour_links = (
+            ExerciseNeighbour.objects.filter(exercise=exercise.content_source_id or exercise.pk)
+            .select_related("neighbour__owner")
+            .order_by("rank")
+        )
+        if limit:
+            neighbour_links = neighbour_links[: int(limit)]
+
+        data = [
+            {
+                "pk": link.neighbour.pk,
+                "name": link.neighbour.name,
+                "owner": link.neighbour.owner_id,
+                "owner_username": link.neighbour.owner.username,
+                "similarity": link.similarity,
+            }
+            for link in neighbour_links
+        ]
+        return Response(data, status=status.HTTP_200_OK)
+
+
+async def owned_exercise_names(user_pk, exercises):
+    """Names of given exercises that are also used by exercises of user with user_pk."""
+    queryset = Exercise.objects.filter(
+        owner=user_pk, name__in={exercise.name for exercise in exercises}
+    ).values_list("name", flat=True)
+    return {name async for name in queryset}
+
+
+def prefetch_exercise_relations(queryset):
+    """Load all relations used by ExerciseSerializer in advance."""
+    relations = ["tags", "tutorials", "muscles"]
+    # Relations of forks are read from their content source
+    relations += [f"content_source__{name}" for name in relations]
+    return queryset.select_related("owner", "content_source").prefetch_related(*relations)
+
+
+class AsyncExerciseList(AsyncReadAPIView):
+    """ExerciseList with GET served by async ORM (used under ASGI)."""
+
+    sync_view_class = ExerciseList
+
+    async def aget(self, request, format=None):
+        queryset = ExerciseList.list_queryset(request.query_params)
+        fields = requested_fields(request.query_params, EXERCISE_LIST_FIELDS)
+        if queryset is None or fields is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        headers = {}
+        if request.query_params.get("orderby", None) == "trending":
+            data, last = await aserialize_exercise_list(
+                queryset, requesting_user_pk=request.user.pk, fields=fields, with_cursor=True
+            )
+            headers = next_page_headers(request, data, lambda: format_cursor(*last))
+        else:
+            data = await aserialize_exercise_list(
+                queryset, requesting_user_pk=request.user.pk, fields=fields
+            )
+        return Response(data, status=status.HTTP_200_OK, headers=headers)
+
+
+class AsyncExerciseDetail(AsyncReadAPIView):
+    """ExerciseDetail with GET served by async ORM (used under ASGI)."""
+
+    sync_view_class = ExerciseDetail
+
+    async def aget(self, request, exercise_id, format=None):
+        try:
+            exercise = await prefetch_exercise_relations(Exercise.objects.all()).aget(
+                pk=exercise_id
+            )
+        except Exercise.DoesNotExist:
+            raise Http404
+        context = {
+            "requesting_user_pk": request.user.pk,
+            "owned_exercise_names": await owned_exercise_names(request.user.pk, [exercise]),
+        }
+        serializer = ExerciseSerializer(exercise, context=context)
+        return Response(serializer.data, status=status.HTTP_200_OK)
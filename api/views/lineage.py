@@ -0,0 +1,72 @@
+from api.models import Exercise, ExerciseLineage, Routine, RoutineLineage
+from django.http import Http404
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from utils.views import ReplicaReadMixin
+
+
+def _summary(instance):
+    return {
+        "pk": instance.pk,
+        "name": instance.name,
+        "owner": instance.owner_id,
+        "owner_username": instance.owner.username,
+    }
+
+
+class LineageDetail(ReplicaReadMixin, APIView):
+    """Base view describing where an instance was forked from and what was forked from it."""
+
+    permission_classes = (permissions.IsAuthenticated,)
+    model = None
+    lineage_model = None
+    lookup_url_kwarg = None
+
+    def get(self, request, format=None, **kwargs):
+        """Get fork lineage of an instance.
+
+        Querystring params:
+            ?limit=<int>:
+                Limit list of descendants to specific number of records.
+
+        Response contains pk of the instance it was directly forked from (forked_from), the most
+        distant ancestor (original, null if instance is not a fork), total number of forks in the
+        whole subtree (descendants_count) and the forks themselves, nearest first (descendants).
+        """
+        pk = kwargs[self.lookup_url_kwarg]
+        limit = request.query_params.get("limit", None)
+        if limit is not None and not limit.isdigit():
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            instance = self.model.objects.get(pk=pk)
+        except self.model.DoesNotExist:
+            raise Http404
+
+        original = self.lineage_model.original(pk)
+        descendants = self.lineage_model.descendants(pk).order_by("depth", "descendant")
+        if limit is not None:
+            descendants = descendants[: int(limit)]
+
+        data = {
+            "forked_from": instance.forked_from_id,
+            "original": _summary(original.ancestor) if original is not None else None,
+            "descendants_count": self.lineage_model.descendants(pk).count(),
+            "descendants": [
+                {**_summary(link.descendant), "depth": link.depth} for link in descendants
+            ],
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class ExerciseLineageDetail(LineageDetail):
+    model = Exercise
+    lineage_model = ExerciseLineage
+    lookup_url_kwarg = "exercise_id"
+
+
+class RoutineLineageDetail(LineageDetail):
+    model = Routine
+    lineage_model = RoutineLineage
+    lookup_url_kwarg = "routine_id"
@@ -1,20 +1,80 @@
-from api.models import Exercise, Routine
+from collections import Counter, defaultdict
+
+from api.models import Exercise, Muscle, Routine
 from api.permissions import IsOwnerOrReadOnly
-from api.serializers.routine import RoutineSerializer
-from api.serializers.routine_unit import RoutineUnitSerializer
+from api.routine_builder import build_routine
+from api.serializers.routine import RoutineGenerateSerializer, RoutineSerializer
+from api.serializers.rows import (
+    ROUTINE_LIST_FIELDS,
+    aserialize_routine_list,
+    requested_fields,
+    serialize_routine_list,
+)
+from api.trending import (
+    format_cursor,
+    next_page_headers,
+    order_by_trending,
+    parse_cursor,
+    record_fork,
+)
 from django.http import Http404
+from jobs.runner import enqueue
+from jobs.views.job import job_accepted_response
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from utils.views import AsyncReadAPIView, ReplicaReadMixin
 
 ROUTINE_FIELDS = [field.name for field in Routine._meta.get_fields()]
-ORDER_BY_OPTIONS = ROUTINE_FIELDS + [f"-{field}" for field in ROUTINE_FIELDS]
+ORDER_BY_OPTIONS = ROUTINE_FIELDS + [f"-{field}" for field in ROUTINE_FIELDS] + ["trending"]
 
 
-class RoutineList(APIView):
+class RoutineList(ReplicaReadMixin, APIView):
 
     permission_classes = (permissions.IsAuthenticated,)
 
+    @staticmethod
+    def list_queryset(query_params, queryset=None):
+        """Apply querystring params of the list endpoint (see `get`) to the queryset. Returns None
+        if params are invalid."""
+        user_pk_filter = query_params.get("user.eq", None)
+        user_pk_exclude = query_params.get("user.neq", None)
+        order_by_field = query_params.get("orderby", None)
+        limit = query_params.get("limit", None)
+        after = query_params.get("after", None)
+
+        # Validation
+        if user_pk_filter is not None and not user_pk_filter.isdigit():
+            return None
+        if user_pk_exclude is not None and not user_pk_exclude.isdigit():
+            return None
+        if limit is not None and not limit.isdigit():
+            return None
+        if order_by_field is not None and order_by_field not in ORDER_BY_OPTIONS:
+            return None
+        if after is not None:
+            cursor = parse_cursor(after)
+            if cursor is None or order_by_field != "trending":
+                return None
+
+        if queryset is None:
+            queryset = Routine.objects.all()
+
+        if user_pk_filter:
+            queryset = queryset.filter(owner=user_pk_filter)
+        if user_pk_exclude:
+            queryset = queryset.exclude(owner=user_pk_exclude)
+        if order_by_field == "trending":
+            queryset = order_by_trending(queryset, cursor if after is not None else None)
+        elif order_by_field:
+            queryset = queryset.order_by(order_by_field)
+        else:
+            queryset = queryset.order_by("pk")
+        if limit:
+            queryset = queryset[: int(limit)]
+
+        return queryset
+
     def post(self, request, format=None):
         """Adds new routine for specic user."""
         serializer = RoutineSerializer(
@@ -38,44 +98,38 @@ class RoutineList(APIView):
             ?orderby=<str>:
                 Name of db column to order queryset. Default order is given by pk values. Django
                 convention is used – the negative sign in front of column name indicates descending
-                order.
+                order. Use `trending` to order by time-decayed number of forks (recent forks
+                count more, see api.trending).
             ?limit=<int>:
                 Limit querysearch to specific number of records.
+            ?after=<str>:
+                Only with ?orderby=trending: records following the last record of the previous
+                page. When page has ?limit= records, URL of the next page is sent in Link header.
+            ?fields=<str>,<str>...:
+                Include only listed fields in each object. Relations and values needed only
+                by omitted fields are not queried.
+            ?omit=<str>,<str>...:
+                Include all fields except listed ones (cannot be combined with fields).
         """
-        user_pk_filter = request.query_params.get("user.eq", None)
-        user_pk_exclude = request.query_params.get("user.neq", None)
-        order_by_field = request.query_params.get("orderby", None)
-        limit = request.query_params.get("limit", None)
-
-        # Validation
-        if user_pk_filter is not None and not user_pk_filter.isdigit():
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        if user_pk_exclude is not None and not user_pk_exclude.isdigit():
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        if limit is not None and not limit.isdigit():
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        if order_by_field is not None and order_by_field not in ORDER_BY_OPTIONS:
+        queryset = self.list_queryset(request.query_params)
+        fields = requested_fields(request.query_params, ROUTINE_LIST_FIELDS)
+        if queryset is None or fields is None:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        queryset = Routine.objects.all()
-
-        if user_pk_filter:
-            queryset = queryset.filter(owner=user_pk_filter)
-        if user_pk_exclude:
-            queryset = queryset.exclude(owner=user_pk_exclude)
-        if order_by_field:
-            queryset = queryset.order_by(order_by_field)
-        if limit:
-            queryset = queryset[: int(limit)]
-
-        serializer = RoutineSerializer(
-            queryset, context={"requesting_user_pk": request.user.pk}, many=True
-        )
-
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        headers = {}
+        if request.query_params.get("orderby", None) == "trending":
+            data, last = serialize_routine_list(
+                queryset, requesting_user_pk=request.user.pk, fields=fields, with_cursor=True
+            )
+            headers = next_page_headers(request, data, lambda: format_cursor(*last))
+        else:
+            data = serialize_routine_list(
+                queryset, requesting_user_pk=request.user.pk, fields=fields
+            )
+        return Response(data, status=status.HTTP_200_OK, headers=headers)
 
 
-class RoutineDetail(APIView):
+class RoutineDetail(ReplicaReadMixin, APIView):
 
     permission_classes = (permissions.IsAuthenticated, IsOwnerOrReadOnly)
 
@@ -126,6 +180,9 @@ class RoutineDetail(APIView):
         If fork is successful updated instance of forked exercise is send in response payload.
 
         If fork is unsuccessful dict with errors is send in response payload.
+
+        Forking long routines can be deferred to background job by sending `Prefer: respond-async`
+        header. In this case 202 response with job URL to poll is returned.
         """
         routine = self.get_object(routine_id, validate_permissions=False)
 
@@ -136,38 +193,179 @@ class RoutineDetail(APIView):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        # Grab all associated exercises
-        routine_units = routine.routine_units.all()
-        serializer = RoutineUnitSerializer(routine_units, many=True)
-
-        routine.pk = None
-        routine.owner = request.user
-        routine.forks_count = 0
-        routine.save()  # pk was set to None, so new db instance will be created
-
-        for routine_unit_dict in serializer.data:
-            try:
-                # Scenario 1: user making fork already owns an exercise
-                exercise = Exercise.objects.get(
-                    name=routine_unit_dict["exercise_name"], owner=request.user
-                )
-            except Exercise.DoesNotExist:
-                # Scenario 2: exercise is forked along routine
-                exercise = Exercise.objects.get(pk=routine_unit_dict["exercise"]).fork(request.user)
-
-            # Add new routine unit
-            routine.exercises.add(
-                exercise,
-                through_defaults={
-                    "sets": routine_unit_dict["sets"],
-                    "instructions": routine_unit_dict["instructions"],
-                },
+        if "respond-async" in request.headers.get("Prefer", ""):
+            job = enqueue(
+                "api.fork_routine",
+                owner=request.user,
+                routine_pk=routine.pk,
+                user_pk=request.user.pk,
             )
+            return job_accepted_response(job)
+
+        # Create a copy
+        routine.fork(request.user)
 
-        # Increase routine forks count
+        # Increase routine forks count and trending score
+        record_fork(Routine, routine_id)
         routine = self.get_object(routine_id, validate_permissions=False)
-        routine.forks_count += 1
-        routine.save()
 
         serializer = RoutineSerializer(routine, context={"requesting_user_pk": request.user.pk})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class RoutineUnitMove(APIView):
+
+    permission_classes = (permissions.IsAuthenticated, IsOwnerOrReadOnly)
+
+    def post(self, request, routine_id, format=None):
+        """Move single routine unit to another place in the routine. This can be done only if the
+        user requesting move is routine owner.
+
+        Payload:
+            from (int):
+                Index (in routine order) of the unit to move.
+            to (int):
+                Index of the unit after the move.
+
+        Only the moved unit is updated, so reordering doesn't require sending the whole routine.
+        """
+        try:
+            routine = Routine.objects.get(pk=routine_id)
+        except Routine.DoesNotExist:
+            raise Http404
+        self.check_object_permissions(request=request, obj=routine)
+
+        from_index, to_index = request.data.get("from"), request.data.get("to")
+        if not all(type(index) is int for index in (from_index, to_index)):
+            return Response(
+                {"detail": "Indices from and to have to be integers."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not routine.move_unit(from_index, to_index):
+            return Response({"detail": "Index out of range."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class RoutineGenerate(APIView):
+
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, format=None):
+        """Compose routine from exercises of the requesting user covering the most of target
+        muscles with the fewest exercises (see api.routine_builder).
+
+        Payload:
+            muscles (list of str):
+                Names of target muscles (all muscles by default).
+            kind (str):
+                Only exercises of this kind are used.
+            max_exercises (int):
+                Maximum number of exercises in the routine.
+            sets (int):
+                Number of sets of each exercise (3 by default), used only when routine is saved.
+            routine (dict):
+                Routine fields (name, kind, instructions). When given, the routine is saved and its
+                data is sent in response payload, otherwise only chosen exercises are returned.
+        """
+        params = RoutineGenerateSerializer(data=request.data)
+        if not params.is_valid():
+            return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = params.validated_data
+
+        exercise_pks, covered, uncovered = build_routine(
+            request.user.pk,
+            params.get("muscles", [name for name, _ in Muscle.MUSCLES]),
+            params["max_exercises"],
+            params.get("kind"),
+        )
+
+        if "routine" in params:
+            units = [{"exercise": pk, "sets": params["sets"]} for pk in exercise_pks]
+            serializer = RoutineSerializer(
+                data={**params["routine"], "owner": request.user.pk, "exercises": units},
+                context={"requesting_user_pk": request.user.pk},
+            )
+            if serializer.is_valid():
+                serializer.save()
+                return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        exercises = Exercise.objects.in_bulk(exercise_pks)
+        data = {
+            "exercises": [
+                {
+                    "pk": pk,
+                    "name": exercises[pk].name,
+                    "muscles": Muscle.names(exercises[pk].muscles_mask),
+                }
+                for pk in exercise_pks
+            ],
+            "covered": covered,
+            "uncovered": uncovered,
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+
+async def routine_serializer_context(user_pk, routines):
+    """Precompute per-row values of RoutineSerializer which would otherwise be queried lazily."""
+    owned_names = Routine.objects.filter(
+        owner=user_pk, name__in={routine.name for routine in routines}
+    ).values_list("name", flat=True)
+
+    muscles = defaultdict(list)
+    async for routine_pk, muscle_name in Routine.muscles_count_queryset(
+        [routine.pk for routine in routines]
+    ):
+        muscles[routine_pk].append(muscle_name)
+
+    return {
+        "requesting_user_pk": user_pk,
+        "owned_routine_names": {name async for name in owned_names},
+        "muscles_counts": {pk: dict(Counter(names)) for pk, names in muscles.items()},
+    }
+
+
+def prefetch_routine_relations(queryset):
+    """Load all relations used by RoutineSerializer in advance."""
+    return queryset.select_related("owner").prefetch_related("routine_units__exercise")
+
+
+class AsyncRoutineList(AsyncReadAPIView):
+    """RoutineList with GET served by async ORM (used under ASGI)."""
+
+    sync_view_class = RoutineList
+
+    async def aget(self, request, format=None):
+        queryset = RoutineList.list_queryset(request.query_params)
+        fields = requested_fields(request.query_params, ROUTINE_LIST_FIELDS)
+        if queryset is None or fields is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        headers = {}
+        if request.query_params.get("orderby", None) == "trending":
+            data, last = await aserialize_routine_list(
+                queryset, requesting_user_pk=request.user.pk, fields=fields, with_cursor=True
+            )
+            headers = next_page_headers(request, data, lambda: format_cursor(*last))
+        else:
+            data = await aserialize_routine_list(
+                queryset, requesting_user_pk=request.user.pk, fields=fields
+            )
+        return Response(data, status=status.HTTP_200_OK, headers=headers)
+
+
+class AsyncRoutineDetail(AsyncReadAPIView):
+    """RoutineDetail with GET served by async ORM (used under ASGI)."""
+
+    sync_view_class = RoutineDetail
+
+    async def aget(self, request, routine_id, format=None):
+        try:
+            routine = await prefetch_routine_relations(Routine.objects.all()).aget(pk=routine_id)
+        except Routine.DoesNotExist:
+            raise Http404
+        self.drf_view.check_object_permissions(request=request, obj=routine)
+
+        context = await routine_serializer_context(request.user.pk, [routine])
+        serializer = RoutineSerializer(routine, context=context)
+        return Response(serializer.data, status=status.HTTP_200_OK)
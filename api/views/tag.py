@@ -0,0 +1,33 @@
+from api.tag_index import tag_index
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+
+class TagList(APIView):
+
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, format=None):
+        """Return tags suggested for autocomplete, the most used (by the largest number of
+        exercises) first. Tags are served from in-memory index (see api.tag_index) without
+        querying the database.
+
+        Querystring params:
+            ?prefix=<str>:
+                Tags starting with prefix (case insensitive).
+            ?limit=<int>:
+                Maximum number of tags (10 by default, at most 100).
+        """
+        prefix = request.query_params.get("prefix", "")
+        limit = request.query_params.get("limit", None)
+        if limit is not None and not limit.isdigit():
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        limit = min(int(limit), MAX_LIMIT) if limit is not None else DEFAULT_LIMIT
+        tags = tag_index.suggest(prefix, limit)
+        data = [{"name": name, "usage_count": usage_count} for name, usage_count in tags]
+        return Response(data, status=status.HTTP_200_OK)
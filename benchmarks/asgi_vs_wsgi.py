@@ -0,0 +1,77 @@
+"""Compare throughput of read endpoints served by WSGI (sync views) and ASGI (async views).
+
+Start both servers with single worker, so interleaving of requests inside one process is measured:
+
+    gunicorn wapp.wsgi -w 1 --threads 1 -b 127.0.0.1:8001
+    uvicorn wapp.asgi:application --workers 1 --port 8002
+
+and run the benchmark against both of them:
+
+    python benchmarks/asgi_vs_wsgi.py --token <access token> \\
+        --url http://127.0.0.1:8001/api/routines/ --url http://127.0.0.1:8002/api/routines/
+
+Access token can be obtained from /token-auth/ endpoint. Requests are sent by pool of threads, each
+thread keeps its own connection open.
+"""
+
+import argparse
+import http.client
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+
+def worker(url, token, n_requests, latencies, errors):
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as exc:
+            errors.append(exc)
+            connection.close()
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+            continue
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+
+def run(url, token, concurrency, n_requests):
+    latencies, errors = [], []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker, url, token, n_requests // concurrency, latencies, errors)
+    elapsed = time.perf_counter() - start
+
+    print(url)
+    print(f"  concurrency: {concurrency}, requests: {len(latencies)}, errors: {len(errors)}")
+    if latencies:
+        latencies.sort()
+        print(f"  throughput: {len(latencies) / elapsed:.1f} req/s")
+        print(f"  latency median: {statistics.median(latencies) * 1000:.1f} ms")
+        print(f"  latency p95: {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", action="append", required=True, help="Endpoint to benchmark.")
+    parser.add_argument("--token", help="JWT access token.")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    for url in args.url:
+        run(url, args.token, args.concurrency, args.requests)
+
+
+if __name__ == "__main__":
+    main()
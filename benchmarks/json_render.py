@@ -0,0 +1,87 @@
+"""Compare rendering time of routine list payload by DRF JSONRenderer and utils.renderers.
+
+Routines with exercises are created in fresh SQLite database, serialized once with the same
+serializer and context as the routine list endpoint and the resulting data is rendered repeatedly.
+
+    python benchmarks/json_render.py --routines 500 --units 8 --repeat 20
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--routines", type=int, default=500)
+    parser.add_argument("--units", type=int, default=8, help="Exercises in each routine.")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ["WAPP_DB_NAME"] = os.path.join(tmp_dir.name, "db.sqlite3")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "wapp.settings")
+    sys.path.insert(0, BASE_DIR)
+
+    import django
+
+    django.setup()
+
+    from asgiref.sync import async_to_sync
+    from api.models import Exercise, Muscle, Routine
+    from api.serializers.routine import RoutineSerializer
+    from api.views.routine import prefetch_routine_relations, routine_serializer_context
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from rest_framework.renderers import JSONRenderer as DRFJSONRenderer
+    from utils import renderers
+
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    owner = User.objects.create_user("benchmark", email="benchmark@mail.com")
+    muscles = [Muscle.objects.get_or_create(name=name)[0] for name, _ in Muscle.MUSCLES]
+    exercises = []
+    for i in range(50):
+        exercise = Exercise.objects.create(
+            name=f"exercise {i}", kind="rep", owner=owner, instructions="Lorem ipsum " * 20
+        )
+        exercise.muscles.add(*muscles[i % len(muscles) : i % len(muscles) + 3])
+        exercises.append(exercise)
+    for i in range(args.routines):
+        routine = Routine.objects.create(
+            name=f"routine {i}", kind="cir", owner=owner, instructions="Lorem ipsum " * 20
+        )
+        for j in range(args.units):
+            routine.exercises.add(
+                exercises[(i + j) % len(exercises)],
+                through_defaults={"sets": 3, "instructions": "Slow and controlled."},
+            )
+
+    queryset = prefetch_routine_relations(Routine.objects.all())
+    routines = list(queryset)
+    context = async_to_sync(routine_serializer_context)(owner.pk, routines)
+    data = RoutineSerializer(routines, many=True, context=context).data
+
+    drf_time = best_time(lambda: DRFJSONRenderer().render(data), args.repeat)
+    print(f"payload: {len(DRFJSONRenderer().render(data)) / 1024:.0f} KiB")
+    print(f"  rest_framework.renderers.JSONRenderer: {drf_time * 1000:.2f} ms")
+    if renderers.orjson is None:
+        print("  orjson is not installed, utils.renderers.JSONRenderer falls back to stdlib")
+    new_time = best_time(lambda: renderers.JSONRenderer().render(data), args.repeat)
+    print(f"  utils.renderers.JSONRenderer: {new_time * 1000:.2f} ms ({drf_time / new_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
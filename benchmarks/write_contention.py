@@ -0,0 +1,109 @@
+"""Measure SQLite write contention for each database profile (see DB_PROFILE in settings).
+
+Every profile gets its own fresh database file. Writer threads bump forks_count of random exercises
+(the same kind of short UPDATE as fork endpoints do) while reader threads keep listing exercises.
+
+    python benchmarks/write_contention.py --writers 8 --readers 8 --seconds 10
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def benchmark(args):
+    """Executed in subprocess with WAPP_DB_PROFILE and WAPP_DB_NAME already set."""
+    import random
+    import threading
+    import time
+
+    import django
+
+    sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "wapp.settings")
+    django.setup()
+
+    from api.models import Exercise
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import OperationalError, connection
+    from django.db.models import F
+
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    owner = User.objects.create_user("benchmark", email="benchmark@mail.com")
+    exercise_pks = [
+        Exercise.objects.create(name=f"exercise {i}", kind="rep", owner=owner).pk
+        for i in range(100)
+    ]
+    connection.close()
+
+    counters = {"writes": 0, "reads": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def count(key):
+        with lock:
+            counters[key] += 1
+
+    def writer():
+        while time.perf_counter() < deadline:
+            try:
+                Exercise.objects.filter(pk=random.choice(exercise_pks)).update(
+                    forks_count=F("forks_count") + 1
+                )
+                count("writes")
+            except OperationalError:  # database is locked
+                count("errors")
+        connection.close()
+
+    def reader():
+        while time.perf_counter() < deadline:
+            try:
+                list(Exercise.objects.all()[:20])
+                count("reads")
+            except OperationalError:
+                count("errors")
+        connection.close()
+
+    threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"profile: {os.environ['WAPP_DB_PROFILE']}")
+    print(f"  writes/s: {counters['writes'] / args.seconds:.1f}")
+    print(f"  reads/s: {counters['reads'] / args.seconds:.1f}")
+    print(f"  errors: {counters['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", action="append", help="Profiles to compare.")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        return benchmark(args)
+
+    for profile in args.profile or ["development", "production"]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            env = {
+                **os.environ,
+                "WAPP_DB_PROFILE": profile,
+                "WAPP_DB_NAME": os.path.join(tmp_dir, "db.sqlite3"),
+            }
+            command = [sys.executable, __file__, "--run"] + sys.argv[1:]
+            subprocess.run(command, env=env, check=True)
+
+
+if __name__ == "__main__":
+    main()
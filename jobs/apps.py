@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobsConfig(AppConfig):
+    name = "jobs"
+
+    def ready(self):
+        # Register tasks defined in tasks.py module of every installed app
+        autodiscover_modules("tasks")
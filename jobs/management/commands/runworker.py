@@ -0,0 +1,59 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs.runner import Worker, requeue_stale
+
+
+class Command(BaseCommand):
+    help = "Process background jobs stored in the database queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=getattr(settings, "JOBS_WORKER_CONCURRENCY", 4),
+            help="Number of jobs executed at once.",
+        )
+        parser.add_argument(
+            "--pool",
+            choices=("thread", "process"),
+            default="thread",
+            help="Use threads (default) or processes to execute jobs.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before checking empty queue again.",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit as soon as the queue is empty.",
+        )
+
+    def handle(self, *args, **options):
+        n_requeued, n_failed = requeue_stale(
+            getattr(settings, "JOBS_STALE_AFTER", 3600),
+            max_attempts=getattr(settings, "JOBS_MAX_ATTEMPTS", 3),
+        )
+        if n_requeued:
+            self.stdout.write(f"Requeued {n_requeued} stale jobs")
+        if n_failed:
+            self.stdout.write(f"Failed {n_failed} stale jobs which ran out of attempts")
+
+        worker = Worker(
+            concurrency=options["concurrency"],
+            pool=options["pool"],
+            poll_interval=options["poll_interval"],
+        )
+        signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+
+        self.stdout.write(f"Worker started ({options['concurrency']} {options['pool']}s)")
+        try:
+            worker.run(burst=options["burst"])
+        except KeyboardInterrupt:
+            worker.stop()
+        self.stdout.write("Worker stopped")
@@ -0,0 +1,42 @@
+import uuid
+
+from django.contrib.auth.models import User
+from django.db import models
+
+
+class Job(models.Model):
+    """Unit of heavy work (account deletion, routine fork, ...) deferred from the request-response
+    cycle. Jobs are stored in the database which acts as a queue consumed by `runworker` command."""
+
+    QUEUED = "que"
+    RUNNING = "run"
+    DONE = "don"
+    FAILED = "fai"
+    STATUSES = (
+        (QUEUED, "queued"),
+        (RUNNING, "running"),
+        (DONE, "done"),
+        (FAILED, "failed"),
+    )
+
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=3, choices=STATUSES, default=QUEUED)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    owner = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "id"])]
+
+    def __str__(self):
+        return f"Job(name={self.name}, status={self.status}, uuid={self.uuid})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
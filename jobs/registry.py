@@ -0,0 +1,43 @@
+"""Registry of functions which can be executed as background jobs.
+
+Tasks are plain functions registered under unique name with the `task` decorator. They are called
+with job payload unpacked as keyword arguments, so payload has to be JSON serializable (pass
+primary keys instead of model instances). Return value (also JSON serializable) is stored as job
+result.
+
+Example:
+    @task("accounts.delete_user")
+    def delete_user(user_pk):
+        ...
+
+Tasks taking a list of items can be registered with `coalesce=<argument name>`. Queued jobs of such
+task (with the same owner and other arguments) are then merged into the job which is being run,
+which is called once with their lists joined (see jobs.runner.run_job).
+"""
+
+_registry = {}
+_coalesce_arguments = {}
+
+
+def task(name, coalesce=None):
+    """Register decorated function as a task with given name. Jobs of the task are merged on the
+    list argument named coalesce (if given)."""
+
+    def decorator(func):
+        if name in _registry and _registry[name] is not func:
+            raise ValueError(f"Task {name} is already registered.")
+        _registry[name] = func
+        _coalesce_arguments[name] = coalesce
+        return func
+
+    return decorator
+
+
+def get_task(name):
+    """Return function registered under name. Raises KeyError for unknown tasks."""
+    return _registry[name]
+
+
+def get_coalesce_argument(name):
+    """Name of list argument on which jobs of the task are merged (None if they are not)."""
+    return _coalesce_arguments.get(name)
@@ -0,0 +1,207 @@
+import logging
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import django
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+from .registry import get_coalesce_argument, get_task
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(name, owner=None, **payload):
+    """Put new job in the queue and return it.
+
+    When JOBS_RUN_EAGERLY setting is True job is executed immediately in the calling thread, which
+    is handy for local development without running worker.
+    """
+    get_task(name)  # fail early for unknown tasks
+    job = Job.objects.create(name=name, owner=owner, payload=payload)
+    if getattr(settings, "JOBS_RUN_EAGERLY", False):
+        claimed = claim(job.pk)
+        if claimed is not None:
+            run_job(claimed)
+            job.refresh_from_db()
+    return job
+
+
+def claim(job_pk):
+    """Atomically mark queued job as running. Returns claimed job or None if other worker was
+    faster."""
+    claimed = Job.objects.filter(pk=job_pk, status=Job.QUEUED).update(
+        status=Job.RUNNING, started_at=timezone.now(), attempts=F("attempts") + 1
+    )
+    if not claimed:
+        return None
+    return Job.objects.get(pk=job_pk)
+
+
+def claim_next():
+    """Claim the oldest queued job. Returns None if the queue is empty."""
+    while True:
+        job_pk = (
+            Job.objects.filter(status=Job.QUEUED)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if job_pk is None:
+            return None
+        job = claim(job_pk)
+        if job is not None:
+            return job
+
+
+def claim_coalesced(job):
+    """Claim queued jobs which can be merged into running job (see jobs.registry). Returns claimed
+    jobs."""
+    argument = get_coalesce_argument(job.name)
+    if argument is None:
+        return []
+
+    def other_arguments(payload):
+        return {name: value for name, value in payload.items() if name != argument}
+
+    candidates = Job.objects.filter(name=job.name, owner=job.owner_id, status=Job.QUEUED)
+    claimed_jobs = []
+    for candidate in candidates.order_by("pk"):
+        if other_arguments(candidate.payload) != other_arguments(job.payload):
+            continue
+        claimed = claim(candidate.pk)
+        if claimed is not None:
+            claimed_jobs.append(claimed)
+    return claimed_jobs
+
+
+def run_job(job):
+    """Execute claimed job and store its outcome.
+
+    Queued jobs which can be merged into the job are executed with it and get the same outcome.
+    """
+    payload = job.payload
+    merged_jobs = claim_coalesced(job)
+    if merged_jobs:
+        argument = get_coalesce_argument(job.name)
+        items = [item for merged in [job, *merged_jobs] for item in merged.payload[argument]]
+        payload = {**payload, argument: list(dict.fromkeys(items))}
+
+    try:
+        result = get_task(job.name)(**payload)
+    except Exception:
+        logger.exception("Job %s failed", job)
+        job.status = Job.FAILED
+        job.error = traceback.format_exc()
+    else:
+        job.status = Job.DONE
+        job.result = result
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "result", "error", "finished_at"])
+    if merged_jobs:
+        Job.objects.filter(pk__in=[merged.pk for merged in merged_jobs]).update(
+            status=job.status, result=job.result, error=job.error, finished_at=job.finished_at
+        )
+    return job
+
+
+def run_job_by_pk(job_pk):
+    """Entry point used by worker pools. Runs job with given pk and releases db connection, since
+    pool threads outlive the job."""
+    try:
+        run_job(Job.objects.get(pk=job_pk))
+    finally:
+        close_old_connections()
+        connections.close_all()
+
+
+def run_pending(limit=None):
+    """Synchronously execute queued jobs in the calling thread. Returns number of executed jobs."""
+    n_executed = 0
+    while limit is None or n_executed < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        n_executed += 1
+    return n_executed
+
+
+def requeue_stale(timeout, max_attempts=None):
+    """Put back in the queue jobs which are running longer than timeout (seconds). It happens when
+    worker is killed in the middle of a job.
+
+    Jobs which were already claimed max_attempts times are marked as failed instead, so a job which
+    crashes the worker is not retried forever. Returns number of requeued and failed jobs.
+    """
+    threshold = timezone.now() - timezone.timedelta(seconds=timeout)
+    stale = Job.objects.filter(status=Job.RUNNING, started_at__lt=threshold)
+    n_failed = 0
+    if max_attempts is not None:
+        n_failed = stale.filter(attempts__gte=max_attempts).update(
+            status=Job.FAILED,
+            error=f"Job was abandoned by worker {max_attempts} times.",
+            finished_at=timezone.now(),
+        )
+    n_requeued = stale.update(status=Job.QUEUED, started_at=None)
+    return n_requeued, n_failed
+
+
+def _setup_process():
+    """Initializer of process pool workers."""
+    django.setup()
+
+
+class Worker:
+    """Consume job queue using pool of threads or processes.
+
+    Main thread claims jobs and hands their pks to the pool, so no more than `concurrency` jobs are
+    running at once. Claiming is done with conditional UPDATE, therefore many workers can safely
+    consume the same queue.
+    """
+
+    def __init__(self, concurrency=4, pool="thread", poll_interval=1.0):
+        self.concurrency = concurrency
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self._stopped = False
+
+    def _make_executor(self):
+        if self.pool == "process":
+            # Forked processes can't share db connections with the parent
+            connections.close_all()
+            return ProcessPoolExecutor(max_workers=self.concurrency, initializer=_setup_process)
+        return ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="job")
+
+    def stop(self):
+        self._stopped = True
+
+    def run(self, burst=False):
+        """Process jobs until stopped. In burst mode return as soon as the queue is drained."""
+        running = set()
+        with self._make_executor() as executor:
+            while not self._stopped:
+                while len(running) < self.concurrency:
+                    job = claim_next()
+                    if job is None:
+                        break
+                    running.add(executor.submit(run_job_by_pk, job.pk))
+
+                if not running:
+                    if burst:
+                        break
+                    close_old_connections()
+                    time.sleep(self.poll_interval)
+                    continue
+
+                done, running = wait(
+                    running, timeout=self.poll_interval, return_when=FIRST_COMPLETED
+                )
+                running = set(running)
+                for future in done:
+                    if future.exception() is not None:
+                        logger.error("Worker pool error: %s", future.exception())
@@ -0,0 +1,49 @@
+from urllib.parse import urlencode
+
+from django.core import signing
+from django.urls import reverse
+from rest_framework import serializers
+
+from ..models import Job
+
+JOB_TOKEN_SALT = "jobs.job-detail"
+
+
+def job_token(job):
+    """Signed token allowing to poll the job without authentication (see JobDetail)."""
+    return signing.dumps(str(job.uuid), salt=JOB_TOKEN_SALT)
+
+
+def is_job_token_valid(job_uuid, token):
+    try:
+        return signing.loads(token, salt=JOB_TOKEN_SALT) == str(job_uuid)
+    except signing.BadSignature:
+        return False
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Job status. With `with_token` in context the job URL contains job token."""
+
+    status_display = serializers.CharField(source="get_status_display", read_only=True)
+    url = serializers.SerializerMethodField("_url", read_only=True)
+
+    def _url(self, obj):
+        url = reverse("job-detail", kwargs={"job_uuid": obj.uuid})
+        if self.context.get("with_token"):
+            url = f"{url}?{urlencode({'token': job_token(obj)})}"
+        return url
+
+    class Meta:
+        model = Job
+        fields = (
+            "uuid",
+            "url",
+            "name",
+            "status",
+            "status_display",
+            "result",
+            "created_at",
+            "started_at",
+            "finished_at",
+        )
+        read_only_fields = fields
@@ -0,0 +1,200 @@
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..models import Job
+from ..registry import task
+from ..runner import Worker, claim_next, enqueue, requeue_stale, run_pending
+from ..views.job import job_accepted_response
+
+
+@task("jobs.tests.add")
+def add(a, b):
+    return a + b
+
+
+@task("jobs.tests.scaled_sum", coalesce="numbers")
+def scaled_sum(numbers, scale=1):
+    return sum(numbers) * scale
+
+
+@task("jobs.tests.fail")
+def fail():
+    raise RuntimeError("boom")
+
+
+class JobTest(APITestCase):
+
+    DETAIL_URLPATTERN_NAME = "job-detail"
+
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", email="owner@mail.com")
+        self.other_user = User.objects.create_user("other_user", email="other_user@mail.com")
+
+    def authorize(self, user_obj):
+        refresh = RefreshToken.for_user(user_obj)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+    def test_enqueue_job(self):
+        """Enqueued job waits in the queue until it is processed."""
+        job = enqueue("jobs.tests.add", owner=self.owner, a=1, b=2)
+
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.payload, {"a": 1, "b": 2})
+
+        self.assertEqual(run_pending(), 1)
+        job.refresh_from_db()
+
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.result, 3)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_enqueue_unknown_job(self):
+        """Only registered tasks can be enqueued."""
+        with self.assertRaises(KeyError):
+            enqueue("jobs.tests.unknown")
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_job(self):
+        """Exception raised by task is stored and does not stop processing of other jobs."""
+        failing_job = enqueue("jobs.tests.fail")
+        job = enqueue("jobs.tests.add", a=2, b=2)
+
+        self.assertEqual(run_pending(), 2)
+        failing_job.refresh_from_db()
+        job.refresh_from_db()
+
+        self.assertEqual(failing_job.status, Job.FAILED)
+        self.assertIn("RuntimeError: boom", failing_job.error)
+        self.assertEqual(job.status, Job.DONE)
+
+    def test_coalesced_jobs(self):
+        """Queued jobs of coalesced task with the same other arguments are run as one."""
+        jobs = [
+            enqueue("jobs.tests.scaled_sum", numbers=[1, 2]),
+            enqueue("jobs.tests.scaled_sum", numbers=[2, 3]),
+            enqueue("jobs.tests.scaled_sum", numbers=[4], scale=2),
+            enqueue("jobs.tests.scaled_sum", owner=self.owner, numbers=[5]),
+        ]
+
+        self.assertEqual(run_pending(), 3)
+        for job in jobs:
+            job.refresh_from_db()
+
+        self.assertEqual([job.status for job in jobs], [Job.DONE] * 4)
+        self.assertEqual([job.result for job in jobs], [6, 6, 8, 5])
+        self.assertEqual(jobs[1].payload, {"numbers": [2, 3]})
+
+    @override_settings(JOBS_RUN_EAGERLY=True)
+    def test_eager_job(self):
+        """In eager mode job is executed right away."""
+        job = enqueue("jobs.tests.add", a=1, b=1)
+
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.result, 2)
+
+    def test_requeue_stale_job(self):
+        """Job abandoned by killed worker is put back in the queue until it runs out of attempts."""
+        job = enqueue("jobs.tests.add", a=1, b=2)
+        stale_started_at = timezone.now() - timezone.timedelta(hours=2)
+
+        # First attempt is requeued
+        claim_next()
+        Job.objects.filter(pk=job.pk).update(started_at=stale_started_at)
+
+        self.assertEqual(requeue_stale(3600, max_attempts=2), (1, 0))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+
+        # Last attempt fails the job
+        claim_next()
+        Job.objects.filter(pk=job.pk).update(started_at=stale_started_at)
+
+        self.assertEqual(requeue_stale(3600, max_attempts=2), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn("abandoned", job.error)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(run_pending(), 0)
+
+    def test_requeue_stale_job_still_running(self):
+        """Job running shorter than timeout is left alone."""
+        job = enqueue("jobs.tests.add", a=1, b=2)
+        claim_next()
+
+        self.assertEqual(requeue_stale(3600, max_attempts=1), (0, 0))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.RUNNING)
+
+    def test_get_job_detail(self):
+        """Owner of the job can poll its status."""
+        job = enqueue("jobs.tests.add", owner=self.owner, a=1, b=2)
+        self.authorize(self.owner)
+
+        url = reverse(self.DETAIL_URLPATTERN_NAME, kwargs={"job_uuid": job.uuid})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status_display"], "queued")
+        self.assertEqual(response.data["url"], url)
+        self.assertIsNone(response.data["result"])
+
+        run_pending()
+        response = self.client.get(url)
+
+        self.assertEqual(response.data["status_display"], "done")
+        self.assertEqual(response.data["result"], 3)
+
+    def test_get_job_detail_unauthorized(self):
+        """Anonymous user can't poll job status even knowing its uuid."""
+        job = enqueue("jobs.tests.add", owner=self.owner, a=1, b=2)
+
+        url = reverse(self.DETAIL_URLPATTERN_NAME, kwargs={"job_uuid": job.uuid})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_get_other_user_job_detail(self):
+        """Jobs of other users and jobs without owner are not found."""
+        self.authorize(self.other_user)
+
+        jobs = [enqueue("jobs.tests.add", owner=self.owner, a=1, b=2), enqueue("jobs.tests.fail")]
+        for job in jobs:
+            url = reverse(self.DETAIL_URLPATTERN_NAME, kwargs={"job_uuid": job.uuid})
+            response = self.client.get(url)
+
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_job_detail_with_token(self):
+        """Job can be polled without authentication with the token from accepted response."""
+        job = enqueue("jobs.tests.add", owner=self.owner, a=1, b=2)
+        url = job_accepted_response(job, with_token=True)["Location"]
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["uuid"], str(job.uuid))
+
+        other_job = enqueue("jobs.tests.add", owner=self.owner, a=1, b=2)
+        other_url = reverse(self.DETAIL_URLPATTERN_NAME, kwargs={"job_uuid": other_job.uuid})
+        for query in (url.split("?")[1], "token=x"):
+            response = self.client.get(f"{other_url}?{query}")
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class JobWorkerTest(TransactionTestCase):
+    def test_worker_burst(self):
+        """Worker in burst mode processes all queued jobs in its pool and exits."""
+        jobs = [enqueue("jobs.tests.add", a=i, b=i) for i in range(3)]
+
+        Worker(concurrency=2, poll_interval=0.01).run(burst=True)
+
+        for i, job in enumerate(jobs):
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.DONE)
+            self.assertEqual(job.result, 2 * i)
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .views.job import JobDetail
+
+urlpatterns = [
+    path("jobs/<uuid:job_uuid>", JobDetail.as_view(), name="job-detail"),
+]
@@ -0,0 +1,60 @@
+from django.http import Http404
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..models import Job
+from ..serializers.job import JobSerializer, is_job_token_valid
+
+
+def job_accepted_response(job, with_token=False):
+    """Response for requests which work was deferred to background job. Client should poll the
+    job URL (also given in the Location header) until job is finished.
+
+    With with_token=True job URL contains job token, so it can be polled without authentication
+    (e.g. when the job removes account of the requesting user).
+    """
+    data = JobSerializer(job, context={"with_token": with_token}).data
+    return Response(data, status=status.HTTP_202_ACCEPTED, headers={"Location": data["url"]})
+
+
+class JobDetail(APIView):
+    """Poll status of background job.
+
+    GET:
+        Accessible only for the user who enqueued the job. Jobs of other users (and jobs without
+        owner) are reported as not found.
+
+        Querystring params:
+            ?token=<str>:
+                Job token given in the job URL by `job_accepted_response`. Job is accessible for
+                anyone with a valid token, without authentication.
+    """
+
+    def get_permissions(self):
+        if "token" in self.request.query_params:
+            return []
+        return [permissions.IsAuthenticated()]
+
+    def perform_authentication(self, request):
+        # Credentials of the token holder may be already invalid (e.g. the job removes the account)
+        if "token" not in request.query_params:
+            super().perform_authentication(request)
+
+    def get_object(self, uuid):
+        token = self.request.query_params.get("token", None)
+        if token is not None:
+            if not is_job_token_valid(uuid, token):
+                raise Http404
+            lookup = {"uuid": uuid}
+        else:
+            lookup = {"uuid": uuid, "owner": self.request.user.pk}
+        try:
+            return Job.objects.get(**lookup)
+        except Job.DoesNotExist:
+            raise Http404
+
+    def get(self, request, job_uuid, format=None):
+        job = self.get_object(job_uuid)
+        serializer = JobSerializer(job, context={"with_token": "token" in request.query_params})
+        return Response(serializer.data, status=status.HTTP_200_OK)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class UtilsConfig(AppConfig):
     name = 'utils'
+
+    def ready(self):
+        import utils.signals
@@ -1,5 +1,4 @@
 import hashlib
-import os
 from functools import partial
 
 from django.urls import reverse
@@ -14,16 +13,9 @@ def build_url(*args, **kwargs):
     return url
 
 
-def hash_file(file, block_size=65536):
-    hasher = hashlib.md5()
+def hash_file(file, block_size=65536, algorithm="md5"):
+    hasher = hashlib.new(algorithm)
     for buf in iter(partial(file.read, block_size), b""):
         hasher.update(buf)
     return hasher.hexdigest()
 
-
-def hash_upload_to(instance, filename):
-    """In case hashing filenames will be required in the future. Not working template."""
-    filename_base, filename_ext = os.path.splitext(filename)
-    file_field = instance.__getattribute__("profile_picture")
-    new_filename = "{0}{1}".format(hash_file(file_field), filename_ext)
-    return new_filename
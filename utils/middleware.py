@@ -0,0 +1,23 @@
+from rest_framework.permissions import SAFE_METHODS
+
+from .routers import pin_to_primary
+
+
+class PrimaryPinMiddleware:
+    """Pin user to the primary database after each successful write request, so following reads
+    don't hit replica which may not have replicated the change yet.
+
+    DRF authenticates user inside the view and stores him in the underlying Django request, so it
+    has to be checked after the response is ready.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            user = getattr(request, "user", None)
+            if user is not None and user.is_authenticated:
+                pin_to_primary(user.pk)
+        return response
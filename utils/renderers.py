@@ -0,0 +1,94 @@
+"""JSON renderer and parser using orjson when it is installed.
+
+orjson serializes the nested lists and dicts produced by serializers several times faster than
+the stdlib json module. Types orjson does not know (Decimal, lazy translation strings, ...) are
+converted by DRF's JSONEncoder, so the output is the same as with DRF classes. Without orjson, or
+when indented output is requested, DRF implementation is used.
+
+DRF implementation is also used for data orjson would render differently: floats which are not
+finite (rejected in strict mode, orjson writes null) or are written in exponent notation (format
+of the exponent differs), and integers wider than 64 bits (orjson can't encode them). Request
+bodies orjson fails to parse or would parse differently (integers wider than 64 bits become
+floats) are parsed by DRF parser as well.
+"""
+
+import io
+import math
+import re
+
+from django.conf import settings
+from rest_framework import parsers, renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# Datetimes are formatted by JSONEncoder.default like in DRF (milliseconds precision, Z for UTC)
+ORJSON_OPTIONS = (
+    (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson is not None else 0
+)
+
+
+# Not finite floats are written by orjson as null, exponent and small fractions may be formatted
+# differently than by repr(). Output containing any of them is checked with _has_special_floats.
+SPECIAL_FLOAT_RE = re.compile(rb"null|\d[eE]|0\.0000")
+
+# Request body possibly containing integer which doesn't fit in 64 bits
+LONG_NUMBER_RE = re.compile(rb"\d{19}")
+
+_SCALAR_TYPES = {str, int, bool, type(None)}
+
+
+def _has_special_floats(value):
+    """Whether value contains float which is not finite or is written with exponent by repr()."""
+    if type(value) in _SCALAR_TYPES:
+        return False
+    if isinstance(value, float):
+        return not math.isfinite(value) or (value != 0 and not 1e-4 <= abs(value) < 1e16)
+    if isinstance(value, dict):
+        value = value.values()
+    elif not isinstance(value, (list, tuple)):
+        return False
+    return any(type(item) not in _SCALAR_TYPES and _has_special_floats(item) for item in value)
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        # orjson output is always compact UTF-8
+        if orjson is None or indent or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+        try:
+            ret = orjson.dumps(data, default=JSONEncoder().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # E.g. integer wider than 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+        if SPECIAL_FLOAT_RE.search(ret) and _has_special_floats(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same as DRF: line and paragraph separators are not valid in JavaScript strings
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+
+class JSONParser(parsers.JSONParser):
+    renderer_class = JSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace("-", "") != "utf8":
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        # Integers wider than 64 bits are parsed by orjson as floats
+        if not LONG_NUMBER_RE.search(body):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                # orjson rejects some input accepted by json module (e.g. lone surrogates), DRF
+                # parser decides whether it is valid
+                pass
+        return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,71 @@
+"""Routing of read queries to replica databases.
+
+Reads are sent to one of DATABASE_REPLICAS aliases only inside `replica_reads` block, which is
+entered by views using `utils.views.ReplicaReadMixin` for safe (GET, HEAD, OPTIONS) requests.
+Everything else – writes, authentication, views without the mixin – uses the primary database.
+
+Replicas lag behind the primary, so user who has just written something is pinned to the primary
+for REPLICA_PIN_SECONDS (see `utils.middleware.PrimaryPinMiddleware`) and reads his own writes.
+Pins are kept in the cache, so with several server processes shared cache backend has to be used.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+PRIMARY_DB = "default"
+
+_use_replica = ContextVar("use_replica", default=False)
+
+
+def _pin_key(user_pk):
+    return f"primary-pin:{user_pk}"
+
+
+def pin_to_primary(user_pk):
+    """Route all reads of user with user_pk to the primary for REPLICA_PIN_SECONDS."""
+    cache.set(_pin_key(user_pk), True, getattr(settings, "REPLICA_PIN_SECONDS", 5))
+
+
+def is_pinned_to_primary(user_pk):
+    return cache.get(_pin_key(user_pk), False)
+
+
+def start_replica_reads():
+    _use_replica.set(True)
+
+
+def stop_replica_reads():
+    _use_replica.set(False)
+
+
+@contextmanager
+def replica_reads():
+    """Send read queries executed inside the block to replica databases."""
+    previous = _use_replica.get()
+    _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.set(previous)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, "DATABASE_REPLICAS", [])
+        if replicas and _use_replica.get():
+            return random.choice(replicas)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DB
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def setup_sqlite_connection(sender, connection, **kwargs):
+    """Apply SQLITE_PRAGMAS setting to every new SQLite connection. Pragmas like synchronous or
+    cache_size are per-connection, so they have to be set each time connection is opened."""
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
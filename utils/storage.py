@@ -0,0 +1,90 @@
+"""Content-addressed file storage.
+
+Saved files are named after the hash of their content, so identical uploads share one file and a
+name always refers to the same bytes (responses can be cached forever). Directory and extension of
+the requested name are kept:
+
+    profile_pictures/0000001.png -> profile_pictures/3f/3fa9...e1.png
+
+Files are never overwritten, so they are not deleted when a model stops referencing them either.
+Unreferenced files are removed by `collect_garbage`, run periodically in the background.
+"""
+
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+import time
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$")
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    algorithm = "sha256"
+
+    def hashed_name(self, directory, digest, extension):
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # Final name depends only on the content and is chosen in _save
+        return name
+
+    def _save(self, name, content):
+        directory, basename = posixpath.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, exist_ok=True)
+
+        # Content is hashed while written to temporary file, so it is read only once
+        hasher = hashlib.new(self.algorithm)
+        fd, tmp_path = tempfile.mkstemp(dir=full_directory, suffix=".upload")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                for chunk in content.chunks():
+                    hasher.update(chunk)
+                    tmp_file.write(chunk)
+
+            name = self.hashed_name(directory, hasher.hexdigest(), extension)
+            full_path = self.path(name)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if os.path.exists(full_path):
+                # Duplicate upload, bump modification time so the file is not collected as garbage
+                # before the new reference is saved
+                os.utime(full_path)
+            else:
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                os.replace(tmp_path, full_path)
+                tmp_path = None
+        finally:
+            if tmp_path is not None:
+                os.remove(tmp_path)
+        return name
+
+
+def collect_garbage(storage, directory, referenced_names, grace_period):
+    """Delete content-addressed files from directory which are not in referenced_names. Files
+    modified less than grace_period seconds ago are kept, because references to them may not be
+    saved yet. Returns list of deleted names."""
+    deleted = []
+    if not storage.exists(directory):
+        return deleted
+    threshold = time.time() - grace_period
+    subdirectories, _ = storage.listdir(directory)
+    for subdirectory in subdirectories:
+        for filename in storage.listdir(posixpath.join(directory, subdirectory))[1]:
+            if not HASHED_NAME_RE.match(f"{subdirectory}/{filename}"):
+                continue
+            name = posixpath.join(directory, subdirectory, filename)
+            if name in referenced_names:
+                continue
+            if storage.get_modified_time(name).timestamp() > threshold:
+                continue
+            storage.delete(name)
+            deleted.append(name)
+    return deleted
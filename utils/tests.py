@@ -1,3 +1,219 @@
-from django.test import TestCase
+import datetime
+import decimal
+import io
+import os
+import tempfile
+import uuid
+from unittest import mock, skipIf
 
-# Create your tests here.
+from api.models import Exercise
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework import parsers, renderers, status
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .renderers import JSONParser, JSONRenderer, orjson
+from .routers import ReplicaRouter, is_pinned_to_primary, pin_to_primary, replica_reads
+from .signals import setup_sqlite_connection
+
+
+class SqliteConnectionTest(TestCase):
+    @override_settings(SQLITE_PRAGMAS={"cache_size": -1234})
+    def test_sqlite_pragmas(self):
+        """Pragmas from settings are applied to new SQLite connection."""
+        setup_sqlite_connection(sender=connection.__class__, connection=connection)
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA cache_size")
+            self.assertEqual(cursor.fetchone()[0], -1234)
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class ReplicaRouterTest(APITestCase):
+    def authorize(self, user_obj):
+        refresh = RefreshToken.for_user(user_obj)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user("owner", email="owner@mail.com")
+        self.authorize(self.owner)
+
+    def test_router(self):
+        """Only reads inside replica_reads block are routed to replicas."""
+        router = ReplicaRouter()
+
+        self.assertIsNone(router.db_for_read(Exercise))
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Exercise), "replica1")
+            self.assertEqual(router.db_for_write(Exercise), "default")
+        self.assertIsNone(router.db_for_read(Exercise))
+
+    def test_safe_request_reads_from_replica(self):
+        """GET requests of replica-enabled views read from replica unless user is pinned."""
+        url = reverse("exercise-list")
+
+        with mock.patch("utils.views.start_replica_reads") as start_replica_reads:
+            self.client.get(url)
+            self.assertEqual(start_replica_reads.call_count, 1)
+
+            pin_to_primary(self.owner.pk)
+            self.client.get(url)
+            self.assertEqual(start_replica_reads.call_count, 1)
+
+    def test_write_pins_user_to_primary(self):
+        """User is pinned to the primary after successful write."""
+        json_data = {"name": "exercise", "kind": "rep", "tags": [], "muscles": [], "tutorials": []}
+
+        response = self.client.post(reverse("exercise-list"), json_data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(is_pinned_to_primary(self.owner.pk))
+
+
+class MediaServeTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media_root.name, MEDIA_SENDFILE="")
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.hashed_name = "profile_pictures/ab/" + "ab" * 32 + ".txt"
+        for name in ("profile_pictures/default.txt", self.hashed_name):
+            os.makedirs(os.path.join(self.media_root.name, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(self.media_root.name, name), "wb") as file:
+                file.write(b"0123456789")
+
+    def get(self, name, **headers):
+        return self.client.get(reverse("media", kwargs={"path": name}), headers=headers)
+
+    def test_serve_file(self):
+        response = self.get("profile_pictures/default.txt")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Cache-Control"], "public, max-age=3600")
+        self.assertIn("ETag", response)
+
+    def test_immutable_name_cached_forever(self):
+        response = self.get(self.hashed_name)
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+
+    def test_not_modified(self):
+        etag = self.get(self.hashed_name)["ETag"]
+        response = self.get(self.hashed_name, If_None_Match=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_range(self):
+        response = self.get(self.hashed_name, Range="bytes=2-5")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+
+        response = self.get(self.hashed_name, Range="bytes=-3")
+        self.assertEqual(b"".join(response.streaming_content), b"789")
+
+        response = self.get(self.hashed_name, Range="bytes=20-")
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+        # Last byte past the end of the file is truncated
+        response = self.get(self.hashed_name, Range="bytes=8-20")
+        self.assertEqual(b"".join(response.streaming_content), b"89")
+
+        # Stale If-Range gets the whole file
+        response = self.get(self.hashed_name, Range="bytes=2-5", If_Range='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_invalid_range_ignored(self):
+        """Invalid Range header is ignored and the whole file is sent."""
+        for range_header in ("bytes=5-2", "bytes=-", "items=0-1", "bytes=0-1,3-4"):
+            response = self.get(self.hashed_name, Range=range_header)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+    def test_sendfile(self):
+        with override_settings(MEDIA_SENDFILE="x-accel-redirect"):
+            response = self.get(self.hashed_name)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/" + self.hashed_name)
+        self.assertEqual(response.content, b"")
+
+    def test_missing_file(self):
+        self.assertEqual(self.get("profile_pictures/missing.txt").status_code, 404)
+        self.assertEqual(self.get("../settings.py").status_code, 404)
+        self.assertEqual(self.get("profile_pictures").status_code, 404)
+
+
+class JSONRendererTest(TestCase):
+    def test_render_same_as_drf(self):
+        """Output matches DRF renderer for types needing conversion."""
+        data = {
+            "decimal": decimal.Decimal("1.50"),
+            "date": datetime.date(2020, 1, 2),
+            "datetime": datetime.datetime(
+                2020, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc
+            ),
+            "time": datetime.time(3, 4, 5),
+            "lazy": gettext_lazy("lazy string"),
+            "uuid": uuid.UUID("12345678123456781234567812345678"),
+            "errors": {0: ["Invalid pk."]},
+            "text": "zażółć \u2028",
+        }
+        self.assertEqual(JSONRenderer().render(data), renderers.JSONRenderer().render(data))
+        self.assertEqual(JSONRenderer().render(None), b"")
+
+    def test_render_numbers_same_as_drf(self):
+        """Floats and integers of any size are rendered like by DRF renderer."""
+        values = (0.0, -0.0, 0.1, 1.5, 1e15, 1e16, -1e16, 1.5e300, 1e-4, 1e-5, 5e-324, 2**64)
+        for value in values:
+            data = [{"similarity": value, "text": "1e5 null"}]
+            self.assertEqual(JSONRenderer().render(data), renderers.JSONRenderer().render(data))
+
+    def test_render_not_finite_floats(self):
+        """Not finite floats are rejected like by DRF renderer in strict mode."""
+        for value in (float("nan"), float("inf"), -float("inf")):
+            with self.assertRaises(ValueError):
+                renderers.JSONRenderer().render({"score": value})
+            with self.assertRaises(ValueError):
+                JSONRenderer().render({"score": [value]})
+
+    @skipIf(orjson is None, "orjson is not installed")
+    def test_render_with_orjson(self):
+        """Data without special values is rendered by orjson, other data by DRF renderer."""
+        with mock.patch("utils.renderers.orjson.dumps", wraps=orjson.dumps) as dumps:
+            with mock.patch.object(renderers.JSONRenderer, "render") as drf_render:
+                JSONRenderer().render([{"similarity": 0.5, "date_of_birth": None}])
+                self.assertEqual(dumps.call_count, 1)
+                drf_render.assert_not_called()
+
+                JSONRenderer().render([{"similarity": 1e-5}])
+                JSONRenderer().render({"pk": 2**64})
+                self.assertEqual(drf_render.call_count, 2)
+
+    @mock.patch("utils.renderers.orjson", None)
+    def test_render_without_orjson(self):
+        """Without orjson DRF renderer is used."""
+        data = {"score": 1e16, "lazy": gettext_lazy("lazy string"), "errors": {0: ["Invalid."]}}
+        self.assertEqual(JSONRenderer().render(data), renderers.JSONRenderer().render(data))
+
+    def test_parse(self):
+        stream = io.BytesIO('{"name": "przysiad", "sets": [1, 2]}'.encode())
+        self.assertEqual(JSONParser().parse(stream), {"name": "przysiad", "sets": [1, 2]})
+        with self.assertRaises(ParseError):
+            JSONParser().parse(io.BytesIO(b"{"))
+
+    def test_parse_input_rejected_by_orjson(self):
+        """Input valid for json module but rejected by orjson is parsed like by DRF parser."""
+        for body in (b'{"big": 123456789012345678901234567890}', b'{"text": "\\ud800"}'):
+            self.assertEqual(
+                JSONParser().parse(io.BytesIO(body)),
+                parsers.JSONParser().parse(io.BytesIO(body)),
+            )
@@ -1,3 +1,212 @@
-from django.shortcuts import render
+import mimetypes
+import os
+import re
+import stat as statmod
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe
+from rest_framework.permissions import SAFE_METHODS
+
+from .routers import is_pinned_to_primary, start_replica_reads, stop_replica_reads
+from .storage import HASHED_NAME_RE
+
+
+class AsyncReadAPIView(View):
+    """Async Django view serving GET requests with the async ORM.
+
+    Django REST framework views are synchronous, so under ASGI every request occupies a thread for
+    the whole time it waits for the database. This view runs authentication, permission checks and
+    response finalization of `sync_view_class` (all of them are cheap), while GET handler itself is
+    a coroutine named `aget`, which every subclass has to define. All remaining HTTP methods are
+    delegated to `sync_view_class`.
+
+    Handler `aget` receives DRF request and has to load all data needed by the serializer upfront
+    (select_related / prefetch_related / precomputed context, or async serialization functions of
+    api.serializers.rows), because lazy queries are not allowed inside the event loop.
+
+    Example:
+        class AsyncExerciseList(AsyncReadAPIView):
+            sync_view_class = ExerciseList
+
+            async def aget(self, request, format=None):
+                ...
+    """
+
+    sync_view_class = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Same as DRF views: CSRF is enforced by SessionAuthentication only
+        view = super().as_view(**initkwargs)
+        view.cls = cls
+        return csrf_exempt(view)
+
+    def _initial(self, request, *args, **kwargs):
+        """Mirror of APIView.dispatch up to the handler call. Returns sync view instance, DRF
+        request and error response (None if request can be handled)."""
+        view = self.sync_view_class()
+        view.args = args
+        view.kwargs = kwargs
+        drf_request = view.initialize_request(request, *args, **kwargs)
+        view.request = drf_request
+        view.headers = view.default_response_headers
+        try:
+            view.initial(drf_request, *args, **kwargs)
+        except Exception as exc:
+            return view, drf_request, view.handle_exception(exc)
+        return view, drf_request, None
+
+    async def get(self, request, *args, **kwargs):
+        self.drf_view, drf_request, response = await sync_to_async(self._initial)(
+            request, *args, **kwargs
+        )
+        if response is None:
+            try:
+                response = await self.aget(drf_request, *args, **kwargs)
+            except Exception as exc:
+                response = await sync_to_async(self.drf_view.handle_exception)(exc)
+        return await sync_to_async(self.drf_view.finalize_response)(
+            drf_request, response, *args, **kwargs
+        )
+
+    async def _delegate(self, request, *args, **kwargs):
+        view = self.sync_view_class.as_view()
+        return await sync_to_async(view)(request, *args, **kwargs)
+
+    post = put = patch = delete = options = _delegate
+
+
+class ReplicaReadMixin:
+    """Mixin for DRF views sending queries of safe requests to read replicas (see utils.routers).
+
+    Authentication and permission checks are done against the primary, replica reads start right
+    before the handler is called, unless requesting user is pinned to the primary after recent
+    write.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and not is_pinned_to_primary(request.user.pk):
+            start_replica_reads()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        stop_replica_reads()
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def _parse_range(header, size):
+    """Parse single range of Range header. Returns (start, end) with inclusive end, None if header
+    is not a valid single byte range (it is ignored and the whole file is sent, see RFC 9110
+    section 14.2) and False if the range is valid but cannot be satisfied."""
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header)
+    if match is None or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if start == "":
+        # Suffix range: last N bytes
+        length = int(end)
+        if length == 0 or size == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        return False
+    end = min(int(end), size - 1) if end else size - 1
+    return start, end
+
+
+def _read_range(file, start, length, block_size=65536):
+    try:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(block_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve file uploaded to MEDIA_ROOT.
+
+    Responses carry ETag and Last-Modified, so conditional requests get 304. Content-addressed
+    names (see utils.storage) never change content and are cached for a year, other files for
+    MEDIA_CACHE_MAX_AGE seconds. When MEDIA_SENDFILE is set, sending the file is offloaded to the
+    front server ("x-sendfile" for Apache / lighttpd, "x-accel-redirect" for nginx, with internal
+    location MEDIA_SENDFILE_PREFIX pointing at MEDIA_ROOT), which also handles Range requests.
+    Otherwise file is sent with FileResponse (zero-copy under servers using wsgi.file_wrapper)
+    and single byte ranges are answered with 206.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404
+    if not statmod.S_ISREG(stat.st_mode):
+        raise Http404
+
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    if HASHED_NAME_RE.match("/".join(path.split("/")[-2:])):
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        cache_control = f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)}"
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = _media_response(request, full_path, path, stat.st_size, etag)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["Cache-Control"] = cache_control
+    return response
+
+
+def _media_response(request, full_path, path, size, etag):
+    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    sendfile = getattr(settings, "MEDIA_SENDFILE", None)
+    if sendfile == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = full_path
+        return response
+    if sendfile == "x-accel-redirect":
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, "MEDIA_SENDFILE_PREFIX", "/protected-media/")
+        response["X-Accel-Redirect"] = prefix + path
+        return response
+
+    byte_range = None
+    range_header = request.headers.get("Range")
+    if range_header and request.headers.get("If-Range", etag) == etag:
+        byte_range = _parse_range(range_header, size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    file = open(full_path, "rb")
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(file, start, end - start + 1), status=206, content_type=content_type
+        )
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    return response
@@ -0,0 +1 @@
+SECRET_KEY = "test-only"
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 from pathlib import Path
 import os
 import datetime
+from django.core.exceptions import ImproperlyConfigured
 from .secrets import *
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
     "api.apps.ApiConfig",
     "accounts.apps.AccountsConfig",
     "utils.apps.UtilsConfig",
+    "jobs.apps.JobsConfig",
 ]
 
 MIDDLEWARE = [
@@ -55,6 +57,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "utils.middleware.PrimaryPinMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -79,27 +82,119 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "wapp.wsgi.application"
 
+# Authentication classes are tried in order until one of them recognizes credentials. Their names
+# and order can be changed with WAPP_AUTHENTICATORS environment variable (e.g. "jwt"), so API
+# traffic doesn't pay for session lookup or password hashing of basic authentication.
+AUTHENTICATORS = {
+    "jwt": "accounts.authentication.LazyJWTAuthentication",
+    "session": "rest_framework.authentication.SessionAuthentication",
+    "basic": "rest_framework.authentication.BasicAuthentication",
+}
+
+AUTHENTICATOR_NAMES = [
+    name.strip() for name in os.environ.get("WAPP_AUTHENTICATORS", "jwt,session,basic").split(",")
+]
+for name in AUTHENTICATOR_NAMES:
+    if name not in AUTHENTICATORS:
+        raise ImproperlyConfigured(
+            f"Unknown authenticator {name!r} in WAPP_AUTHENTICATORS, valid names are: "
+            f"{', '.join(AUTHENTICATORS)}."
+        )
+
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
-    "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-        "rest_framework.authentication.SessionAuthentication",
-        "rest_framework.authentication.BasicAuthentication",
+    "DEFAULT_AUTHENTICATION_CLASSES": tuple(AUTHENTICATORS[name] for name in AUTHENTICATOR_NAMES),
+    # JSON is rendered and parsed with orjson when it is installed (see utils.renderers)
+    "DEFAULT_RENDERER_CLASSES": (
+        "utils.renderers.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
     ),
+    "DEFAULT_PARSER_CLASSES": (
+        "utils.renderers.JSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
+    # Errors of nested lists (like routine units) are reported as lists with one dict per item
+    "LIST_SERIALIZER_ERRORS_AS_DICT": False,
 }
 
+# Serve read endpoints with async views and async ORM. Enabled by default when project is run by
+# ASGI server (see asgi.py), where single worker can interleave many requests waiting for database.
+ASYNC_VIEWS = os.environ.get("WAPP_ASYNC_VIEWS", "0") == "1"
+
 CORS_ORIGIN_WHITELIST = ("http://localhost:3000",)
 
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# Database profile is selected with WAPP_DB_PROFILE environment variable:
+#   development (default) – SQLite with default connection handling,
+#   production – SQLite in WAL mode with persistent connections and tuned pragmas,
+#   postgres – PostgreSQL with connection pool (requires psycopg[pool] package).
+DB_PROFILE = os.environ.get("WAPP_DB_PROFILE", "development")
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": os.environ.get("WAPP_DB_NAME", BASE_DIR / "db.sqlite3"),
     }
 }
 
+# PRAGMA statements executed on every new SQLite connection (see utils/signals.py).
+SQLITE_PRAGMAS = {}
+
+if DB_PROFILE == "production":
+    DATABASES["default"].update(
+        {
+            # Keep connections open between requests and verify them before reuse
+            "CONN_MAX_AGE": 600,
+            "CONN_HEALTH_CHECKS": True,
+            # Seconds to wait for the write lock before raising "database is locked"
+            "OPTIONS": {"timeout": 20},
+        }
+    )
+    SQLITE_PRAGMAS = {
+        # Readers don't block writer and vice versa
+        "journal_mode": "WAL",
+        # Durable enough in WAL mode, fsync only at checkpoints
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        # Negative value is size in KiB
+        "cache_size": -64 * 1024,
+        "temp_store": "MEMORY",
+    }
+elif DB_PROFILE == "postgres":
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get("WAPP_DB_NAME", "wapp"),
+        "USER": os.environ.get("WAPP_DB_USER", "wapp"),
+        "PASSWORD": os.environ.get("WAPP_DB_PASSWORD", ""),
+        "HOST": os.environ.get("WAPP_DB_HOST", "localhost"),
+        "PORT": os.environ.get("WAPP_DB_PORT", "5432"),
+        # Connections are reused through the pool, so CONN_MAX_AGE has to stay 0
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {"pool": {"min_size": 2, "max_size": 20, "timeout": 10}},
+    }
+
+
+# Read replicas are given with WAPP_DB_REPLICAS environment variable as comma separated list of
+# SQLite files (e.g. replicated with litestream). Safe requests of views using ReplicaReadMixin are
+# routed to them (see utils/routers.py).
+DATABASE_REPLICAS = []
+for i, replica_name in enumerate(filter(None, os.environ.get("WAPP_DB_REPLICAS", "").split(","))):
+    DATABASES[f"replica{i + 1}"] = {
+        **DATABASES["default"],
+        "NAME": replica_name,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{i + 1}")
+
+DATABASE_ROUTERS = ["utils.routers.ReplicaRouter"]
+
+# Seconds for which user is routed to the primary database after write, so he reads his own writes.
+REPLICA_PIN_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -145,11 +240,74 @@ STATIC_URL = "/static/"
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": datetime.timedelta(days=1),
     "REFRESH_TOKEN_LIFETIME": datetime.timedelta(days=3),
-    "UPDATE_LAST_LOGIN": True,
+    # last_login is buffered by accounts.serializers.token.TokenObtainPairSerializer
+    "UPDATE_LAST_LOGIN": False,
 }
 
+# Logins are written to User.last_login with single query by the first request handled this many
+# seconds after they happen (see accounts.last_login), 0 writes every login immediately.
+LAST_LOGIN_FLUSH_INTERVAL = 10
+
+# Seconds for which public user profiles are cached (see accounts.cache).
+PUBLIC_PROFILE_CACHE_TIMEOUT = 300
+
+# Seconds for which active status of users authenticated from JWT claims is cached (see
+# accounts.active_users).
+ACTIVE_USERS_CACHE_TIMEOUT = 300
+
+# Refresh token blacklist cache (see accounts.blacklist)
+# Seconds after which Bloom filter of blacklisted tokens is rebuilt from the database, this bounds
+# the delay with which tokens blacklisted by other server processes are rejected.
+BLACKLIST_CACHE_TTL = 60
+
+# Number of confirmed blacklist lookups remembered by single process.
+BLACKLIST_CACHE_LRU_SIZE = 4096
+
+
+# Background jobs
+# Execute jobs right after they are enqueued instead of waiting for `manage.py runworker`.
+JOBS_RUN_EAGERLY = False
+
+# Number of jobs executed at once by single worker.
+JOBS_WORKER_CONCURRENCY = 4
+
+# Seconds after which running job is considered abandoned by killed worker and is requeued.
+JOBS_STALE_AFTER = 3600
+
+# Number of times stale job is claimed before it is marked as failed instead of being requeued.
+JOBS_MAX_ATTEMPTS = 3
+
+# Seconds after which a fork counts half as much in trending score (see api.trending). Stored
+# scores have to be reset after this is changed.
+TRENDING_HALF_LIFE = 7 * 24 * 3600
+
+# Number of similar exercises precomputed for every exercise (see api.recommendations).
+SIMILAR_EXERCISES_COUNT = 10
+
+# Seconds after which in-memory index of tag names (see api.tag_index) is reloaded from the
+# database, this bounds the delay with which tags added by other server processes are suggested.
+TAG_INDEX_TTL = 300
+
+# Sizes (longer edge in pixels) of resized profile picture variants (see accounts.images).
+PROFILE_PICTURE_SIZES = (40, 160, 640)
+
+# Unreferenced profile pictures are deleted by `manage.py sweepmedia` (run it periodically) only
+# when they were not modified for this many seconds.
+MEDIA_GC_GRACE_PERIOD = 3600
+
 # Absolute filesystem path to the directory that will hold user-uploaded files.
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
 # URL that handles the media served from MEDIA_ROOT, used for managing stored files.
 MEDIA_URL = "/media/"
+
+# Media serving (see utils.views.serve_media)
+# Offload sending files to the front server: "x-sendfile" (Apache, lighttpd) or "x-accel-redirect"
+# (nginx, with internal location MEDIA_SENDFILE_PREFIX aliased to MEDIA_ROOT). Empty to send files
+# from Django.
+MEDIA_SENDFILE = os.environ.get("WAPP_MEDIA_SENDFILE", "")
+MEDIA_SENDFILE_PREFIX = "/protected-media/"
+
+# Seconds for which media files with mutable names (like default profile picture) are cached,
+# content-addressed files are cached for a year.
+MEDIA_CACHE_MAX_AGE = 3600
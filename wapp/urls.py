@@ -14,18 +14,40 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from django.urls import include, path, re_path
+from rest_framework_simplejwt.views import (
+    TokenBlacklistView,
+    TokenObtainPairView,
+    TokenRefreshView,
+)
+
+from accounts.serializers.token import (
+    TokenBlacklistSerializer,
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from utils.views import serve_media
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("token-auth/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
-    path("token-refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path(
+        "token-auth/",
+        TokenObtainPairView.as_view(serializer_class=TokenObtainPairSerializer),
+        name="token_obtain_pair",
+    ),
+    path(
+        "token-refresh/",
+        TokenRefreshView.as_view(serializer_class=TokenRefreshSerializer),
+        name="token_refresh",
+    ),
+    path(
+        "token-blacklist/",
+        TokenBlacklistView.as_view(serializer_class=TokenBlacklistSerializer),
+        name="token_blacklist",
+    ),
     path("api/", include("api.urls")),
     path("api/", include("accounts.urls")),
+    path("api/", include("jobs.urls")),
+    re_path(rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.*)$", serve_media, name="media"),
 ]
-
-# Change when deployed
-urlpatterns = urlpatterns + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)